@@ -1,11 +1,19 @@
 from fastapi import FastAPI
 from src.routers.graph import router as graph_router
+from src.routers.ingestion import router as ingestion_router
+from src.routers.metrics import router as metrics_router
 
 app = FastAPI()
 
 # Register graph-related APIs
 app.include_router(graph_router, prefix="/graph")
 
+# Register background ingestion job APIs
+app.include_router(ingestion_router, prefix="/ingest")
+
+# Register runtime metrics APIs
+app.include_router(metrics_router, prefix="/metrics")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
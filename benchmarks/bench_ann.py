@@ -0,0 +1,89 @@
+"""
+Benchmark of the IVF index (src.utils.ivf_index.IVFCollection) against exact search.
+
+Builds a local collection of synthetic clustered embeddings, then reports recall@k of the
+IVF search against exact search and p50/p99 query latency for several nprobe values.
+
+Usage:
+    python -m benchmarks.bench_ann [--n 200000] [--dim 256] [--queries 200] [--k 10] [--nprobe 4,8,16,32,64]
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from src.utils.local_vector_store import LocalCollection
+from src.utils.ivf_index import IVFCollection
+
+
+def clustered_embeddings(n: int, dim: int, clusters: int, noise: float, seed: int = 0) -> np.ndarray:
+    """
+    Draws `n` vectors around `clusters` random centers, like embeddings of documents on a
+    limited number of topics.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    return centers[labels] + noise * rng.normal(size=(n, dim)).astype(np.float32)
+
+
+def percentiles(seconds):
+    milliseconds = np.asarray(seconds) * 1000
+    return np.percentile(milliseconds, 50), np.percentile(milliseconds, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200000, help="Number of stored vectors")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=1000, help="Topics in the synthetic data")
+    parser.add_argument("--noise", type=float, default=2.0, help="Spread of the vectors around their topic")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0: 4 * sqrt(n))")
+    parser.add_argument("--nprobe", default="4,8,16,32,64", help="Comma-separated nprobe values")
+    parser.add_argument("--rerank", type=int, default=4)
+    args = parser.parse_args()
+
+    data = clustered_embeddings(args.n, args.dim, args.clusters, args.noise)
+    rng = np.random.default_rng(1)
+    queries = data[rng.choice(args.n, size=args.queries)] + 0.3 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    with tempfile.TemporaryDirectory() as directory:
+        collection = IVFCollection(directory, "bench", n_lists=args.nlist or None, rerank=args.rerank, train_min=0)
+        started = time.perf_counter()
+        for start in range(0, args.n, 10000):
+            ids = [str(i) for i in range(start, min(args.n, start + 10000))]
+            collection.upsert(ids=ids, embeddings=data[start:start + 10000])
+        print(f"Inserted {args.n} x {args.dim} vectors in {time.perf_counter() - started:.1f}s")
+        started = time.perf_counter()
+        collection.build()
+        print(f"Built IVF in {time.perf_counter() - started:.1f}s: {collection.index_stats()}")
+
+        # Exact search is the flat store's implementation, run on the same vectors
+        exact_results, exact_times = [], []
+        for query in queries:
+            started = time.perf_counter()
+            rows, _ = LocalCollection._search(collection, query, None, args.k)
+            exact_times.append(time.perf_counter() - started)
+            exact_results.append(set(rows.tolist()))
+        p50, p99 = percentiles(exact_times)
+        print(f"\n{'search':>12} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+        print(f"{'exact':>12} {1.0:>10.3f} {p50:>8.2f} {p99:>8.2f}")
+
+        for nprobe in (int(value) for value in args.nprobe.split(",")):
+            collection.nprobe = nprobe
+            hits, times = 0, []
+            for query, expected in zip(queries, exact_results):
+                started = time.perf_counter()
+                rows, _ = collection._search(query, None, args.k)
+                times.append(time.perf_counter() - started)
+                hits += len(expected & set(rows.tolist()))
+            p50, p99 = percentiles(times)
+            print(f"{'ivf/' + str(nprobe):>12} {hits / (args.k * len(queries)):>10.3f} {p50:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Microbenchmark for src.utils.chunker.Chunker on large synthetic texts.
+
+Compares the single-pass chunker against the previous `IngestData.split_text`
+implementation, which grew the current chunk by string concatenation.
+
+Usage:
+    python -m benchmarks.bench_chunker [--sizes 1,4,16] [--repeat 3]
+"""
+import argparse
+import random
+import re
+import time
+
+from src.utils.chunker import Chunker
+
+WORDS = ("the of and to in is that for on with as by at from this are be or an it was which "
+         "retrieval embedding vector document chunk query model agent graph index token page").split()
+
+
+def synthetic_text(size_mb: float, seed: int = 0) -> str:
+    """
+    Builds roughly `size_mb` megabytes of sentence-like text with varied sentence lengths.
+    """
+    rng = random.Random(seed)
+    target = int(size_mb * 1_000_000)
+    sentences, length = [], 0
+    while length < target:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 40)))
+        sentence = sentence.capitalize() + rng.choice(".!?.")
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)
+
+
+def legacy_split_text(text: str):
+    """
+    The previous chunking algorithm, kept here as the baseline.
+    """
+    text = re.sub(r'\s+', ' ', text).strip()
+    sentences = [s.strip() for s in re.split(r'[.!?]+', text) if s.strip()]
+    chunks, current_chunk = [], ""
+    for sentence in sentences:
+        if current_chunk and len(current_chunk + " " + sentence) > 1000:
+            if len(current_chunk) >= 100:
+                chunks.append(current_chunk)
+            current_chunk = sentence
+        else:
+            current_chunk = current_chunk + " " + sentence if current_chunk else sentence
+    if current_chunk and len(current_chunk) >= 100:
+        chunks.append(current_chunk)
+    return chunks
+
+
+def as_pages(text: str, page_size: int = 3000):
+    return [(number + 1, text[start:start + page_size]) for number, start in enumerate(range(0, len(text), page_size))]
+
+
+def best_of(repeat: int, fn):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,4,16", help="Comma-separated text sizes in MB")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    chunker = Chunker()
+    print(f"Chunker(max_tokens={chunker.max_tokens}, overlap_tokens={chunker.overlap_tokens})")
+    print(f"{'size MB':>8} {'impl':>16} {'seconds':>9} {'MB/s':>8} {'chunks':>8}")
+    for size in (float(s) for s in args.sizes.split(",")):
+        text = synthetic_text(size)
+        pages = as_pages(text)
+        runs = [
+            ("legacy", lambda: legacy_split_text(text)),
+            ("chunker", lambda: chunker.chunk_text(text)),
+            ("chunker (pages)", lambda: list(chunker.chunk_pages(pages))),
+        ]
+        for name, fn in runs:
+            seconds, chunks = best_of(args.repeat, fn)
+            print(f"{size:>8.1f} {name:>16} {seconds:>9.3f} {size / seconds:>8.1f} {len(chunks):>8}")
+
+
+if __name__ == "__main__":
+    main()
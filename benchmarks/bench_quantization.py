@@ -0,0 +1,79 @@
+"""
+Memory use and recall of quantized local collections (src.utils.quantized_store).
+
+Reports, for int8 and binary codes, the resident code size against float32 vectors and the
+recall@k against exact search, before and after rescoring with the full vectors. Runs on
+synthetic embeddings, or on an existing local collection with --path and --collection.
+
+Usage:
+    python -m benchmarks.bench_quantization [--n 100000] [--dim 768] [--k 10]
+    python -m benchmarks.bench_quantization --path ./src/data/vectorDB --collection agentic-rag
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from src.utils.local_vector_store import LocalCollection
+from src.utils.quantized_store import BinaryCollection, Int8Collection
+from benchmarks.bench_ann import clustered_embeddings
+
+
+def print_report(report: dict, seconds: float):
+    print(f"{report['quantization']:>8} {report['vectors']:>9} {report['code_bytes'] / 2**20:>9.1f} "
+          f"{report['float32_bytes'] / 2**20:>10.1f} {report['compression']:>6.1f}x "
+          f"{report.get('recall_first_pass', 0):>11.3f} {report.get('recall_rescored', 0):>9.3f} {seconds * 1000:>9.2f}")
+
+
+def mean_query_seconds(collection, queries, k: int) -> float:
+    started = time.perf_counter()
+    for query in queries:
+        collection._search(query, None, k)
+    return (time.perf_counter() - started) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100000, help="Number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--path", help="Directory of an existing local vector store")
+    parser.add_argument("--collection", help="Collection to report on, with --path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.path:
+            source = f"{args.path}/{args.collection}"
+        else:
+            source = f"{directory}/synthetic"
+            data = clustered_embeddings(args.n, args.dim, clusters=max(1, args.n // 100), noise=2.0)
+            collection = Int8Collection(source, "synthetic")
+            for start in range(0, args.n, 10000):
+                collection.upsert(ids=[str(i) for i in range(start, min(args.n, start + 10000))],
+                                  embeddings=data[start:start + 10000])
+            collection.persist()
+
+        print(f"{'codes':>8} {'vectors':>9} {'codes MB':>9} {'float32 MB':>10} {'ratio':>7} "
+              f"{'recall@' + str(args.k) + ' 1st':>11} {'rescored':>9} {'query ms':>9}")
+        flat = LocalCollection(source, args.collection or "synthetic")
+        rng = np.random.default_rng(1)
+        queries = [np.asarray(flat._vectors[row]) for row in rng.choice(np.flatnonzero(flat._alive), size=20)]
+        float32_bytes = flat.count() * flat.dimension * 4
+        print_report({"quantization": "float32", "vectors": flat.count(), "code_bytes": float32_bytes,
+                      "float32_bytes": float32_bytes, "compression": 1.0, "recall_first_pass": 1.0,
+                      "recall_rescored": 1.0}, mean_query_seconds(flat, queries, args.k))
+
+        for collection_class in (Int8Collection, BinaryCollection):
+            # Work on a copy so the codes of an existing collection are not touched
+            copy = f"{directory}/{collection_class.quantization}"
+            shutil.copytree(source, copy)
+            collection = collection_class(copy, args.collection or "synthetic")
+            report = collection.quantization_report(queries=args.queries, k=args.k)
+            print_report(report, mean_query_seconds(collection, queries, args.k))
+
+
+if __name__ == "__main__":
+    main()
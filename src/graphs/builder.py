@@ -1,11 +1,13 @@
 from typing import Dict, TypedDict, List, Literal
 from src.graphs.type import RAGAgentState
-from src.graphs.nodes.ingestor_node import ingestor_node
+from src.graphs.nodes.ingestor_node import ingestor_node, aingestor_node
 from src.graphs.nodes.retriever_node import retriever_node
 from src.graphs.nodes.search_node import search_agent_node
-from src.graphs.nodes.rewrite_node import rewrite
+from src.graphs.nodes.rewrite_node import rewrite, arewrite
 from src.graphs.nodes.chat_node import chat_node
-from src.graphs.nodes.router_node import router_agent_node
+from src.graphs.nodes.router_node import router_agent_node, arouter_agent_node
+from src.graphs.nodes.answer_cache_node import answer_cache_node, aanswer_cache_node, cache_answer_node, acache_answer_node
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
 from langgraph.checkpoint.memory import MemorySaver
 
@@ -20,26 +22,45 @@ def chat_routing_condition(state: RAGAgentState) -> Literal["continue", "end"]:
         print("[GRAPH] ➡️ Continuing conversation - proceeding to router agent")
         return "continue"
 
+def answer_cache_condition(state: RAGAgentState) -> Literal["hit", "miss"]:
+    """Skip the router agent and rewrite when the answer cache answered the query."""
+    if state.get('answer_cached', False):
+        print("[GRAPH] ⚡ Answered from cache - skipping router agent and rewrite")
+        return "hit"
+    return "miss"
+
 def _build_base_graph():
     """Build and return the base state graph with ingestor and retriever nodes."""
     builder = StateGraph(RAGAgentState)
 
     #Nodes
-    builder.add_node("ingestor", ingestor_node)
-    builder.add_node("router agent", router_agent_node)
-    builder.add_node("rewrite", rewrite)
+    # Nodes with I/O have an async version, used by graph.ainvoke; graph.invoke runs the sync one
+    builder.add_node("ingestor", RunnableLambda(ingestor_node, afunc=aingestor_node, name="ingestor"))
+    builder.add_node("router agent", RunnableLambda(router_agent_node, afunc=arouter_agent_node, name="router agent"))
+    builder.add_node("rewrite", RunnableLambda(rewrite, afunc=arewrite, name="rewrite"))
+    builder.add_node("answer cache", RunnableLambda(answer_cache_node, afunc=aanswer_cache_node, name="answer cache"))
+    builder.add_node("cache answer", RunnableLambda(cache_answer_node, afunc=acache_answer_node, name="cache answer"))
     builder.add_node("continue chat", chat_node)
 
     #Graph Edges
     builder.add_edge(START, "ingestor")
-    builder.add_edge("ingestor", "router agent")
+    builder.add_edge("ingestor", "answer cache")
+    builder.add_conditional_edges(
+        "answer cache",
+        answer_cache_condition,
+        {
+            "hit": "continue chat",
+            "miss": "router agent",
+        },
+    )
     builder.add_edge("router agent", "rewrite")
-    builder.add_edge("rewrite", "continue chat")
+    builder.add_edge("rewrite", "cache answer")
+    builder.add_edge("cache answer", "continue chat")
     builder.add_conditional_edges(
         "continue chat", 
         chat_routing_condition,
         {
-            "continue": "router agent", 
+            "continue": "ingestor", 
             "end": END,
         },
     )
@@ -0,0 +1,104 @@
+from typing import Optional
+from src.graphs.type import RAGAgentState
+from src.helpers.history_summarizer import is_substantive_message
+from src.helpers.summarizer import serialize_messages
+from src.utils.answer_cache import answer_cache, context_fingerprint
+from src.utils.collection_registry import DEFAULT_COLLECTION
+from src.utils.data_ingest import current_collection_version, load_collection
+from src.utils.gemini_embedding import BackendEmbeddingFunction
+from src.utils.ingestion_jobs import job_manager
+from src.graphs.streaming import emit_token
+from langchain_core.messages import AIMessage, HumanMessage
+import asyncio
+
+# Sources of router answers that stay valid as long as the collection version, see `router_node`
+CACHEABLE_SOURCES = ("documents", "model")
+
+
+def _cache_scope(state: RAGAgentState) -> Optional[tuple]:
+    """
+    Returns the (collection, version, context fingerprint) scope of the current query, or None
+    while documents of the collection are still being ingested or none were uploaded.
+    """
+    collection = state.get("collection_name") or DEFAULT_COLLECTION
+    if job_manager.pending(collection):
+        return None
+    try:
+        version = current_collection_version(load_collection(collection))
+    except Exception:
+        # No documents uploaded: answers come from the web, which no version tracks
+        return None
+    # Same messages the history summary is built from
+    history = [message for message in serialize_messages(state.get("messages", []))
+               if is_substantive_message(message.get("content", ""))]
+    return (collection, version, context_fingerprint(history))
+
+
+def answer_cache_node(state: RAGAgentState) -> RAGAgentState:
+    """
+    A node that answers from the answer cache, so a query asked before (in other words, with
+    ANSWER_CACHE_SEMANTIC) skips the router agent and the rewrite LLM calls.
+    """
+    state["answer_cached"] = False
+    state["answer_cache_scope"] = []
+    state["answer_source"] = ""
+    query = state.get("query", "")
+    if answer_cache is None or state.get("finish") or not query:
+        return state
+
+    try:
+        scope = _cache_scope(state)
+        if scope is None:
+            print("[ANSWER CACHE] ⏭️ No documents ingested yet, skipping the answer cache")
+            return state
+        state["answer_cache_scope"] = list(scope)
+
+        answer = answer_cache.get_exact(scope, query)
+        if answer is None and answer_cache.semantic:
+            hit = answer_cache.get_similar(scope, BackendEmbeddingFunction().embed_search_query(query))
+            if hit is not None:
+                answer, similarity = hit
+                print(f"[ANSWER CACHE] ⚡ Semantic hit (similarity {similarity:.3f})")
+        elif answer is not None:
+            print("[ANSWER CACHE] ⚡ Exact hit")
+    except Exception as e:
+        print(f"[ANSWER CACHE] ❌ Lookup failed: {str(e)}")
+        return state
+
+    if answer is not None:
+        emit_token(answer)
+        state["messages"] = state["messages"] + [HumanMessage(content=query), AIMessage(content=answer)]
+        state["answer"] = answer
+        state["answer_cached"] = True
+    return state
+
+
+def cache_answer_node(state: RAGAgentState) -> RAGAgentState:
+    """
+    A node that stores the final (rewritten) answer in the answer cache. Answers built on web
+    search results are not stored, since the web changes under the same collection version.
+    """
+    scope = state.get("answer_cache_scope")
+    answer = state.get("answer")
+    if answer_cache is None or not scope or not answer or state.get("answer_cached") or state.get("finish"):
+        return state
+    if state.get("answer_source") not in CACHEABLE_SOURCES:
+        print(f"[ANSWER CACHE] ⏭️ Not caching an answer from source '{state.get('answer_source')}'")
+        return state
+    try:
+        query = state["query"]
+        # The lookup embedded this query, so the query embedding cache serves it
+        embedding = BackendEmbeddingFunction().embed_search_query(query) if answer_cache.semantic else None
+        answer_cache.put(tuple(scope), query, embedding, answer)
+    except Exception as e:
+        print(f"[ANSWER CACHE] ❌ Store failed: {str(e)}")
+    return state
+
+
+async def aanswer_cache_node(state: RAGAgentState) -> RAGAgentState:
+    # Loading the collection and embedding the query use synchronous clients
+    return await asyncio.to_thread(answer_cache_node, state)
+
+
+async def acache_answer_node(state: RAGAgentState) -> RAGAgentState:
+    return await asyncio.to_thread(cache_answer_node, state)
@@ -1,16 +1,76 @@
 from src.graphs.type import RAGAgentState
-from src.utils.data_ingest import IngestData
+from src.utils.ingestion_jobs import job_manager
+from src.utils.collection_registry import DEFAULT_COLLECTION
 from src.utils.retriever import Retriever
 from langchain_core.messages import HumanMessage
 import os
+import hashlib
+import asyncio
+
+# Failed ingestions of unchanged files submitted again before giving up
+MAX_INGESTION_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+
+
+def _files_signature(file_paths) -> str:
+    """
+    Returns a hash of the paths, sizes and modification times of the files, which changes
+    when the user uploads new or modified files.
+    """
+    digest = hashlib.sha256()
+    for file_path in sorted(file_paths):
+        stat = os.stat(file_path)
+        digest.update(f"{file_path}\x00{stat.st_size}\x00{stat.st_mtime_ns}\x01".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def _check_job(state: RAGAgentState) -> bool:
+    """
+    Updates the state from the ingestion job submitted on an earlier turn. `data_ingested` is
+    only set once the job completed, and reset when it failed or was cancelled, so the files are
+    submitted again. Returns True while the job is still running.
+    """
+    job_id = state.get('ingestion_job_id')
+    if not job_id:
+        return False
+    job = job_manager.get(job_id)
+    if job is None:
+        # Pruned or lost with a restart; unchanged files are skipped when they are submitted again
+        print(f"[INGESTION NODE] ⚠️ Ingestion job {job_id} is unknown, submitting the files again")
+        state['data_ingested'] = False
+        state['ingestion_job_id'] = ""
+        return False
+    if not job.finished:
+        state['data_ingested'] = False
+        state['status'] = f"Ingestion running (job {job.id})"
+        return True
+    state['ingestion_job_id'] = ""
+    if job.status == "completed":
+        state['data_ingested'] = True
+        state['ingestion_failures'] = {}
+        state['status'] = f"Ingestion completed (job {job.id})"
+        print(f"[INGESTION NODE] ✅ Ingestion job {job.id} completed")
+    else:
+        state['data_ingested'] = False
+        state['status'] = f"Ingestion {job.status} (job {job.id}): {'; '.join(job.errors[-3:])}".rstrip(": ")
+        failures = dict(state.get('ingestion_failures') or {})
+        failures['attempts'] = failures.get('attempts', 0) + 1
+        failures['error'] = state['status']
+        state['ingestion_failures'] = failures
+        print(f"[INGESTION NODE] ❌ {state['status']}")
+    return False
 
 
 def ingestor_node(state: RAGAgentState) -> RAGAgentState:
     """
-    A node that can ingest user files into the vector DB (if needed) and then generate a response to the user query using the vectorDB context.
+    A node that submits the user files for ingestion into the vector DB (if needed) as a background
+    job, and on later turns records whether the job succeeded.
     """
     print("[INGESTION NODE] 🚀 Node hit")
 
+    reported = bool(state.get('ingestion_job_id'))
+    if _check_job(state):
+        print(f"[INGESTION NODE] ⏳ Ingestion job {state['ingestion_job_id']} still running")
+        return state
     # Check if files are uploaded and not yet ingested
     files_uploaded = state.get('files_uploaded', [])
     data_ingested = state.get('data_ingested', False)
@@ -33,23 +93,30 @@ def ingestor_node(state: RAGAgentState) -> RAGAgentState:
             state['status'] = f"Ingestion failed: {error_msg}"
             return state
         
-        ingestor = IngestData()
-        state['status'] = "Ingestion started"
-        
+        # Failures are counted per set of files; uploading other or changed files starts over
+        signature = _files_signature(valid_files)
+        failures = state.get('ingestion_failures') or {}
+        if failures.get('files') != signature:
+            failures = {'files': signature, 'attempts': 0}
+        state['ingestion_failures'] = failures
+        if failures['attempts'] >= MAX_INGESTION_ATTEMPTS:
+            state['status'] = (f"Ingestion stopped after {failures['attempts']} failed attempt(s); "
+                               f"upload the files again to retry. Last error: {failures.get('error', '')}")
+            print(f"[INGESTION NODE] 🛑 {state['status']}")
+            return state
+
         try:
-            print("[INGESTION NODE] 🔄 Starting ingestion pipeline...")
-            ingestor.run_ingestion_pipeline(valid_files)
-            state['data_ingested'] = True
-            state['status'] = "Ingestion completed successfully"
-            print("[INGESTION NODE] ✅ Ingestion completed successfully")
-        except ValueError as e:
-            # Handle specific ValueError (like no valid content)
-            error_msg = f"Ingestion failed: {str(e)}"
-            print(f"[INGESTION NODE] ❌ {error_msg}")
+            # Ingest in the background; queries wait for the job only when they need the documents
+            job = job_manager.submit(valid_files, state.get("collection_name") or DEFAULT_COLLECTION)
+            # Pending until a later turn sees the job complete
             state['data_ingested'] = False
-            state['status'] = error_msg
+            state['ingestion_job_id'] = job.id
+            previous = state.get('status', '')
+            state['status'] = f"Ingestion running (job {job.id})"
+            if previous.startswith(("Ingestion failed", "Ingestion cancelled")):
+                state['status'] += f", retrying after: {previous}"
+            print(f"[INGESTION NODE] 🔄 Ingestion job {job.id} started")
         except Exception as e:
-            # Handle other exceptions (API errors, file reading errors, etc.)
             error_msg = f"Ingestion failed: {str(e)}"
             print(f"[INGESTION NODE] ❌ {error_msg}")
             state['data_ingested'] = False
@@ -59,6 +126,16 @@ def ingestor_node(state: RAGAgentState) -> RAGAgentState:
             print("[INGESTION NODE] ℹ️ No files uploaded, skipping ingestion")
         elif data_ingested:
             print("[INGESTION NODE] ℹ️ Data already ingested, skipping ingestion")
-        state['status'] = "No ingestion needed"
+        # Keep the outcome of a job that finished since the last turn
+        if not reported:
+            state['status'] = "No ingestion needed"
+
+    return state
+
 
-    return state
\ No newline at end of file
+async def aingestor_node(state: RAGAgentState) -> RAGAgentState:
+    """
+    Async version of `ingestor_node`. Checking the uploaded files touches the disk, so the node
+    runs in a worker thread; the ingestion itself is a background job either way.
+    """
+    return await asyncio.to_thread(ingestor_node, state)
@@ -1,8 +1,13 @@
 from src.graphs.type import RAGAgentState
-from src.utils.data_ingest import IngestData
+from src.utils.data_ingest import load_collection
+from src.utils.ingestion_jobs import job_manager
+from src.utils.collection_registry import DEFAULT_COLLECTION
 from src.utils.retriever import Retriever
 from src.helpers.history_summarizer import summarize_chat_history
 from langchain_core.messages import AIMessage, HumanMessage
+import os
+
+INGEST_WAIT_TIMEOUT = float(os.getenv("INGEST_WAIT_TIMEOUT", "600"))
 
 def retriever_node(state: RAGAgentState) -> RAGAgentState:
     """
@@ -21,10 +26,17 @@ def retriever_node(state: RAGAgentState) -> RAGAgentState:
         if history_summary and history_summary != "This is a new conversation with no previous history.":
             enhanced_query = f"Context from previous conversation: {history_summary}\n\nCurrent query: {state['query']}"
         
+        collection_name = state.get("collection_name") or DEFAULT_COLLECTION
         try:
-            db = IngestData().load_chroma_collection("agentic-rag")
+            # Wait for documents that are still being ingested in the background
+            pending_error = job_manager.wait_for_collection(collection_name, timeout=INGEST_WAIT_TIMEOUT)
+            if pending_error:
+                print(f"[RETRIEVER NODE] ⏳ {pending_error}")
+
+            db = load_collection(collection_name)
             
-            result = Retriever().run_retriever_node(enhanced_query, db, 5)
+            # This node answers the user directly, so the passages always go through the LLM
+            result = Retriever().run_retriever_node(enhanced_query, db, 5, generate=True)
             
         except Exception as db_error:
             print(f"[RETRIEVER NODE] Database error: {str(db_error)}")
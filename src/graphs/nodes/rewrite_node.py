@@ -1,8 +1,35 @@
 from src.graphs.type import RAGAgentState
 from src.utils.llm_runner import LLM
 from src.helpers.prompts import rewrite_prompt
+from src.graphs.streaming import emit_token
 from langchain_core.messages import AIMessage
 
+def _apply_rewrite(state: RAGAgentState, rewritten: str):
+    state["answer"] = rewritten
+    # Update the latest AI message with the rewritten content
+    messages = state.get("messages", [])
+    
+    # Find the last AI message and update it
+    for i in range(len(messages) - 1, -1, -1):  # Search backwards
+        if isinstance(messages[i], dict) and messages[i].get('type') == 'ai':
+            # Update the latest AI message with rewritten content
+            messages[i]['content'] = rewritten
+            break
+        elif hasattr(messages[i], 'type') and messages[i].type == 'ai':
+            # Handle LangChain objects if they exist
+            messages[i] = AIMessage(content=rewritten)
+            break
+    else:
+        # If no AI message found, add a new one
+        messages.append({'type': 'ai', 'content': rewritten})
+    
+    state["messages"] = messages
+
+def _final_text(rewritten: str) -> str:
+    if not rewritten.strip():
+        raise ValueError("The model returned an empty rewrite")
+    return rewritten.strip()
+
 def rewrite(state: RAGAgentState) -> RAGAgentState:
     """
     Node that uses an LLM to rewrite and improve the answer for clarity and completeness.
@@ -17,26 +44,12 @@ def rewrite(state: RAGAgentState) -> RAGAgentState:
         if answer:
             llm = LLM()
             prompt = rewrite_prompt.format(answer=answer)
-            rewritten = llm.generate_response(prompt)
-            state["answer"] = rewritten
-            # Update the latest AI message with the rewritten content
-            messages = state.get("messages", [])
-            
-            # Find the last AI message and update it
-            for i in range(len(messages) - 1, -1, -1):  # Search backwards
-                if isinstance(messages[i], dict) and messages[i].get('type') == 'ai':
-                    # Update the latest AI message with rewritten content
-                    messages[i]['content'] = rewritten
-                    break
-                elif hasattr(messages[i], 'type') and messages[i].type == 'ai':
-                    # Handle LangChain objects if they exist
-                    messages[i] = AIMessage(content=rewritten)
-                    break
-            else:
-                # If no AI message found, add a new one
-                messages.append({'type': 'ai', 'content': rewritten})
-            
-            state["messages"] = messages
+            # The rewrite is the answer users see, so its tokens go to streaming clients as they arrive
+            rewritten = ""
+            for text in llm.stream_response(prompt):
+                rewritten += text
+                emit_token(text)
+            _apply_rewrite(state, _final_text(rewritten))
         else:
             print("[REWRITE NODE] No answer to improve.")
     except Exception as e:
@@ -44,3 +57,28 @@ def rewrite(state: RAGAgentState) -> RAGAgentState:
         state['status'] = "Rewrite Error"
     
     return state
+
+async def arewrite(state: RAGAgentState) -> RAGAgentState:
+    """
+    Async version of `rewrite`.
+    """
+    print("[REWRITE NODE] 🚀 Node hit")
+
+    if 'finish' not in state:
+        state['finish'] = False
+    answer = state.get("answer", "")
+    try:
+        if answer:
+            prompt = rewrite_prompt.format(answer=answer)
+            rewritten = ""
+            async for text in LLM().astream_response(prompt):
+                rewritten += text
+                emit_token(text)
+            _apply_rewrite(state, _final_text(rewritten))
+        else:
+            print("[REWRITE NODE] No answer to improve.")
+    except Exception as e:
+        print(f"[REWRITE NODE] Error: {str(e)}")
+        state['status'] = "Rewrite Error"
+
+    return state
@@ -3,74 +3,62 @@ from langchain_core.messages import AIMessage, HumanMessage
 from langchain.agents import AgentExecutor, create_react_agent
 from src.helpers.prompts import router_agent_prompt
 from src.tools.web_search_tool import tavily_search_tool, duckduckgo_search_tool
-from src.tools.retriever_tool import retriever_tool
-import os
-from langchain_google_genai import ChatGoogleGenerativeAI
-import json
+from src.tools.retriever_tool import retriever_tool, multi_query_retriever_tool
+from src.utils.collection_registry import DEFAULT_COLLECTION, current_collection
+from src.utils.gemini_pool import gemini_pool
+import contextvars
+import asyncio
 
 from dotenv import load_dotenv
 load_dotenv()
 
 from langchain.prompts import PromptTemplate
-from src.helpers.history_summarizer import summarize_chat_history
+from src.helpers.history_summarizer import NO_HISTORY, asummarize_chat_history, summarize_chat_history
 
 
-tools = [tavily_search_tool, duckduckgo_search_tool, retriever_tool]
+tools = [tavily_search_tool, duckduckgo_search_tool, retriever_tool, multi_query_retriever_tool]
+# Answers built on web results go stale and are never cached, see `cache_answer_node`
+WEB_SEARCH_TOOLS = {tavily_search_tool.name, duckduckgo_search_tool.name}
+DOCUMENT_TOOLS = {retriever_tool.name, multi_query_retriever_tool.name}
 
 router_agent_prompt_template = PromptTemplate(
     input_variables=["input"],
     template=router_agent_prompt
 )
 
-def router_agent_node(state: RAGAgentState) -> RAGAgentState:
-    # Summarize chat history for context
-    history_summary = summarize_chat_history(state.get("messages", []))
+TIMEOUT_SECONDS = 30  # Increased timeout for debugging
+
+
+def _enhanced_query(state: RAGAgentState, history_summary: str) -> str:
     # Enhance query with history context
-    enhanced_query = state["query"]
-    if history_summary and history_summary != "This is a new conversation with no previous history.":
-        enhanced_query = f"Context from previous conversation: {history_summary}\n\nCurrent query: {state['query']}"
-    # If finishing or no query, skip processing
-    if state.get("finish") or "query" not in state:
-        return state
-    api_keys_str = os.getenv("GOOGLE_GENAI_API_KEYS", "")
-    if api_keys_str.strip().startswith("["):
-        try:
-            gemini_api_keys = json.loads(api_keys_str)
-        except Exception as e:
-            raise ValueError(f"Failed to parse GOOGLE_GENAI_API_KEYS as JSON: {e}")
-    else:
-        gemini_api_keys = [k.strip() for k in api_keys_str.split(",") if k.strip()]
-    if not gemini_api_keys:
-        raise ValueError("Gemini API Key not provided. Please provide GEMINI_API_KEY as an environment variable")
-    
-    for i, key in enumerate(gemini_api_keys):
-        try:
-            llm = ChatGoogleGenerativeAI(google_api_key=key, model="gemini-2.0-flash-lite")
-            agent = create_react_agent(
-                tools=tools,
-                llm=llm,
-                prompt=router_agent_prompt_template
-            )
-            agent_executor = AgentExecutor(agent=agent, tools=tools, handle_parsing_errors=True)
-            import concurrent.futures
-            TIMEOUT_SECONDS = 30  # Increased timeout for debugging
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(agent_executor.invoke, {"input": enhanced_query})
-                try:
-                    result = future.result(timeout=TIMEOUT_SECONDS)
-                except concurrent.futures.TimeoutError:
-                    print("[ROUTER NODE] Agent timed out, falling back to direct LLM call")
-                    llm_with_tools = llm.bind_tools(tools)
-                    response = llm_with_tools.invoke(enhanced_query)
-                    result = {'output': str(response.content)}
-        except Exception as e:
-            print(f"[ROUTER NODE] Exception with key {i+1}: {e}")
-            if any(keyword in str(e).lower() for keyword in ['permission_denied', 'invalid api key', 'authentication']):
-                print(f"[ROUTER NODE] Auth/API error: {e}")
-                continue
-            else:
-                print(f"[ROUTER NODE] Non-auth error: {e}")
-                break
+    if history_summary and history_summary != NO_HISTORY:
+        return f"Context from previous conversation: {history_summary}\n\nCurrent query: {state['query']}"
+    return state["query"]
+
+
+def _agent_executor(llm) -> AgentExecutor:
+    agent = create_react_agent(
+        tools=tools,
+        llm=llm,
+        prompt=router_agent_prompt_template
+    )
+    # The steps tell which tools the answer was built on
+    return AgentExecutor(agent=agent, tools=tools, handle_parsing_errors=True, return_intermediate_steps=True)
+
+
+def _answer_source(result) -> str:
+    """
+    Returns "web" if the agent searched the web, "documents" if it only searched the uploaded
+    documents, and "model" if it answered without tools.
+    """
+    steps = (result.get('intermediate_steps') or []) if isinstance(result, dict) else []
+    used = {action.tool for action, _ in steps}
+    if used & WEB_SEARCH_TOOLS:
+        return "web"
+    return "documents" if used & DOCUMENT_TOOLS else "model"
+
+
+def _record_result(state: RAGAgentState, result) -> RAGAgentState:
     # Prepare new messages to append
     new_messages = [
         HumanMessage(content=state["query"]),
@@ -79,4 +67,69 @@ def router_agent_node(state: RAGAgentState) -> RAGAgentState:
     
     state["messages"] = state["messages"] + new_messages
     state["answer"] = result.get('output') if result and isinstance(result, dict) else None
-    return state
\ No newline at end of file
+    state["answer_source"] = _answer_source(result) if state["answer"] else ""
+    return state
+
+
+def router_agent_node(state: RAGAgentState) -> RAGAgentState:
+    # If finishing or no query, skip processing
+    if state.get("finish") or "query" not in state:
+        return state
+    # Summarize chat history for context
+    enhanced_query = _enhanced_query(state, summarize_chat_history(state.get("messages", [])))
+
+    def run_agent() -> dict:
+        # Every LLM request of the agent picks its own key and rate-limiter slot, see src.utils.gemini_pool
+        llm = gemini_pool.chat_model("gemini-2.0-flash-lite")
+        agent_executor = _agent_executor(llm)
+        import concurrent.futures
+        # Tools read the session's collection from the context, which worker threads do not inherit
+        context = contextvars.copy_context()
+        context.run(current_collection.set, state.get("collection_name") or DEFAULT_COLLECTION)
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            future = executor.submit(context.run, agent_executor.invoke, {"input": enhanced_query})
+            try:
+                return future.result(timeout=TIMEOUT_SECONDS)
+            except concurrent.futures.TimeoutError:
+                print("[ROUTER NODE] Agent timed out, falling back to direct LLM call")
+                llm_with_tools = llm.bind_tools(tools)
+                response = llm_with_tools.invoke(enhanced_query)
+                return {'output': str(response.content)}
+
+    result = None
+    try:
+        result = run_agent()
+    except Exception as e:
+        print(f"[ROUTER NODE] Error: {e}")
+    return _record_result(state, result)
+
+
+async def arouter_agent_node(state: RAGAgentState) -> RAGAgentState:
+    """
+    Async version of `router_agent_node`: the agent, its tools and the LLM calls are awaited,
+    so the event loop serves other conversations while this one waits on I/O.
+    """
+    if state.get("finish") or "query" not in state:
+        return state
+    enhanced_query = _enhanced_query(state, await asummarize_chat_history(state.get("messages", [])))
+
+    async def run_agent() -> dict:
+        llm = gemini_pool.chat_model("gemini-2.0-flash-lite")
+        agent_executor = _agent_executor(llm)
+        try:
+            return await asyncio.wait_for(agent_executor.ainvoke({"input": enhanced_query}), timeout=TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            print("[ROUTER NODE] Agent timed out, falling back to direct LLM call")
+            response = await llm.bind_tools(tools).ainvoke(enhanced_query)
+            return {'output': str(response.content)}
+
+    result = None
+    # Tools awaited by the agent run in this task's context and search the session's collection
+    token = current_collection.set(state.get("collection_name") or DEFAULT_COLLECTION)
+    try:
+        result = await run_agent()
+    except Exception as e:
+        print(f"[ROUTER NODE] Error: {e}")
+    finally:
+        current_collection.reset(token)
+    return _record_result(state, result)
@@ -1,10 +1,8 @@
 from src.graphs.type import RAGAgentState
 from src.helpers.history_summarizer import summarize_chat_history
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import AgentExecutor, create_react_agent
-import os
-import json
+from src.utils.gemini_pool import gemini_pool
 
 from langchain import hub
 
@@ -33,46 +31,29 @@ def search_agent_node(state: RAGAgentState) -> RAGAgentState:
         if history_summary and history_summary != "This is a new conversation with no previous history.":
             enhanced_query = f"Context from previous conversation: {history_summary}\n\nCurrent query: {state['query']}"
 
-        api_keys_str = os.getenv("GOOGLE_GENAI_API_KEYS", "")
-        if api_keys_str.strip().startswith("["):
-            try:
-                gemini_api_keys = json.loads(api_keys_str)
-            except Exception as e:
-                raise ValueError(f"Failed to parse GOOGLE_GENAI_API_KEYS as JSON: {e}")
-        else:
-            gemini_api_keys = [k.strip() for k in api_keys_str.split(",") if k.strip()]
-        if not gemini_api_keys:
-            raise ValueError("Gemini API Key not provided. Please provide GEMINI_API_KEY as an environment variable")
-        
-        for i, key in enumerate(gemini_api_keys):
-            try:
-                llm = ChatGoogleGenerativeAI(google_api_key=key, model="gemini-2.0-flash-lite")
-                agent = create_react_agent(
-                    tools=tools,
-                    llm=llm,
-                    prompt=search_agent_prompt
-                )
-                agent_executor = AgentExecutor(agent=agent, tools=tools, handle_parsing_errors=True)
+        def run_agent() -> dict:
+            # Every LLM request of the agent picks its own key and rate-limiter slot, see src.utils.gemini_pool
+            llm = gemini_pool.chat_model("gemini-2.0-flash-lite")
+            agent = create_react_agent(
+                tools=tools,
+                llm=llm,
+                prompt=search_agent_prompt
+            )
+            agent_executor = AgentExecutor(agent=agent, tools=tools, handle_parsing_errors=True)
+
+            import concurrent.futures
+            TIMEOUT_SECONDS = 30  # Increased timeout for debugging
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                future = executor.submit(agent_executor.invoke, {"input": enhanced_query})
+                try:
+                    return future.result(timeout=TIMEOUT_SECONDS)
+                except concurrent.futures.TimeoutError:
+                    print("[SEARCH NODE] Agent timed out, falling back to direct LLM call")
+                    llm_with_tools = llm.bind_tools(tools)
+                    response = llm_with_tools.invoke(enhanced_query)
+                    return {'output': str(response.content)}
 
-                import concurrent.futures
-                TIMEOUT_SECONDS = 30  # Increased timeout for debugging
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(agent_executor.invoke, {"input": enhanced_query})
-                    try:
-                        result = future.result(timeout=TIMEOUT_SECONDS)
-                    except concurrent.futures.TimeoutError:
-                        print("[SEARCH NODE] Agent timed out, falling back to direct LLM call")
-                        llm_with_tools = llm.bind_tools(tools)
-                        response = llm_with_tools.invoke(enhanced_query)
-                        result = {'output': str(response.content)}
-            except Exception as e:
-                print(f"[SEARCH NODE] Exception with key {i+1}: {e}")
-                if any(keyword in str(e).lower() for keyword in ['permission_denied', 'invalid api key', 'authentication']):
-                    print(f"[SEARCH NODE] Auth/API error: {e}")
-                    continue
-                else:
-                    print(f"[SEARCH NODE] Non-auth error: {e}")
-                    break
+        result = run_agent()
     except Exception as e:
         print(f"[SEARCH NODE] Error: {str(e)}")
         state['status'] = "Error"
@@ -0,0 +1,78 @@
+import time
+from typing import AsyncIterator, Iterator, List, Tuple
+from fastapi.encoders import jsonable_encoder
+from langgraph.config import get_stream_writer
+
+# Per-node state updates, plus the answer tokens nodes emit with `emit_token`
+STREAM_MODES = ["updates", "custom"]
+
+
+def emit_token(text: str):
+    """
+    Sends a chunk of the answer to the clients streaming the graph. Does nothing when the
+    graph runs with invoke, or when called outside a graph node.
+    """
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return
+    writer({"token": text})
+
+
+def to_events(mode: str, payload) -> List[Tuple[str, dict]]:
+    """
+    Translates a LangGraph stream chunk into (event, data) pairs: "node" when a node finished,
+    with the session status, and "token" for every answer chunk.
+    """
+    if mode == "custom":
+        return [("token", {"text": payload["token"]})] if isinstance(payload, dict) and "token" in payload else []
+    events = []
+    for node, update in (payload or {}).items():
+        # The interrupt of the chat node ends the turn; the final state follows in "done"
+        if node.startswith("__"):
+            continue
+        status = update.get("status") if isinstance(update, dict) else None
+        events.append(("node", {"node": node, "status": status}))
+    return events
+
+
+def _done(thread_id: str, state: dict, started: float, first_token: float) -> Tuple[str, dict]:
+    first_token_ms = 1000 * (first_token - started) if first_token is not None else None
+    total_ms = 1000 * (time.perf_counter() - started)
+    print(f"[STREAM] ⏱️ Thread {thread_id}: first token "
+          f"{'n/a' if first_token_ms is None else f'{first_token_ms:.0f}ms'}, done in {total_ms:.0f}ms")
+    return "done", {
+        "thread_id": thread_id,
+        "state": jsonable_encoder(state),
+        "first_token_ms": first_token_ms,
+        "total_ms": total_ms,
+    }
+
+
+def stream_graph(graph, graph_input, thread_id: str) -> Iterator[Tuple[str, dict]]:
+    """
+    Runs the graph with `stream`, yielding node and token events as they happen, then a "done"
+    event with the final state and the time to the first answer token.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    started, first_token = time.perf_counter(), None
+    for mode, payload in graph.stream(graph_input, config=config, stream_mode=STREAM_MODES):
+        for event in to_events(mode, payload):
+            if event[0] == "token" and first_token is None:
+                first_token = time.perf_counter()
+            yield event
+    yield _done(thread_id, graph.get_state(config).values, started, first_token)
+
+
+async def astream_graph(graph, graph_input, thread_id: str) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Async version of `stream_graph`, using `astream`.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    started, first_token = time.perf_counter(), None
+    async for mode, payload in graph.astream(graph_input, config=config, stream_mode=STREAM_MODES):
+        for event in to_events(mode, payload):
+            if event[0] == "token" and first_token is None:
+                first_token = time.perf_counter()
+            yield event
+    yield _done(thread_id, (await graph.aget_state(config)).values, started, first_token)
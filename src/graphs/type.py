@@ -10,7 +10,17 @@ class RAGAgentState(TypedDict):
     query: str
     answer: str
     data_ingested: bool
+    ingestion_job_id: str
+    # Failed ingestions of the uploaded files: {"files": signature, "attempts": n, "error": status}
+    ingestion_failures: dict
+    collection_name: str
     status: str
     messages: Annotated[Sequence[Union[BaseMessage, dict]], add_messages]
     rewrite: bool
-    finish: bool
\ No newline at end of file
+    finish: bool
+    # Set when the answer came from the semantic answer cache, skipping the agent and rewrite
+    answer_cached: bool
+    # (collection, version, context fingerprint) the answer is cached under
+    answer_cache_scope: list
+    # Tools the router agent answered with: "web", "documents" or "model"
+    answer_source: str
\ No newline at end of file
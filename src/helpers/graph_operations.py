@@ -1,15 +1,46 @@
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 from uuid import uuid4
 from src.graphs.builder import build_graph
+from src.graphs.streaming import stream_graph
 from src.graphs.type import RAGAgentState
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.types import Command
 from src.helpers.summarizer import serialize_messages
+from src.utils.collection_registry import collection_name_for
 
 # Global checkpointer for all sessions (same as in the API)
 checkpointer = MemorySaver()
 
-def start_new_chat(query: str, messages: List, file_paths: List[str]) -> Dict:
+def _initial_state(thread_id: str, query: str, messages: List, file_paths: List[str],
+                   tenant_id: Optional[str] = None) -> RAGAgentState:
+    return {
+        "files_uploaded": file_paths,
+        "query": query,
+        "answer": "",
+        "data_ingested": False,
+        "ingestion_job_id": "",
+        "ingestion_failures": {},
+        "collection_name": collection_name_for(thread_id=thread_id, tenant_id=tenant_id),
+        "status": "",
+        "messages": messages,
+        "rewrite": False,
+        "finish": False,
+        "answer_cached": False,
+        "answer_cache_scope": [],
+        "answer_source": "",
+    }
+
+def _resume_command(query: str, messages: List, file_paths: List[str], data_ingested: bool, status: str) -> Command:
+    return Command(resume={
+        "query": query,
+        "messages": messages,
+        "status": status,
+        "data_ingested": data_ingested,
+        "files_uploaded": file_paths,
+        "finish": False,
+    })
+
+def start_new_chat(query: str, messages: List, file_paths: List[str], tenant_id: Optional[str] = None) -> Dict:
     """
     Start a new chat session - equivalent to /start API endpoint
     
@@ -17,21 +48,13 @@ def start_new_chat(query: str, messages: List, file_paths: List[str]) -> Dict:
         query: The initial query
         messages: List of previous messages
         file_paths: List of uploaded file paths
+        tenant_id: Tenant whose documents are shared across its threads (defaults to a per-thread collection)
     
     Returns:
         Dict containing thread_id and state
     """
     thread_id = str(uuid4())
-    state: RAGAgentState = {
-        "files_uploaded": file_paths,
-        "query": query,
-        "answer": "",
-        "data_ingested": False,
-        "status": "",
-        "messages": messages,
-        "rewrite": False,
-        "finish": False,
-    }
+    state = _initial_state(thread_id, query, messages, file_paths, tenant_id)
     
     print(f"[HELPER] Starting new chat session with thread_id: {thread_id}")
     graph = build_graph(checkpointer)
@@ -57,32 +80,40 @@ def continue_chat(thread_id: str, query: str, messages: List,
     """
     print(f"[HELPER] Continuing chat session with thread_id: {thread_id}")
     
-    # Ensure all required state variables are present
-    state = {
-        "finish": False,
-        "query": query,
-        "answer": "",
-        "messages": messages,
-        "status": status,
-        "data_ingested": data_ingested,
-        "files_uploaded": file_paths,
-    }
-    
     graph = build_graph(checkpointer)
     result = graph.invoke(
-        Command(resume={
-            "query": state.get('query'),
-            "messages": state.get('messages', []),
-            "status": state.get('status'),
-            "data_ingested": state.get('data_ingested'),
-            "files_uploaded": state.get('files_uploaded'),
-            "finish": state.get('finish'),
-        }),
+        _resume_command(query, messages, file_paths, data_ingested, status),
         config={"configurable": {"thread_id": thread_id}}
     )
     
     return {"thread_id": thread_id, "state": result}
 
+def stream_new_chat(query: str, messages: List, file_paths: List[str],
+                    tenant_id: Optional[str] = None) -> Iterator[Tuple[str, dict]]:
+    """
+    Start a new chat session, streaming it - equivalent to /start/stream API endpoint
+    
+    Yields:
+        (event, data) pairs: "node" after each node, "token" for every answer chunk, and
+        finally "done" with the thread_id and the final state
+    """
+    thread_id = str(uuid4())
+    print(f"[HELPER] Starting new streamed chat session with thread_id: {thread_id}")
+    graph = build_graph(checkpointer)
+    yield from stream_graph(graph, _initial_state(thread_id, query, messages, file_paths, tenant_id), thread_id)
+
+def stream_continue_chat(thread_id: str, query: str, messages: List, file_paths: List[str],
+                         data_ingested: bool, status: str) -> Iterator[Tuple[str, dict]]:
+    """
+    Continue an existing chat session, streaming it - equivalent to /continue/stream API endpoint
+    
+    Yields:
+        The same events as `stream_new_chat`
+    """
+    print(f"[HELPER] Continuing streamed chat session with thread_id: {thread_id}")
+    graph = build_graph(checkpointer)
+    yield from stream_graph(graph, _resume_command(query, messages, file_paths, data_ingested, status), thread_id)
+
 def finish_chat(thread_id: str) -> Dict:
     """
     Finish a chat session - equivalent to /finish API endpoint
@@ -4,6 +4,8 @@ from src.helpers.summarizer import serialize_messages
 import json
 import re
 
+NO_HISTORY = "This is a new conversation with no previous history."
+
 def is_substantive_message(content):
     """
     Returns True if the message content is substantive (not a greeting, salutation, or guardrail response).
@@ -58,6 +60,42 @@ def is_substantive_message(content):
     return True
 
 
+def _history_prompt(messages) -> str:
+    # Serialize messages to a readable format
+    serialized_messages = serialize_messages(messages)
+    
+    # Filter out non-substantive messages
+    filtered_messages = [msg for msg in serialized_messages if is_substantive_message(msg.get("content", ""))]
+    
+    # Convert to a readable string format
+    history_text = ""
+    for i, msg in enumerate(filtered_messages):
+        role = msg.get("type", "unknown")
+        content = msg.get("content", "")
+        if role == "human":
+            history_text += f"User: {content}\n"
+        elif role == "ai":
+            history_text += f"Assistant: {content}\n"
+        else:
+            history_text += f"{role.title()}: {content}\n"
+    
+    # If history is too long, truncate it to keep it manageable
+    if len(history_text) > 2000:
+        # Keep the most recent messages
+        lines = history_text.split('\n')
+        recent_lines = lines[-20:]  # Keep last 20 lines
+        history_text = '\n'.join(recent_lines)
+        history_text = f"[Previous conversation truncated...]\n{history_text}"
+    
+    return history_summarizer_prompt.format(chat_history=history_text)
+
+
+def _fallback_summary(messages, e: Exception) -> str:
+    print(f"[HISTORY SUMMARIZER] Error summarizing history: {str(e)}")
+    # Fallback: return a simple summary
+    return f"Conversation has {len(messages)} messages. Recent context may be limited due to summarization error."
+
+
 def summarize_chat_history(messages):
     """
     Summarizes the chat history using the LLM to provide context for query processing.
@@ -69,45 +107,25 @@ def summarize_chat_history(messages):
         str: A concise summary of the chat history
     """
     if not messages or len(messages) == 0:
-        return "This is a new conversation with no previous history."
+        return NO_HISTORY
     
     try:
-        # Serialize messages to a readable format
-        serialized_messages = serialize_messages(messages)
-        
-        # Filter out non-substantive messages
-        filtered_messages = [msg for msg in serialized_messages if is_substantive_message(msg.get("content", ""))]
-        
-        # Convert to a readable string format
-        history_text = ""
-        for i, msg in enumerate(filtered_messages):
-            role = msg.get("type", "unknown")
-            content = msg.get("content", "")
-            if role == "human":
-                history_text += f"User: {content}\n"
-            elif role == "ai":
-                history_text += f"Assistant: {content}\n"
-            else:
-                history_text += f"{role.title()}: {content}\n"
-        
-        # If history is too long, truncate it to keep it manageable
-        if len(history_text) > 2000:
-            # Keep the most recent messages
-            lines = history_text.split('\n')
-            recent_lines = lines[-20:]  # Keep last 20 lines
-            history_text = '\n'.join(recent_lines)
-            history_text = f"[Previous conversation truncated...]\n{history_text}"
-        
         # Use the LLM to summarize
-        llm = LLM()
-        prompt = history_summarizer_prompt.format(chat_history=history_text)
-        
-        summary = llm.generate_response(prompt)
-        
+        summary = LLM().generate_response(_history_prompt(messages))
+        return summary.strip()
+    except Exception as e:
+        return _fallback_summary(messages, e)
+
+
+async def asummarize_chat_history(messages):
+    """
+    Async version of `summarize_chat_history`.
+    """
+    if not messages or len(messages) == 0:
+        return NO_HISTORY
+    
+    try:
+        summary = await LLM().agenerate_response(_history_prompt(messages))
         return summary.strip()
-        
     except Exception as e:
-        print(f"[HISTORY SUMMARIZER] Error summarizing history: {str(e)}")
-        # Fallback: return a simple summary
-        fallback_summary = f"Conversation has {len(messages)} messages. Recent context may be limited due to summarization error."
-        return fallback_summary
+        return _fallback_summary(messages, e)
@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import StreamingResponse
 from src.graphs.builder import build_graph
 from src.graphs.type import RAGAgentState
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.types import Command
+from src.utils.collection_registry import collection_name_for
+from src.graphs.streaming import astream_graph
 
 from uuid import uuid4
+import json
 
 router = APIRouter()
 
@@ -13,34 +17,27 @@ checkpointer = MemorySaver()
 
 
 
-# --- Start a new session ---
-@router.post("/start")
-async def start_graph(request: Request):
-    body = await request.json()
-    thread_id = str(uuid4())
-    state: RAGAgentState = {
+def _initial_state(body: dict, thread_id: str) -> RAGAgentState:
+    # Documents are scoped to the tenant when one is given, otherwise to this thread
+    collection_name = collection_name_for(thread_id=thread_id, tenant_id=body.get("tenant_id"))
+    return {
         "files_uploaded": body.get("files_uploaded", []),
         "query": body.get("query", ""),
         "answer": "",
         "data_ingested": False,
+        "ingestion_job_id": "",
+        "ingestion_failures": {},
+        "collection_name": collection_name,
         "status": "",
         "messages": body.get("messages", []),
         "rewrite": False,
         "finish": False,
+        "answer_cached": False,
+        "answer_cache_scope": [],
+        "answer_source": "",
     }
-    print(f"[API] Starting new chat session with thread_id: {thread_id}")
-    graph = build_graph(checkpointer)
-    result = graph.invoke(state, config={"configurable": {"thread_id": thread_id}})
-    return {"thread_id": thread_id, "state": result}
 
-# --- Continue the session (user sends a new message) ---
-@router.post("/continue")
-async def continue_graph(request: Request):
-    body = await request.json()
-    thread_id = body["thread_id"]
-    state = body["state"]
-    print(f"[API] Continuing chat session with thread_id: {thread_id}")
-    
+def _resume_command(state: dict) -> Command:
     # Ensure all required state variables are present
     if "finish" not in state:
         state["finish"] = False
@@ -57,19 +54,69 @@ async def continue_graph(request: Request):
     if "files_uploaded" not in state:
         state["files_uploaded"] = []
     
+    return Command(resume={
+        "query": state.get('query'),
+        "messages": state.get('messages', []),
+        "status": state.get('status'),
+        "data_ingested": state.get('data_ingested'),
+        "files_uploaded": state.get('files_uploaded'),
+        "finish": state.get('finish'),
+    })
+
+def _event_stream(graph_input, thread_id: str) -> StreamingResponse:
+    """
+    Streams a graph run as Server-Sent Events: "node" after each node, "token" for every
+    answer chunk, then "done" with the final state, or "error".
+    """
+    async def events():
+        graph = build_graph(checkpointer)
+        try:
+            async for event, data in astream_graph(graph, graph_input, thread_id):
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            print(f"[API] ❌ Streaming error on thread {thread_id}: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'thread_id': thread_id, 'detail': str(e)})}\n\n"
+    # Proxies must not buffer the stream, or tokens arrive all at once
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# --- Start a new session ---
+@router.post("/start")
+async def start_graph(request: Request):
+    body = await request.json()
+    thread_id = str(uuid4())
+    state = _initial_state(body, thread_id)
+    print(f"[API] Starting new chat session with thread_id: {thread_id}")
     graph = build_graph(checkpointer)
-    result = graph.invoke(
-        Command(resume={
-            "query": state.get('query'),
-            "messages": state.get('messages', []),
-            "status": state.get('status'),
-            "data_ingested": state.get('data_ingested'),
-            "files_uploaded": state.get('files_uploaded'),
-            "finish": state.get('finish'),
-        }),
-        config={"configurable": {"thread_id": thread_id}})
+    result = await graph.ainvoke(state, config={"configurable": {"thread_id": thread_id}})
     return {"thread_id": thread_id, "state": result}
 
+# --- Start a new session, streaming progress and answer tokens ---
+@router.post("/start/stream")
+async def start_graph_stream(request: Request):
+    body = await request.json()
+    thread_id = str(uuid4())
+    print(f"[API] Starting new streamed chat session with thread_id: {thread_id}")
+    return _event_stream(_initial_state(body, thread_id), thread_id)
+
+# --- Continue the session (user sends a new message) ---
+@router.post("/continue")
+async def continue_graph(request: Request):
+    body = await request.json()
+    thread_id = body["thread_id"]
+    print(f"[API] Continuing chat session with thread_id: {thread_id}")
+    graph = build_graph(checkpointer)
+    result = await graph.ainvoke(_resume_command(body["state"]), config={"configurable": {"thread_id": thread_id}})
+    return {"thread_id": thread_id, "state": result}
+
+# --- Continue the session, streaming progress and answer tokens ---
+@router.post("/continue/stream")
+async def continue_graph_stream(request: Request):
+    body = await request.json()
+    thread_id = body["thread_id"]
+    print(f"[API] Continuing streamed chat session with thread_id: {thread_id}")
+    return _event_stream(_resume_command(body["state"]), thread_id)
+
 # --- Finish the session (user wants to end chat) ---
 @router.post("/finish")
 async def finish_graph(request: Request):
@@ -80,6 +127,6 @@ async def finish_graph(request: Request):
     
     # state["finish"] = True
     graph = build_graph(checkpointer)
-    result = graph.invoke(Command(resume={"finish": True}), config={"configurable": {"thread_id": thread_id}})
+    result = await graph.ainvoke(Command(resume={"finish": True}), config={"configurable": {"thread_id": thread_id}})
 
     return {"thread_id": thread_id, "state": result}
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Request, HTTPException
+from src.utils.ingestion_jobs import job_manager
+from src.utils.collection_registry import collection_name_for
+import os
+
+router = APIRouter()
+
+
+# --- Submit an ingestion job ---
+@router.post("/jobs")
+async def submit_job(request: Request):
+    body = await request.json()
+    files = body.get("files", [])
+    # Ingest into the collection of a chat thread or tenant; names are never taken from the caller
+    collection = collection_name_for(thread_id=body.get("thread_id"), tenant_id=body.get("tenant_id"))
+
+    valid_files = [file_path for file_path in files if os.path.exists(file_path)]
+    if not valid_files:
+        raise HTTPException(status_code=400, detail="No valid files found for ingestion")
+
+    job = job_manager.submit(valid_files, collection)
+    print(f"[API] Submitted ingestion job {job.id}")
+    return job.to_dict()
+
+# --- Poll the progress of a job ---
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Ingestion job {job_id} not found")
+    return job.to_dict()
+
+# --- Cancel a job ---
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Ingestion job {job_id} not found")
+    print(f"[API] Cancellation requested for ingestion job {job_id}")
+    return job.to_dict()
@@ -0,0 +1,53 @@
+from fastapi import APIRouter
+from src.utils.collection_registry import client_pool, collection_registry
+from src.utils.embedding_cache import get_embedding_cache, get_query_embedding_cache
+from src.utils.retrieval_cache import retrieval_cache
+from src.utils.gemini_pool import gemini_pool
+from src.utils.answer_cache import answer_cache
+from src.utils.rate_limiter import rate_limiters
+
+router = APIRouter()
+
+
+# --- Vector-store client and collection handle reuse ---
+@router.get("/vector-store")
+async def vector_store_metrics():
+    return {
+        "clients": client_pool.stats(),
+        "collections": collection_registry.stats(),
+    }
+
+
+# --- Document and query embedding caches ---
+@router.get("/embeddings")
+async def embedding_metrics():
+    document_cache = get_embedding_cache()
+    query_cache = get_query_embedding_cache()
+    return {
+        "documents": document_cache.stats() if document_cache else None,
+        "queries": query_cache.stats() if query_cache else None,
+    }
+
+
+# --- Retrieved passages and answers ---
+@router.get("/retrieval")
+async def retrieval_metrics():
+    return {"cache": retrieval_cache.stats() if retrieval_cache else None}
+
+
+# --- Gemini API key rotation ---
+@router.get("/gemini-keys")
+async def gemini_key_metrics():
+    return gemini_pool.stats()
+
+
+# --- Semantic answer cache ---
+@router.get("/answers")
+async def answer_metrics():
+    return {"cache": answer_cache.stats() if answer_cache else None}
+
+
+# --- Outbound rate limiters ---
+@router.get("/rate-limits")
+async def rate_limit_metrics():
+    return rate_limiters.stats()
@@ -1,12 +1,17 @@
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 from src.utils.retriever import Retriever
-from src.utils.data_ingest import IngestData
+from src.utils.data_ingest import load_collection
+from src.utils.ingestion_jobs import job_manager
+from src.utils.collection_registry import current_collection
 import os
+import re
+import asyncio
 from dotenv import load_dotenv
 load_dotenv()
 
-@tool
-def retriever_tool(query: str) -> str:
+INGEST_WAIT_TIMEOUT = float(os.getenv("INGEST_WAIT_TIMEOUT", "600"))
+
+def _retriever(query: str) -> str:
     """
     Powerful document retriever: Use this tool to search a vector database of all uploaded documents and internal knowledge. It finds the most relevant, context-rich passages to answer the user's query, even for complex or detailed questions. Ideal for:
     - Questions about specific documents, files, or internal data
@@ -16,13 +21,66 @@ def retriever_tool(query: str) -> str:
     Args:
         query (str): The user's question to search for in the vector database.
     Returns:
-        str: The generated answer based on the most relevant passage from the database.
+        str: The most relevant passages, numbered and tagged with their source file and pages (or an answer generated from them, if the deployment enables it).
+    """
+    return _search_documents(query)
+
+
+async def _aretriever(query: str) -> str:
+    return await _asearch_documents(query)
+
+
+def _multi_query_retriever(queries: str) -> str:
     """
+    Multi-part document retriever: Use this tool instead of calling the document retriever several times when a question has several distinct parts (e.g. comparing two products, or asking about a spec and a procedure). All sub-queries are searched in the uploaded documents at once, and the merged, de-duplicated passages are returned.
+    Args:
+        queries (str): The sub-queries, separated by semicolons, e.g. "warranty of model A; warranty of model B".
+    Returns:
+        str: The most relevant passages for all sub-queries, numbered and tagged with their source file and pages.
+    """
+    return _search_documents(_split_sub_queries(queries))
+
+
+async def _amulti_query_retriever(queries: str) -> str:
+    return await _asearch_documents(_split_sub_queries(queries))
+
+
+# Agents run with ainvoke call the coroutines, which wait on the search without blocking the event loop
+retriever_tool = StructuredTool.from_function(func=_retriever, coroutine=_aretriever, name="retriever_tool")
+multi_query_retriever_tool = StructuredTool.from_function(
+    func=_multi_query_retriever, coroutine=_amulti_query_retriever, name="multi_query_retriever_tool")
+
+
+def _split_sub_queries(queries: str) -> list:
+    return [q.strip() for q in re.split(r"[;\n]", queries) if q.strip()]
+
+
+def _search_documents(query) -> str:
     try:
+        # Search the documents of the session the agent runs for
+        collection_name = current_collection.get()
+        # Make sure documents still being ingested are searchable
+        pending_error = job_manager.wait_for_collection(collection_name, timeout=INGEST_WAIT_TIMEOUT)
+        if pending_error:
+            # Search what has been ingested so far
+            print(f"[Retriever Tool] ⏳ {pending_error}")
         # Load the Chroma collection (vector DB)
-        db = IngestData().load_chroma_collection("agentic-rag")
-        # Use the Retriever class to get the answer
+        db = load_collection(collection_name)
+        # Use the Retriever class to get the answer; sub-queries share one embedding call and one vector query
         answer = Retriever().run_retriever_node(query, db, n_results=5)
         return answer
     except Exception as e:
         return f"[Retriever Tool] Error: {str(e)}"
+
+
+async def _asearch_documents(query) -> str:
+    try:
+        collection_name = current_collection.get()
+        # Waiting for ingestion and opening the collection block, so they run in worker threads
+        pending_error = await asyncio.to_thread(job_manager.wait_for_collection, collection_name, INGEST_WAIT_TIMEOUT)
+        if pending_error:
+            print(f"[Retriever Tool] ⏳ {pending_error}")
+        db = await asyncio.to_thread(load_collection, collection_name)
+        return await Retriever().arun_retriever_node(query, db, n_results=5)
+    except Exception as e:
+        return f"[Retriever Tool] Error: {str(e)}"
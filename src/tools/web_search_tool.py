@@ -1,62 +1,91 @@
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 from langchain_tavily import TavilySearch
 from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
 from langchain_community.tools import DuckDuckGoSearchResults
+from src.utils.rate_limiter import acall_with_limits, call_with_limits, rate_limiters
 
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
+def _tavily_search() -> TavilySearch:
+    return TavilySearch(
+        tavily_api_key=os.getenv("TAVILY_API_KEY"),
+        max_results=7,
+        topic="general",
+    )
+
+def _duckduckgo_search() -> DuckDuckGoSearchResults:
+    wrapper = DuckDuckGoSearchAPIWrapper(region="in-en", time="d", max_results=3)
+    return DuckDuckGoSearchResults(
+        api_wrapper=wrapper,
+        source="news",
+        output_format="json",
+    )
+
+def _tavily_limiter():
+    # Tavily calls queue for the requests/min and concurrency limits of the key, see src.utils.rate_limiter
+    return rate_limiters.get("tavily", os.getenv("TAVILY_API_KEY", ""))
+
 # Initialize Tavily Search Tool
-@tool
-def tavily_search_tool(query: str):
+def _tavily(query: str):
     """
     Performs web search using Tavily Search API.
-    
+
     Args:
         query: The search query to look up on the web
-        
+
     Returns:
         str: Search results from Tavily
     """
     print(f"[TOOL] tavily_search_tool called with query: {query}")
 
-    tavily_search = TavilySearch(
-        tavily_api_key=os.getenv("TAVILY_API_KEY"),
-        max_results=7,
-        topic="general",
-    )
-    
     try:
-        results = tavily_search.invoke(query)
+        results = call_with_limits(_tavily_limiter(), lambda: _tavily_search().invoke(query), description="Tavily search")
         return str(results)
     except Exception as e:
         print(f"[TOOL] Tavily search error: {e}")
         return f"Error performing search: {str(e)}"
 
-@tool
-def duckduckgo_search_tool(query: str):
+async def _atavily(query: str):
+    print(f"[TOOL] tavily_search_tool called with query: {query}")
+
+    try:
+        results = await acall_with_limits(_tavily_limiter(), lambda: _tavily_search().ainvoke(query), description="Tavily search")
+        return str(results)
+    except Exception as e:
+        print(f"[TOOL] Tavily search error: {e}")
+        return f"Error performing search: {str(e)}"
+
+def _duckduckgo(query: str):
     """
     Performs web search using DuckDuckGo API.
-    
+
     Args:
         query: The search query to look up on the web
-        
+
     Returns:
         str: Search results from DuckDuckGo
     """
     print(f"[TOOL] duckduckgo_search_tool called with query: {query}")
-    
+
     try:
-        wrapper = DuckDuckGoSearchAPIWrapper(region="in-en", time="d", max_results=3)
-        search_tool = DuckDuckGoSearchResults(
-            api_wrapper=wrapper,
-            source="news",
-            output_format="json",
-        )
-        
-        results = search_tool.invoke(query)
+        results = _duckduckgo_search().invoke(query)
         return str(results)
     except Exception as e:
         print(f"[TOOL] DuckDuckGo search error: {e}")
-        return f"Error performing search: {str(e)}"
\ No newline at end of file
+        return f"Error performing search: {str(e)}"
+
+async def _aduckduckgo(query: str):
+    print(f"[TOOL] duckduckgo_search_tool called with query: {query}")
+
+    try:
+        results = await _duckduckgo_search().ainvoke(query)
+        return str(results)
+    except Exception as e:
+        print(f"[TOOL] DuckDuckGo search error: {e}")
+        return f"Error performing search: {str(e)}"
+
+# Agents run with ainvoke call the coroutines, so searches do not block the event loop
+tavily_search_tool = StructuredTool.from_function(func=_tavily, coroutine=_atavily, name="tavily_search_tool")
+duckduckgo_search_tool = StructuredTool.from_function(func=_duckduckgo, coroutine=_aduckduckgo, name="duckduckgo_search_tool")
@@ -0,0 +1,158 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from src.utils.embedding_cache import normalize_query
+
+DEFAULT_ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+DEFAULT_ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# Semantic matching is opt-in: close paraphrases may differ in a date or a number
+DEFAULT_ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "0").lower() in ("1", "true", "on")
+# Cosine similarity above which a differently worded query reuses a cached answer
+DEFAULT_ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.98"))
+# Most recent substantive messages that make up the conversation context of an answer
+DEFAULT_CONTEXT_MESSAGES = int(os.getenv("ANSWER_CACHE_CONTEXT_MESSAGES", "4"))
+
+
+def context_fingerprint(messages: List[dict], last: int = None) -> str:
+    """
+    Returns a hash of the recent conversation, given as serialized messages, so an answer is
+    only reused for a query asked in the same context. Conversations with no history share
+    the empty fingerprint.
+    """
+    last = DEFAULT_CONTEXT_MESSAGES if last is None else last
+    recent = messages[-last:] if last > 0 else []
+    if not recent:
+        return ""
+    digest = hashlib.sha256()
+    for message in recent:
+        digest.update(f"{message.get('type')}\x00{normalize_query(str(message.get('content', '')))}\x01".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+class SemanticAnswerCache:
+    """
+    In-memory LRU cache of final answers with a time-to-live, looked up by normalised query
+    text and, when `semantic` is set, by meaning.
+
+    Entries are grouped by scope: collection, collection version and conversation context
+    fingerprint. A query first tries the exact fast path on its normalised text, which needs
+    no embedding. With `semantic`, its embedding is then compared with the cached queries of
+    the same scope in one matrix product, and the closest answer is returned if its cosine
+    similarity reaches `threshold`. Ingestion bumps the collection version, so answers over
+    old documents are never served. Exact hits, semantic hits and misses are counted in `stats()`.
+    """
+    def __init__(self, max_entries: int = None, ttl: float = None, threshold: float = None,
+                 semantic: bool = None):
+        self.max_entries = DEFAULT_ANSWER_CACHE_SIZE if max_entries is None else max_entries
+        self.ttl = DEFAULT_ANSWER_CACHE_TTL if ttl is None else ttl
+        self.threshold = DEFAULT_ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        self.semantic = DEFAULT_ANSWER_CACHE_SEMANTIC if semantic is None else semantic
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # (scope, normalised query) -> (unit embedding or None, answer, time stored)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._scopes: Dict[tuple, Dict[str, None]] = {}
+        self._lock = threading.Lock()
+
+    def _expired(self, entry: tuple) -> bool:
+        return self.ttl > 0 and time.monotonic() - entry[2] >= self.ttl
+
+    def _remove(self, key: tuple):
+        del self._entries[key]
+        queries = self._scopes.get(key[0])
+        if queries is not None:
+            queries.pop(key[1], None)
+            if not queries:
+                del self._scopes[key[0]]
+
+    def get_exact(self, scope: tuple, query: str) -> Optional[str]:
+        """
+        Returns the answer cached for the same normalised query. A miss is only counted when
+        semantic matching is off, since `get_similar` follows and counts it otherwise.
+        """
+        key = (scope, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                if not self.semantic:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry[1]
+
+    def get_similar(self, scope: tuple, embedding) -> Optional[Tuple[str, float]]:
+        """
+        Returns the answer and similarity of the closest cached query of the scope, if it
+        reaches the threshold.
+        """
+        query = self._unit(embedding)
+        with self._lock:
+            keys = [(scope, text) for text in self._scopes.get(scope, ())]
+            for key in [key for key in keys if self._expired(self._entries[key])]:
+                self._remove(key)
+                keys.remove(key)
+            # Entries stored while semantic matching was off have no embedding
+            keys = [key for key in keys if self._entries[key][0] is not None]
+            if query is None or not keys:
+                self.misses += 1
+                return None
+            similarities = np.stack([self._entries[key][0] for key in keys]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(keys[best])
+            self.semantic_hits += 1
+            return self._entries[keys[best]][1], float(similarities[best])
+
+    def put(self, scope: tuple, query: str, embedding, answer: str):
+        """
+        Stores an answer. `embedding` may be None when semantic matching is off.
+        """
+        vector = self._unit(embedding) if embedding is not None else None
+        if vector is None and self.semantic:
+            return
+        key = (scope, normalize_query(query))
+        with self._lock:
+            self._entries[key] = (vector, answer, time.monotonic())
+            self._entries.move_to_end(key)
+            self._scopes.setdefault(scope, {})[key[1]] = None
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    @staticmethod
+    def _unit(embedding) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                "entries": len(self._entries),
+                "scopes": len(self._scopes),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "semantic": self.semantic,
+                "threshold": self.threshold,
+            }
+
+
+# Process-wide cache; None when ANSWER_CACHE_SIZE is 0
+answer_cache = SemanticAnswerCache() if DEFAULT_ANSWER_CACHE_SIZE > 0 else None
@@ -0,0 +1,162 @@
+import os
+import re
+from collections import deque
+from typing import Iterable, Iterator, List, Tuple
+
+# A sentence runs up to and including its terminators, or to the end of the page
+_SENTENCE_RE = re.compile(r'[^.!?]+[.!?]*|[.!?]+')
+
+DEFAULT_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+DEFAULT_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "30"))
+
+
+def count_tokens(text: str) -> int:
+    """
+    Approximates the token count of a text as its number of whitespace-separated words.
+    """
+    return len(text.split())
+
+
+class _Sentence:
+    __slots__ = ("text", "start", "end", "page", "last_page", "tokens")
+
+    def __init__(self, text: str, start: int, end: int, page: int, last_page: int, tokens: int):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.page = page
+        self.last_page = last_page
+        self.tokens = tokens
+
+
+class Chunker:
+    """
+    Splits documents into overlapping chunks with a token budget, in a single pass over
+    sentence offsets. Tokens are approximated as whitespace-separated words.
+
+    Sentences are located with one regex scan per page and kept in a sliding window; the
+    window's size is tracked as a running token count, so no string is built just to be
+    measured. A chunk is emitted when the next sentence would exceed `max_tokens`, and the
+    next chunk starts with the trailing sentences of the previous one, up to `overlap_tokens`.
+    Sentences longer than `max_tokens` are cut at token boundaries. Nothing is dropped: the
+    trailing sentences of a document always form a final chunk.
+
+    Each chunk records its start/end character offsets in the document (the concatenation
+    of its page texts), the pages it spans, its token count, and `overlap_chars`, the length
+    of its prefix repeated from the previous chunk.
+    """
+    def __init__(self, max_tokens: int = None, overlap_tokens: int = None):
+        self.max_tokens = max(1, max_tokens or DEFAULT_MAX_TOKENS)
+        overlap_tokens = DEFAULT_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+
+    @staticmethod
+    def _make_sentence(raw: str, raw_start: int, page: int, last_page: int):
+        stripped = raw.strip()
+        if not stripped:
+            return None
+        start = raw_start + len(raw) - len(raw.lstrip())
+        # One split both normalises whitespace and counts tokens
+        words = stripped.split()
+        return _Sentence(" ".join(words), start, start + len(stripped), page, last_page, len(words))
+
+    def _sentences(self, pages: Iterable[Tuple[int, str]]) -> Iterator[_Sentence]:
+        """
+        Yields the sentences of a document with their offsets. An unterminated sentence at the
+        end of a page is joined with the first sentence of the next page.
+        """
+        offset = 0
+        pending = None  # (raw text, start offset, page) of an unterminated sentence from the previous page
+        for page_number, page_text in pages:
+            page_text = page_text or ""
+            for match in _SENTENCE_RE.finditer(page_text):
+                raw, raw_start, page = match.group(), offset + match.start(), page_number
+                if pending is not None:
+                    # Pages are joined as-is, like the text of the whole document
+                    raw, raw_start, page = pending[0] + raw, pending[1], pending[2]
+                    pending = None
+                sentence = self._make_sentence(raw, raw_start, page, page_number)
+                if sentence is None:
+                    continue
+                if sentence.text[-1] in ".!?" or sentence.tokens >= self.max_tokens:
+                    yield sentence
+                else:
+                    pending = (raw, raw_start, page)
+            offset += len(page_text)
+        if pending is not None:
+            sentence = self._make_sentence(*pending, page_number)
+            if sentence is not None:
+                yield sentence
+
+    def _fit(self, sentence: _Sentence) -> Iterator[_Sentence]:
+        """
+        Cuts a sentence longer than `max_tokens` into pieces at token boundaries.
+        """
+        if sentence.tokens <= self.max_tokens:
+            yield sentence
+            return
+        words = sentence.text.split(" ")
+        # Offsets inside a whitespace-normalised text only approximate document offsets
+        scale = (sentence.end - sentence.start) / max(1, len(sentence.text))
+        begin = 0
+        for first in range(0, len(words), self.max_tokens):
+            piece = " ".join(words[first:first + self.max_tokens])
+            yield _Sentence(
+                piece,
+                sentence.start + int(begin * scale),
+                sentence.start + int((begin + len(piece)) * scale),
+                sentence.page,
+                sentence.last_page,
+                len(words[first:first + self.max_tokens]),
+            )
+            begin += len(piece) + 1
+
+    def chunk_pages(self, pages: Iterable[Tuple[int, str]]) -> Iterator[dict]:
+        """
+        Chunks one document given as a stream of pages.
+
+        Parameters:
+        - pages (Iterable[Tuple[int, str]]): (page_number, page_text) tuples in page order.
+
+        Returns:
+        - Iterator[dict]: Chunks with 'text', 'start', 'end', 'page_start', 'page_end',
+          'n_tokens' and 'overlap_chars' keys.
+        """
+        window = deque()
+        window_tokens = 0
+        carried = 0  # Number of sentences at the front of the window repeated from the previous chunk
+
+        def make_chunk():
+            overlap_chars = 0
+            if carried:
+                overlap_chars = sum(len(window[i].text) for i in range(carried)) + carried
+            return {
+                'text': " ".join(sentence.text for sentence in window),
+                'start': window[0].start,
+                'end': window[-1].end,
+                'page_start': window[0].page,
+                'page_end': window[-1].last_page,
+                'n_tokens': window_tokens,
+                'overlap_chars': overlap_chars,
+            }
+
+        for long_sentence in self._sentences(pages):
+            for sentence in self._fit(long_sentence):
+                if window and window_tokens + sentence.tokens > self.max_tokens:
+                    yield make_chunk()
+                    # Keep the tail of the chunk as overlap, leaving room for the new sentence
+                    budget = min(self.overlap_tokens, self.max_tokens - sentence.tokens)
+                    while window and window_tokens > budget:
+                        window_tokens -= window.popleft().tokens
+                    carried = len(window)
+                window.append(sentence)
+                window_tokens += sentence.tokens
+
+        if len(window) > carried:
+            yield make_chunk()
+
+    def chunk_text(self, text: str) -> List[dict]:
+        """
+        Chunks a single text, treated as a one-page document.
+        """
+        return list(self.chunk_pages([(1, text)]))
@@ -0,0 +1,262 @@
+import os
+import re
+import time
+import hashlib
+import threading
+import contextvars
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+DEFAULT_COLLECTION = "agentic-rag"
+COLLECTION_PREFIX = os.getenv("COLLECTION_PREFIX", DEFAULT_COLLECTION)
+DEFAULT_MAX_HANDLES = int(os.getenv("COLLECTION_CACHE_SIZE", "128"))
+# Session collections idle for longer than this are deleted; 0 (the default) disables the reaper
+DEFAULT_TTL_SECONDS = float(os.getenv("COLLECTION_TTL_SECONDS", "0"))
+DEFAULT_REAP_INTERVAL = float(os.getenv("COLLECTION_REAP_INTERVAL_SECONDS", "300"))
+# Seconds the version of a collection read from the store is trusted before it is read again
+DEFAULT_VERSION_TTL = float(os.getenv("COLLECTION_VERSION_TTL_SECONDS", "5"))
+
+# Chroma collection names: 3-63 characters from [a-zA-Z0-9._-], starting and ending with a letter or digit
+_MAX_NAME_LENGTH = 63
+_INVALID_CHARS_RE = re.compile(r"[^a-zA-Z0-9_-]+")
+
+# Collection searched by tools running on behalf of the current graph node
+current_collection: contextvars.ContextVar[str] = contextvars.ContextVar("current_collection", default=DEFAULT_COLLECTION)
+
+
+def collection_name_for(thread_id: str = None, tenant_id: str = None) -> str:
+    """
+    Returns the collection of a tenant, or of a single chat thread when no tenant is given.
+    Identifiers are sanitised into a valid Chroma collection name; names that would be too long
+    are shortened with a hash so distinct identifiers never share a collection.
+    """
+    if tenant_id:
+        scope = f"t-{tenant_id}"
+    elif thread_id:
+        scope = thread_id
+    else:
+        return DEFAULT_COLLECTION
+
+    name = f"{COLLECTION_PREFIX}-{_INVALID_CHARS_RE.sub('-', scope).strip('-_')}"
+    if len(name) > _MAX_NAME_LENGTH or name.endswith("-"):
+        digest = hashlib.sha256(scope.encode("utf-8")).hexdigest()[:16]
+        name = f"{name[:_MAX_NAME_LENGTH - len(digest) - 1].rstrip('-_')}-{digest}"
+    return name
+
+
+class ClientPool:
+    """
+    Process-wide pool of vector-store clients, one per configuration (store type, credentials
+    or path). Reusing a client keeps its HTTP connections alive between queries instead of
+    opening a new session for every retriever call.
+    """
+    def __init__(self):
+        self._clients: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def get(self, key: tuple, factory: Callable[[], object]):
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.reused += 1
+                return client
+        # Build outside the lock: creating a cloud client does network I/O
+        client = factory()
+        with self._lock:
+            existing = self._clients.setdefault(key, client)
+            if existing is client:
+                self.created += 1
+            else:
+                self.reused += 1
+            return existing
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"clients": len(self._clients), "created": self.created, "reused": self.reused}
+
+
+class CollectionRegistry:
+    """
+    In-process cache of open collection handles, plus a reaper for idle session collections.
+
+    Handles are kept in an LRU of at most `max_handles` entries, keyed by collection name and
+    embedding backend, so a query reuses the handle instead of fetching the collection again.
+    Ingestion invalidates the handles of the collection it wrote, so the next query reloads
+    the collection with its new metadata. Hits, misses and load times are counted in `stats()`.
+
+    The registry also keeps a watermark of the version of every collection, read from the
+    store at most once per `version_ttl` seconds (see `version`), so ingestion by another worker
+    is noticed within that time without a round trip on every query.
+
+    When `ttl` is set, the last use of a collection is stored in its metadata through
+    `on_use`, at most once per `reap_interval` per process, so every worker sees it and it
+    survives restarts. A background thread lists the collections idle for longer than `ttl`
+    seconds from the store through `list_idle` and deletes them through `on_expire`. Only
+    collections created for a thread or tenant are reaped, never the shared default collection.
+    """
+    def __init__(self, max_handles: int = None, ttl: float = None, reap_interval: float = None,
+                 version_ttl: float = None):
+        self.max_handles = max_handles or DEFAULT_MAX_HANDLES
+        self.version_ttl = DEFAULT_VERSION_TTL if version_ttl is None else version_ttl
+        self.ttl = DEFAULT_TTL_SECONDS if ttl is None else ttl
+        self.reap_interval = reap_interval or DEFAULT_REAP_INTERVAL
+        self.on_expire: Optional[Callable[[str], None]] = None
+        self.on_use: Optional[Callable[[str], None]] = None
+        self.list_idle: Optional[Callable[[float], Iterable[str]]] = None
+        self.is_busy: Optional[Callable[[str], bool]] = None
+        self.on_invalidate: Optional[Callable[[str], None]] = None
+        self._handles: "OrderedDict[tuple, object]" = OrderedDict()
+        # When this process last stored the use of each collection (time.monotonic())
+        self._recorded: Dict[str, float] = {}
+        # Collection name -> (version read from the store, time.monotonic() it was read)
+        self._versions: Dict[str, tuple] = {}
+        self.version_refreshes = 0
+        self._lock = threading.Lock()
+        self._reaper = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.load_seconds = 0.0
+
+    def get(self, name: str, backend_id: str, loader: Callable[[], object]):
+        """
+        Returns the cached handle of a collection, calling `loader` to open it on a miss and
+        caching the result, evicting the least recently used handle if the cache is full.
+        """
+        key = (name, backend_id)
+        self._record_use(name)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None:
+                self._handles.move_to_end(key)
+                self.hits += 1
+                return handle
+        started = time.perf_counter()
+        handle = loader()
+        with self._lock:
+            self.misses += 1
+            self.load_seconds += time.perf_counter() - started
+            self._handles[key] = handle
+            self._handles.move_to_end(key)
+            while len(self._handles) > self.max_handles:
+                self._handles.popitem(last=False)
+                self.evictions += 1
+        return handle
+
+    def invalidate(self, name: str):
+        """
+        Drops the cached handles of a collection after it was re-ingested or deleted, and
+        notifies `on_invalidate` so results cached for the collection are dropped too.
+        """
+        with self._lock:
+            keys = [key for key in self._handles if key[0] == name]
+            for key in keys:
+                del self._handles[key]
+            self._versions.pop(name, None)
+            self.invalidations += len(keys)
+        if self.on_invalidate is not None:
+            self.on_invalidate(name)
+
+    def version(self, name: str, fetch: Callable[[], int]) -> int:
+        """
+        Returns the version of a collection, calling `fetch` to read it from the store when
+        the watermark is older than `version_ttl` seconds or was dropped by an invalidation.
+        """
+        now = time.monotonic()
+        with self._lock:
+            watermark = self._versions.get(name)
+            if watermark is not None and now - watermark[1] < self.version_ttl:
+                return watermark[0]
+        version = fetch()
+        with self._lock:
+            self._versions[name] = (version, now)
+            self.version_refreshes += 1
+        return version
+
+    def forget(self, name: str):
+        self.invalidate(name)
+        with self._lock:
+            self._recorded.pop(name, None)
+
+    def _record_use(self, name: str):
+        if self.ttl <= 0 or self.on_use is None or name == DEFAULT_COLLECTION:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._start_reaper()
+            recorded = self._recorded.get(name)
+            if recorded is not None and now - recorded < self.reap_interval:
+                return
+            self._recorded[name] = now
+        # Ingestion stores the use itself; writing the metadata meanwhile could race its manifest
+        if self.is_busy is not None and self.is_busy(name):
+            return
+        try:
+            self.on_use(name)
+        except Exception as e:
+            # Not fatal: the collection is only reaped after a full TTL without any recorded use
+            print(f"[COLLECTIONS] ⚠️ Could not record the use of '{name}': {str(e)}")
+
+    def _start_reaper(self):
+        if self._reaper is not None or self.ttl <= 0:
+            return
+        self._reaper = threading.Thread(target=self._reap_forever, name="collection-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"[COLLECTIONS] ❌ Reaper error: {str(e)}")
+
+    def reap(self) -> int:
+        """
+        Deletes the session collections whose last use, read from their metadata, is older
+        than the TTL. Several workers may reap the same store; a collection already deleted
+        by another one is skipped.
+
+        Returns:
+            int: The number of collections deleted.
+        """
+        if self.ttl <= 0 or self.on_expire is None or self.list_idle is None:
+            return 0
+        cutoff = time.time() - self.ttl
+        reaped = 0
+        for name in self.list_idle(cutoff):
+            if name == DEFAULT_COLLECTION or (self.is_busy is not None and self.is_busy(name)):
+                continue
+            try:
+                self.on_expire(name)
+            except Exception as e:
+                print(f"[COLLECTIONS] ⚠️ Could not delete idle collection '{name}': {str(e)}")
+                continue
+            finally:
+                self.forget(name)
+            reaped += 1
+            print(f"[COLLECTIONS] 🧹 Deleted idle collection '{name}'")
+        return reaped
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "handles": len(self._handles),
+                "tracked_collections": len(self._recorded),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "version_refreshes": self.version_refreshes,
+                "avg_load_ms": 1000 * self.load_seconds / self.misses if self.misses else 0.0,
+            }
+
+
+# Process-wide client pool and registry shared by ingestion and retrieval
+client_pool = ClientPool()
+collection_registry = CollectionRegistry()
@@ -3,47 +3,123 @@
 # sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 
 import os
-import re
-from typing import List
+import time
+import itertools
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Tuple
 from datetime import datetime
 from pypdf import PdfReader
 import chromadb
-from src.utils.gemini_embedding import GeminiEmbeddingFunction
+from src.utils.gemini_embedding import BackendEmbeddingFunction
+from src.utils.embedding_backends import BACKEND_METADATA_KEY, EmbeddingBackend, get_embedding_backend, check_collection_backend
+from src.utils.pdf_extract import iter_pdf_pages
+from src.utils.pipeline import bounded_stage, batched
+from src.utils.manifest import LAST_USED_KEY, IngestManifest, collection_last_used, collection_version, hash_file, hash_text, chunk_id
+from src.utils.chunker import Chunker
+from src.utils.collection_registry import COLLECTION_PREFIX, DEFAULT_COLLECTION, client_pool, collection_registry
+from src.utils.local_vector_store import LocalVectorClient
+from src.utils.lexical_index import LexicalIndex, open_lexical_index, drop_lexical_index
 
+# Directory under DB_PATH holding the BM25 index of every collection. Collection names
+# cannot start with "_", so it never clashes with a local collection
+LEXICAL_INDEX_DIR = "_lexical"
+
+
+
+class IngestionCancelled(Exception):
+    """Raised inside the ingestion pipeline when its job has been cancelled."""
+
+
+class IngestionProgress:
+    """
+    Receives progress from `IngestData.run_ingestion_pipeline`. The base class ignores
+    everything; see `src.utils.ingestion_jobs.IngestionJob` for a tracking implementation.
+    """
+    def update(self, **counters: int):
+        pass
+
+    def add_error(self, message: str):
+        pass
+
+    def is_cancelled(self) -> bool:
+        return False
 
 
 class IngestData:
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, batch_size: int = None, max_retries: int = 3, retry_backoff: float = 1.0,
+                 embedding_backend: EmbeddingBackend = None):
         # Use a user data directory outside the project to avoid Streamlit watcher issues
         # default_path = os.path.join(str(Path.home()), "vectorDB")
         # self.DB_PATH = db_path or default_path
-        self.DB_PATH = "./src/data/vectorDB"
+        self.DB_PATH = db_path or os.getenv("VECTOR_DB_PATH", "./src/data/vectorDB")
+
+        # Vector store: "chroma" (Chroma Cloud) or "local" (on-disk NumPy store under DB_PATH)
+        self.vector_store = os.getenv("VECTOR_STORE", "chroma").lower()
+        if self.vector_store not in ("chroma", "local"):
+            raise ValueError(f"Unknown VECTOR_STORE '{self.vector_store}'. Use 'chroma' or 'local'")
+        # Search index of the local store: "flat" (exact), "ivf" (approximate, for large collections),
+        # or "int8"/"binary" (compressed codes in memory, rescored from the vector file)
+        self.local_index = os.getenv("LOCAL_VECTOR_INDEX", "flat").lower()
 
         # ChromaDB Cloud configuration
         self.chroma_api_key = os.getenv("CHROMA_API_KEY")
         self.chroma_tenant = os.getenv("CHROMA_TENANT")
         self.chroma_database = os.getenv("CHROMA_DATABASE")
         
-        if not self.chroma_api_key:
-            raise ValueError("CHROMA_API_KEY environment variable is required for Chroma Cloud")
-        if not self.chroma_tenant:
-            raise ValueError("CHROMA_TENANT environment variable is required for Chroma Cloud")
-        if not self.chroma_database:
-            raise ValueError("CHROMA_DATABASE environment variable is required for Chroma Cloud")
+        if self.vector_store == "chroma":
+            if not self.chroma_api_key:
+                raise ValueError("CHROMA_API_KEY environment variable is required for Chroma Cloud")
+            if not self.chroma_tenant:
+                raise ValueError("CHROMA_TENANT environment variable is required for Chroma Cloud")
+            if not self.chroma_database:
+                raise ValueError("CHROMA_DATABASE environment variable is required for Chroma Cloud")
 
         self.pinecone_api_key = os.getenv("PINECONE_API_KEY")
         self.google_api_key = os.getenv("GOOGLE_GENAI_API_KEYS")
 
+        # Batched ingestion settings: one embedding call and one upsert per batch
+        self.batch_size = batch_size or int(os.getenv("INGEST_BATCH_SIZE", "100"))
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.last_ingestion_report = None
+        # Embedding backend of the collections this instance creates or opens (EMBEDDING_BACKEND)
+        self.embedding_backend = embedding_backend or get_embedding_backend()
+        self.embedding_function = BackendEmbeddingFunction(self.embedding_backend)
+        # Token-based chunking, sized by CHUNK_MAX_TOKENS / CHUNK_OVERLAP_TOKENS
+        self.chunker = Chunker()
+
+        # Maximum number of pages buffered between the extraction and chunking stages
+        self.queue_size = int(os.getenv("INGEST_QUEUE_SIZE", "64"))
+
     def _get_chroma_client(self):
         """
-        Returns a ChromaDB Cloud client
+        Returns a ChromaDB Cloud client, or a client for the local vector store when
+        VECTOR_STORE is "local". Clients come from the process-wide pool, so their
+        connections are reused across calls.
         """
-        return chromadb.CloudClient(
-            api_key=self.chroma_api_key,
-            tenant=self.chroma_tenant,
-            database=self.chroma_database
+        if self.vector_store == "local":
+            return client_pool.get(
+                ("local", os.path.abspath(self.DB_PATH), self.local_index),
+                lambda: LocalVectorClient(self.DB_PATH, index=self.local_index),
+            )
+        return client_pool.get(
+            ("chroma", self.chroma_api_key, self.chroma_tenant, self.chroma_database),
+            lambda: chromadb.CloudClient(
+                api_key=self.chroma_api_key,
+                tenant=self.chroma_tenant,
+                database=self.chroma_database
+            ),
         )
 
+    def lexical_index(self, name: str, version: int = None) -> LexicalIndex:
+        """
+        Returns the BM25 index of a collection, kept on local disk under DB_PATH for both
+        vector stores, so lexical search never needs the network. Pass the current collection
+        `version` to reload an index written by another process since it was opened.
+        """
+        return open_lexical_index(os.path.join(self.DB_PATH, LEXICAL_INDEX_DIR), name, version)
+
     def load_pdf(self, file_path):
         """
         Reads the text content from a PDF file and returns it as a single string.
@@ -58,67 +134,290 @@ class IngestData:
             # Logic to read pdf
             reader = PdfReader(file_path)
 
-            # Loop over each page and store it in a variable
-            text = ""
-            for i, page in enumerate(reader.pages):
-                page_text = page.extract_text()
-                text += page_text
-
-            return text
+            # Collect the pages and join once, instead of growing a string page by page
+            return "".join(page.extract_text() or "" for page in reader.pages)
         except Exception as e:
             raise
 
     def split_text(self, text: str):
         """
-        Splits a text string into chunks with proper size limits and overlap.
+        Splits a text string into chunks with token size limits and overlap, see `Chunker`.
         
         Parameters:
         - text (str): The input text to be split.
 
         Returns:
-        - List[str]: A list containing text chunks with minimum size.
+        - List[str]: A list containing the text chunks.
         """
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        # Split by sentences first (more natural boundaries)
-        sentences = re.split(r'[.!?]+', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
-        
-        chunks = []
-        current_chunk = ""
-        min_chunk_size = 100  # Minimum characters per chunk
-        max_chunk_size = 1000  # Maximum characters per chunk
-        
-        for idx, sentence in enumerate(sentences):
-            # If adding this sentence would exceed max size, save current chunk
-            if current_chunk and len(current_chunk + " " + sentence) > max_chunk_size:
-                if len(current_chunk) >= min_chunk_size:
-                    chunks.append(current_chunk)
-                current_chunk = sentence
+        return [chunk['text'] for chunk in self.chunker.chunk_text(text)]
+
+    def iter_chunks(self, pages: Iterable[Tuple[int, str, int, str]]) -> Iterator[dict]:
+        """
+        Streams chunks out of a stream of pages, chunking each file with `self.chunker`.
+        Only the sentences of the chunk being built are held in memory.
+
+        Parameters:
+        - pages (Iterable[Tuple[int, str, int, str]]): (file_index, file_path, page_number, page_text)
+          tuples, grouped by file and in page order, as produced by `iter_pdf_pages`.
+
+        Returns:
+        - Iterator[dict]: Chunks with 'filename', 'file_index' and 'chunk_index' keys on top of
+          the keys produced by `Chunker.chunk_pages`.
+        """
+        for (file_index, file_path), file_pages in itertools.groupby(pages, key=lambda page: (page[0], page[1])):
+            file_name = os.path.basename(file_path)
+            file_pages = ((page_number, page_text) for _, _, page_number, page_text in file_pages)
+            for chunk_index, chunk in enumerate(self.chunker.chunk_pages(file_pages)):
+                chunk['filename'] = file_name
+                chunk['file_index'] = file_index
+                chunk['chunk_index'] = chunk_index
+                yield chunk
+
+    def _with_retries(self, action: Callable, description: str):
+        """
+        Runs `action`, retrying with exponential backoff.
+
+        Returns:
+        - Tuple[Any, Exception | None]: The result of `action`, and the last error if every attempt failed.
+        """
+        last_error = None
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                return action(), None
+            except Exception as e:
+                last_error = e
+                print(f"[INGEST] ⚠️ {description} attempt {attempt}/{self.max_retries} failed: {e}")
+                if attempt < self.max_retries:
+                    time.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+        return None, last_error
+
+    def _identify_chunks(self, chunks: Iterable[dict], file_hashes: Dict[str, str]) -> Iterator[dict]:
+        """
+        Gives every chunk a stable, content-derived id: the same text in the same document
+        always maps to the same id, whatever its position.
+        """
+        doc_id, occurrences = None, {}
+        for chunk in chunks:
+            if chunk['filename'] != doc_id:
+                doc_id, occurrences = chunk['filename'], {}
+            chunk_hash = hash_text(chunk['text'])
+            occurrence = occurrences.get(chunk_hash, 0)
+            occurrences[chunk_hash] = occurrence + 1
+            chunk['doc_id'] = doc_id
+            chunk['chunk_hash'] = chunk_hash
+            chunk['file_hash'] = file_hashes.get(doc_id, "")
+            chunk['id'] = chunk_id(doc_id, chunk_hash, occurrence)
+            yield chunk
+
+    def _link_chunks(self, chunks: Iterable[dict]) -> Iterator[dict]:
+        """
+        Records the ids of the previous and next chunk of the same document in 'prev_id' and
+        'next_id' ("" at the document edges), looking ahead by one chunk.
+        """
+        previous = None
+        for chunk in chunks:
+            same_doc = previous is not None and previous['doc_id'] == chunk['doc_id']
+            chunk['prev_id'] = previous['id'] if same_doc else ""
+            if previous is not None:
+                previous['next_id'] = chunk['id'] if same_doc else ""
+                yield previous
+            previous = chunk
+        if previous is not None:
+            previous['next_id'] = ""
+            yield previous
+
+    def _embed_batches(self, batches: Iterable[List[dict]], embedding_function, existing: Dict[str, Set[str]]) -> Iterator[dict]:
+        """
+        Embeds the new chunks of every batch with a single embedding call. Chunks whose id is
+        already stored are passed through without being embedded again.
+
+        Returns:
+        - Iterator[dict]: Batches with 'new', 'kept', 'embeddings' and 'error' keys.
+        """
+        timestamp = str(datetime.now())
+        for batch in batches:
+            for chunk in batch:
+                # Add metadata for better organization
+                chunk['metadata'] = {
+                    'filename': chunk['filename'],
+                    'doc_id': chunk['doc_id'],
+                    'file_hash': chunk['file_hash'],
+                    'chunk_hash': chunk['chunk_hash'],
+                    "chunk_index": chunk['chunk_index'],
+                    "chunk_size": len(chunk['text']),
+                    "timestamp": timestamp
+                }
+                # Position of the chunk in its document and links to its neighbours, when known
+                for key in ('page_start', 'page_end', 'start', 'end', 'n_tokens', 'overlap_chars', 'prev_id', 'next_id'):
+                    if chunk.get(key) is not None:
+                        chunk['metadata'][key] = chunk[key]
+
+            new = [chunk for chunk in batch if chunk['id'] not in existing.get(chunk['doc_id'], ())]
+            kept = [chunk for chunk in batch if chunk['id'] in existing.get(chunk['doc_id'], ())]
+
+            embeddings, error = None, None
+            if new:
+                texts = [chunk['text'] for chunk in new]
+                embeddings, error = self._with_retries(lambda: embedding_function(texts), "Batch embedding")
+            yield {'new': new, 'kept': kept, 'embeddings': embeddings, 'error': error}
+
+    def _track_pages(self, pages: Iterable[Tuple[int, str, int, str]], progress: IngestionProgress):
+        """
+        Reports parsed pages and files, and stops the pipeline once the job is cancelled.
+        """
+        file_index = None
+        for page in pages:
+            if progress.is_cancelled():
+                raise IngestionCancelled("Ingestion cancelled")
+            if page[0] != file_index:
+                if file_index is not None:
+                    progress.update(files_parsed=1)
+                file_index = page[0]
+            progress.update(pages_parsed=1)
+            yield page
+        if file_index is not None:
+            progress.update(files_parsed=1)
+
+    def _write_batches(self, db, embedded_batches: Iterable[dict], report: dict, progress: IngestionProgress,
+                       lexical: LexicalIndex = None) -> Tuple[Dict[str, Set[str]], Set[str]]:
+        """
+        Writes the new chunks of every batch with a single upsert and refreshes the metadata of
+        the chunks that were already stored, recording the outcome in `report` and `progress`.
+        Chunks written successfully are also added to the `lexical` index.
+
+        Returns:
+        - Tuple[Dict[str, Set[str]], Set[str]]: The chunk ids seen per document, and the documents with failed batches.
+        """
+        seen = defaultdict(set)
+        failed_docs = set()
+        for batch in embedded_batches:
+            if progress.is_cancelled():
+                raise IngestionCancelled("Ingestion cancelled")
+            new, kept, error = batch['new'], batch['kept'], batch['error']
+            if new and error is None:
+                _, error = self._with_retries(
+                    lambda: db.upsert(ids=[chunk['id'] for chunk in new], documents=[chunk['text'] for chunk in new],
+                                      embeddings=batch['embeddings'], metadatas=[chunk['metadata'] for chunk in new]),
+                    "Batch write"
+                )
+            if kept:
+                # Positions may have shifted; updating metadata does not re-embed
+                _, kept_error = self._with_retries(
+                    lambda: db.update(ids=[chunk['id'] for chunk in kept], metadatas=[chunk['metadata'] for chunk in kept]),
+                    "Metadata update"
+                )
+                error = error or kept_error
+
+            report["batches"] += 1
+            for chunk in new + kept:
+                seen[chunk['doc_id']].add(chunk['id'])
+            if error is None:
+                report["chunks_embedded"] += len(new)
+                report["chunks_reused"] += len(kept)
+                progress.update(chunks_embedded=len(new), chunks_reused=len(kept))
+                if lexical is not None:
+                    # Kept chunks only have their metadata refreshed, or are indexed if missing
+                    lexical.upsert([chunk['id'] for chunk in new + kept], [chunk['text'] for chunk in new + kept],
+                                   [chunk['metadata'] for chunk in new + kept])
             else:
-                # Add sentence to current chunk
-                if current_chunk:
-                    current_chunk += " " + sentence
-                else:
-                    current_chunk = sentence
-        
-        # Add the last chunk if it meets minimum size
-        if current_chunk and len(current_chunk) >= min_chunk_size:
-            chunks.append(current_chunk)
-        
-        # If no chunks meet minimum size, create one chunk anyway
-        if not chunks and text:
-            chunks = [text]
-        
-        return chunks
+                # Continue with the other batches even if one fails
+                chunks = new + kept
+                report["chunks_failed"] += len(chunks)
+                failed_docs.update(chunk['doc_id'] for chunk in chunks)
+                report["failed_batches"].append({"first_id": chunks[0]['id'], "last_id": chunks[-1]['id'], "error": str(error)})
+                progress.update(chunks_failed=len(chunks))
+                progress.add_error(f"Batch of {len(chunks)} chunk(s) failed: {error}")
+        return seen, failed_docs
+
+    def _sync_chunks(self, db, chunks: Iterable[dict], manifest: IngestManifest, doc_hashes: Dict[str, str],
+                     failed_docs: Set[str] = None, progress: IngestionProgress = None) -> dict:
+        """
+        Streams the chunks of the given documents into the collection and brings each document
+        in line with its new version: only unseen chunks are embedded, chunks that disappeared
+        are deleted, and the manifest records the documents that were fully ingested. Batching,
+        embedding and writing run as concurrent stages connected by bounded queues. The BM25
+        index of the collection is kept in step with the vector store.
 
-    def create_chroma_db(self, documents:List, name:str="agentic-rag"):
+        Parameters:
+        - db (chromadb.Collection): The collection to write to.
+        - chunks (Iterable[dict]): The chunks of the documents, grouped by document.
+        - manifest (IngestManifest): The manifest of the collection.
+        - doc_hashes (Dict[str, str]): The file hash of every document being ingested.
+        - failed_docs (Set[str]): Documents that could not be read; their stored chunks are left untouched.
+          Only read once `chunks` is exhausted, so upstream stages may still add to it.
+        - progress (IngestionProgress): Receives per-batch progress and cancels the sync.
+
+        Returns:
+        - dict: The ingestion report.
+        """
+        report = {"batches": 0, "chunks_embedded": 0, "chunks_reused": 0, "chunks_failed": 0,
+                  "chunks_deleted": 0, "files_skipped": 0, "failed_batches": []}
+        progress = progress or IngestionProgress()
+        existing = manifest.chunk_ids(doc_hashes)
+
+        batches = batched(self._link_chunks(self._identify_chunks(chunks, doc_hashes)), self.batch_size)
+        embedded_batches = bounded_stage(self._embed_batches(batches, self.embedding_function, existing), maxsize=2, name="embed")
+        lexical = self.lexical_index(db.name)
+        try:
+            seen, write_failures = self._write_batches(db, embedded_batches, report, progress, lexical)
+            failed_docs = set(failed_docs or ()) | write_failures
+
+            for doc_id, file_hash in doc_hashes.items():
+                if doc_id in failed_docs:
+                    # Keep the previous chunks and leave the manifest untouched so the next upload retries
+                    continue
+                stale = existing.get(doc_id, set()) - seen.get(doc_id, set())
+                if stale:
+                    db.delete(ids=list(stale))
+                    lexical.delete(list(stale))
+                    report["chunks_deleted"] += len(stale)
+                    progress.update(chunks_deleted=len(stale))
+                manifest.mark(doc_id, file_hash)
+        finally:
+            # Chunks written before a cancellation or failure stay searchable, and results
+            # cached before them are dropped
+            lexical.save()
+            manifest.bump_version()
+            manifest.save()
+            # Queries reload the collection, and with it the new manifest
+            collection_registry.invalidate(db.name)
+
+        self.last_ingestion_report = report
+        print(f"[INGEST] 📦 Embedded {report['chunks_embedded']} new chunk(s), reused {report['chunks_reused']}, "
+              f"deleted {report['chunks_deleted']} stale, {len(report['failed_batches'])} batch(es) failed")
+
+        if report["failed_batches"] and not (report["chunks_embedded"] or report["chunks_reused"]):
+            raise ValueError(f"All {report['batches']} ingestion batch(es) failed: {report['failed_batches'][-1]['error']}")
+
+        return report
+
+    def _get_or_create_collection(self, name: str):
+        """
+        Opens a collection, creating it with the configured embedding backend recorded in its
+        metadata if it does not exist yet. Collections embedded by another backend are rejected.
+
+        The collection is always fetched fresh, so the manifest in its metadata is current.
+        """
+        chroma_client = self._get_chroma_client()
+        try:
+            db = chroma_client.get_collection(name=name, embedding_function=self.embedding_function)
+        except Exception as e:
+            db = chroma_client.create_collection(
+                name=name, embedding_function=self.embedding_function,
+                metadata={BACKEND_METADATA_KEY: self.embedding_backend.id, LAST_USED_KEY: time.time()}
+            )
+        check_collection_backend(db, self.embedding_backend)
+        return db
+
+    def create_chroma_db(self, documents:List, name:str=DEFAULT_COLLECTION):
         """
         Creates a Chroma database using the provided documents, path, and collection name.
+        The collection is rebuilt from scratch; use `run_ingestion_pipeline` to update it
+        incrementally. Documents are embedded and written in batches of `self.batch_size`;
+        the outcome of every batch is recorded in `self.last_ingestion_report`.
 
         Parameters:
         - documents: An iterable of documents to be added to the Chroma database.
-        - path (str): The path where the Chroma database will be stored.
         - name (str): The name of the collection within the Chroma database.
 
         Returns:
@@ -132,82 +431,223 @@ class IngestData:
                 chroma_client.delete_collection(name)
             except Exception as e:
                 pass  # Ignore if it doesn't exist
+            collection_registry.invalidate(name)
+            self.lexical_index(name).clear()
             
-            db = chroma_client.create_collection(name=name, embedding_function=GeminiEmbeddingFunction())
-
-            for idx, dict_data in enumerate(documents):
-                try:
-                    # Add metadata for better organization
-                    metadata = {
-                        'filename': dict_data['filename'],
-                        "chunk_index": idx,
-                        "chunk_size": len(dict_data['text']),
-                        "timestamp": str(datetime.now())
-                    }
-                    db.add(documents=dict_data['text'], ids=str(idx), metadatas=metadata)
-                except Exception as e:
-                    # Continue with other documents even if one fails
-                    continue
+            db = chroma_client.create_collection(
+                name=name, embedding_function=self.embedding_function,
+                metadata={BACKEND_METADATA_KEY: self.embedding_backend.id, LAST_USED_KEY: time.time()}
+            )
+
+            # Number the chunks per document and group them by document
+            chunks, doc_chunks = [], defaultdict(int)
+            for dict_data in documents:
+                chunks.append({**dict_data, 'chunk_index': doc_chunks[dict_data['filename']]})
+                doc_chunks[dict_data['filename']] += 1
+            chunks.sort(key=lambda chunk: chunk['filename'])
+            doc_hashes = {chunk['filename']: "" for chunk in chunks}
 
+            self._sync_chunks(db, chunks, IngestManifest(db), doc_hashes)
             return db, name
             
         except Exception as e:
             raise
     
-    def run_ingestion_pipeline(self, file_paths: List[str]):
+    def run_ingestion_pipeline(self, file_paths: List[str], max_workers: int = None, file_timeout: float = None,
+                               name: str = DEFAULT_COLLECTION, progress: IngestionProgress = None):
         """
-        Runs the data ingestion pipeline
+        Runs the data ingestion pipeline incrementally. Files whose content hash matches the
+        collection manifest are skipped; changed files are diffed chunk by chunk so only new
+        chunks are embedded and stale ones deleted. Documents are identified by file name.
+
+        The pipeline runs as a stream: pages -> sentences -> chunks -> embedding batches ->
+        vector-store writes. Stages are connected by bounded queues, so memory stays flat
+        regardless of corpus size and chunks reach the collection while later pages are still
+        being parsed. PDF text extraction is spread across a process pool, see
+        `src.utils.pdf_extract.iter_pdf_pages`.
 
         Args:
             file_paths (List[str]): A list of file paths to the PDF files.
+            max_workers (int): Maximum number of extraction worker processes.
+            file_timeout (float): Seconds a single file may take to extract before it is skipped.
+            name (str): The name of the collection to ingest into.
+            progress (IngestionProgress): Receives file, page and chunk counters and errors. When it
+                reports cancellation, the pipeline stops with `IngestionCancelled`; chunks already
+                written are kept and reused by the next run.
+
+        Returns:
+            int: The number of chunks in the ingested (changed) files.
         """
-        any_content = False
-        total_chunks = 0
-        all_chunks = []
-        
-        for i, file in enumerate(file_paths):
-            try:
-                # Load PDF content
-                text = self.load_pdf(file)
-                
-                if not text or not text.strip():
-                    continue
-                
-                # Split text into chunks
-                chunked_text = self.split_text(text)
-                
-                if not chunked_text:
-                    continue
-                
-                # Add file information to chunks
-                file_name = os.path.basename(file)
-                for j, chunk in enumerate(chunked_text):
-                    all_chunks.append({
-                        'text': chunk,
-                        'file_name': file_name,
-                        'file_index': i,
-                        'chunk_index': j
-                    })
-                
-                total_chunks += len(chunked_text)
-                any_content = True
-                
-            except Exception as e:
-                continue
-        
-        if not any_content:
+        progress = progress or IngestionProgress()
+        db = self._get_or_create_collection(name)
+        manifest = IngestManifest(db)
+
+        # The latest upload of a file name wins
+        paths_by_doc = {os.path.basename(file_path): file_path for file_path in file_paths}
+        doc_hashes, skipped = {}, 0
+        for doc_id, file_path in paths_by_doc.items():
+            file_hash = hash_file(file_path)
+            if manifest.is_unchanged(doc_id, file_hash):
+                print(f"[INGEST] ⏭️ {doc_id} unchanged, skipping")
+                skipped += 1
+            else:
+                doc_hashes[doc_id] = file_hash
+        progress.update(files_skipped=skipped)
+
+        unreadable_docs = set()
+
+        def on_extract_error(file_path, message):
+            unreadable_docs.add(os.path.basename(file_path))
+            print(f"[INGEST] ❌ {os.path.basename(file_path)}: {message}")
+            progress.add_error(f"{os.path.basename(file_path)}: {message}")
+
+        pages = bounded_stage(
+            iter_pdf_pages([paths_by_doc[doc_id] for doc_id in doc_hashes], max_workers=max_workers,
+                           file_timeout=file_timeout, on_error=on_extract_error),
+            maxsize=self.queue_size, name="extract"
+        )
+        chunks = bounded_stage(self.iter_chunks(self._track_pages(pages, progress)), maxsize=self.batch_size * 2, name="chunk")
+
+        report = self._sync_chunks(db, chunks, manifest, doc_hashes, failed_docs=unreadable_docs, progress=progress)
+        report["files_skipped"] = skipped
+
+        total_chunks = report["chunks_embedded"] + report["chunks_reused"] + report["chunks_failed"]
+        if not total_chunks and not skipped:
             error_msg = "No valid content found in any of the provided files"
             raise ValueError(error_msg)
         
-        # Create ChromaDB collection with all chunks
-        if all_chunks:
-            self.create_chroma_db([{'text': chunk['text'], 'filename': chunk['file_name']} for chunk in all_chunks], "agentic-rag")
-        
         return total_chunks
 
-    def load_chroma_collection(self, name: str = "agentic-rag"):
+    def delete_document(self, doc_id: str, name: str = DEFAULT_COLLECTION) -> int:
+        """
+        Deletes every chunk of a document from the collection and drops it from the manifest.
+
+        Parameters:
+        - doc_id (str): The document id, i.e. its file name.
+        - name (str): The name of the collection.
+
+        Returns:
+        - int: The number of chunks deleted.
+        """
+        db = self._get_or_create_collection(name)
+        manifest = IngestManifest(db)
+        ids = manifest.chunk_ids([doc_id]).get(doc_id, set())
+        if ids:
+            db.delete(ids=list(ids))
+            lexical = self.lexical_index(name)
+            lexical.delete(list(ids))
+            lexical.save()
+        manifest.remove(doc_id)
+        manifest.bump_version()
+        manifest.save()
+        collection_registry.invalidate(name)
+        print(f"[INGEST] 🗑️ Deleted {len(ids)} chunk(s) of {doc_id}")
+        return len(ids)
+
+    def replace_document(self, file_path: str, doc_id: str = None, name: str = DEFAULT_COLLECTION) -> int:
+        """
+        Replaces a stored document with the content of `file_path`. Chunks shared by both
+        versions are kept without re-embedding.
+
+        Parameters:
+        - file_path (str): The file path to the new version of the document.
+        - doc_id (str): The document to replace, when it was stored under another file name.
+        - name (str): The name of the collection.
+
+        Returns:
+        - int: The number of chunks in the new version.
+        """
+        if doc_id and doc_id != os.path.basename(file_path):
+            self.delete_document(doc_id, name)
+        return self.run_ingestion_pipeline([file_path], name=name)
+
+    def delete_collection(self, name: str):
+        """
+        Deletes a collection with all its documents and drops its cached handle.
+
+        Parameters:
+        - name (str): The name of the collection to delete.
+        """
+        try:
+            self._get_chroma_client().delete_collection(name)
+        finally:
+            collection_registry.forget(name)
+            drop_lexical_index(os.path.join(self.DB_PATH, LEXICAL_INDEX_DIR), name)
+
+    def record_use(self, name: str):
+        """
+        Stores the current time as the last use of a collection in its metadata, which the
+        collection reaper reads. The collection is fetched fresh so its manifest is kept.
+
+        Parameters:
+        - name (str): The name of the collection.
+        """
+        db = self._get_chroma_client().get_collection(name=name, embedding_function=self.embedding_function)
+        metadata = {key: value for key, value in (db.metadata or {}).items() if not key.startswith("hnsw:")}
+        metadata[LAST_USED_KEY] = time.time()
+        db.modify(metadata=metadata)
+
+    def idle_collections(self, cutoff: float) -> List[str]:
+        """
+        Lists the thread and tenant collections last used before `cutoff` (seconds since the
+        epoch). Collections with no recorded use, e.g. created before uses were recorded,
+        are stamped now so they are reaped after a full TTL.
+
+        Parameters:
+        - cutoff (float): The time before which a collection is idle.
+
+        Returns:
+        - List[str]: The names of the idle collections.
         """
-        Loads an existing ChromaDB collection.
+        chroma_client = self._get_chroma_client()
+        idle = []
+        for collection in chroma_client.list_collections():
+            # Chroma clients return collections, older ones and the local store names
+            name = getattr(collection, "name", collection)
+            if not name.startswith(f"{COLLECTION_PREFIX}-"):
+                continue
+            try:
+                last_used = collection_last_used(chroma_client.get_collection(name=name, embedding_function=self.embedding_function))
+                if not last_used:
+                    self.record_use(name)
+                elif last_used < cutoff:
+                    idle.append(name)
+            except Exception as e:
+                # Deleted meanwhile, e.g. by the reaper of another worker
+                print(f"[INGEST] ⚠️ Could not read the last use of '{name}': {str(e)}")
+        return idle
+
+    def rebuild_lexical_index(self, name: str = DEFAULT_COLLECTION, page_size: int = 1000) -> int:
+        """
+        Rebuilds the BM25 index of a collection from the chunks stored in it, e.g. for
+        collections ingested before lexical indexing existed. No embedding calls are made.
+
+        Parameters:
+        - name (str): The name of the collection.
+        - page_size (int): The number of chunks fetched per `get`.
+
+        Returns:
+        - int: The number of chunks indexed.
+        """
+        db = self._get_or_create_collection(name)
+        lexical = self.lexical_index(name)
+        lexical.clear()
+        offset = 0
+        while True:
+            page = db.get(limit=page_size, offset=offset, include=["documents", "metadatas"])
+            if not page['ids']:
+                break
+            lexical.upsert(page['ids'], page['documents'], page['metadatas'])
+            offset += len(page['ids'])
+        lexical.save()
+        print(f"[INGEST] 🔤 Indexed {lexical.count()} chunk(s) of '{name}' for keyword search")
+        return lexical.count()
+
+    def load_chroma_collection(self, name: str = DEFAULT_COLLECTION):
+        """
+        Loads an existing ChromaDB collection. Raises a ValueError if the collection was embedded
+        with another embedding backend than the configured one. Handles are cached in the
+        collection registry, so repeated queries do not fetch the collection again.
 
         Parameters:
         - name (str): The name of the collection to load.
@@ -215,9 +655,85 @@ class IngestData:
         Returns:
         - chromadb.Collection: The loaded ChromaDB collection.
         """
-        try:
+        def open_collection():
             chroma_client = self._get_chroma_client()
-            collection = chroma_client.get_collection(name=name, embedding_function=GeminiEmbeddingFunction())
+            collection = chroma_client.get_collection(name=name, embedding_function=self.embedding_function)
+            check_collection_backend(collection, self.embedding_backend)
             return collection
+
+        try:
+            return collection_registry.get(name, self.embedding_backend.id, open_collection)
         except Exception as e:
-            raise    
\ No newline at end of file
+            raise
+
+
+_shared_ingestor = None
+_shared_ingestor_lock = threading.Lock()
+
+
+def _get_shared_ingestor() -> IngestData:
+    global _shared_ingestor
+    with _shared_ingestor_lock:
+        if _shared_ingestor is None:
+            _shared_ingestor = IngestData()
+        return _shared_ingestor
+
+
+def load_collection(name: str = DEFAULT_COLLECTION):
+    """
+    Loads a collection for querying through a process-wide `IngestData`, so retriever calls
+    reuse its configuration, pooled client and cached collection handles instead of
+    rebuilding them every time.
+    """
+    return _get_shared_ingestor().load_chroma_collection(name)
+
+
+def load_lexical_index(name: str = DEFAULT_COLLECTION, version: int = None) -> LexicalIndex:
+    """
+    Returns the BM25 index of a collection through the process-wide `IngestData`.
+    """
+    return _get_shared_ingestor().lexical_index(name, version)
+
+
+def current_collection_version(db) -> int:
+    """
+    Returns the version of a collection as last read from the store. Cached handles keep the
+    metadata they were opened with, so an ingestion by another worker would go unseen; the
+    version is read again at most every COLLECTION_VERSION_TTL_SECONDS (see
+    `CollectionRegistry.version`), and when it changed, the stale handle and the results
+    cached for the collection are dropped. Makes a network call when the watermark is stale,
+    so async callers run it in a worker thread.
+    """
+    ingestor = _get_shared_ingestor()
+
+    def fetch() -> int:
+        try:
+            fresh = ingestor._get_chroma_client().get_collection(name=db.name, embedding_function=ingestor.embedding_function)
+        except Exception as e:
+            print(f"[INGEST] ⚠️ Could not refresh the version of '{db.name}': {str(e)}")
+            return collection_version(db)
+        version = collection_version(fresh)
+        if version != collection_version(db):
+            collection_registry.invalidate(db.name)
+        return version
+
+    return collection_registry.version(db.name, fetch)
+
+
+def _expire_collection(name: str):
+    _get_shared_ingestor().delete_collection(name)
+
+
+def _record_use(name: str):
+    _get_shared_ingestor().record_use(name)
+
+
+def _idle_collections(cutoff: float) -> List[str]:
+    return _get_shared_ingestor().idle_collections(cutoff)
+
+
+# Idle session collections are deleted by the registry's reaper (COLLECTION_TTL_SECONDS),
+# which reads their last use from the collection metadata
+collection_registry.on_expire = _expire_collection
+collection_registry.on_use = _record_use
+collection_registry.list_idle = _idle_collections    
\ No newline at end of file
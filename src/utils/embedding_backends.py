@@ -0,0 +1,142 @@
+import os
+import re
+import zlib
+from typing import List
+import numpy as np
+from google.genai import types
+from src.utils.chunker import count_tokens
+from src.utils.gemini_pool import gemini_pool
+from dotenv import load_dotenv
+load_dotenv()
+
+# Collection metadata key recording which backend embedded the collection
+BACKEND_METADATA_KEY = "embedding_backend"
+# Backend assumed for collections created before the backend was recorded
+LEGACY_BACKEND_ID = "gemini:models/embedding-001"
+# Most texts the Gemini API embeds in one embed_content request
+GEMINI_MAX_BATCH = 100
+
+
+class EmbeddingBackend:
+    """
+    Base class for embedding backends.
+
+    A backend turns a batch of texts into vectors. Its `id` identifies the model and its
+    settings; it is recorded in the metadata of every collection it embeds, so a collection
+    is never queried with vectors from another model.
+    """
+    name = ""
+    # Whether embeddings are worth caching, i.e. slower to compute than to look up
+    cacheable = True
+
+    @property
+    def id(self) -> str:
+        raise NotImplementedError
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+
+class GeminiEmbeddingBackend(EmbeddingBackend):
+    """
+    Embeds texts remotely with the Gemini embedding API, through the shared key pool.
+    Larger inputs are sent as several requests of at most `GEMINI_MAX_BATCH` texts.
+    """
+    name = "gemini"
+
+    def __init__(self, model: str = "models/embedding-001", task_type: str = "retrieval_document"):
+        self.model = model
+        self.task_type = task_type
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        config = types.EmbedContentConfig(
+            task_type=self.task_type.upper(),
+            # Titles are only accepted for document embeddings
+            title="Custom query" if self.task_type == "retrieval_document" else None,
+        )
+
+        embeddings = []
+        for start in range(0, len(texts), GEMINI_MAX_BATCH):
+            batch = texts[start:start + GEMINI_MAX_BATCH]
+
+            def embed_with(key: str) -> List[List[float]]:
+                response = gemini_pool.client(key).models.embed_content(model=self.model, contents=batch, config=config)
+                return [embedding.values for embedding in response.embeddings]
+
+            embeddings.extend(gemini_pool.call(embed_with, "Embedding", sum(count_tokens(text) for text in batch)))
+        return embeddings
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Embeds texts locally on the CPU with signed feature hashing.
+
+    Every text is broken into words, word bigrams and character n-grams of each word. Each
+    feature is hashed with CRC32 into one of `dimension` buckets with a +/-1 sign, counts are
+    damped with log1p and the vector is L2-normalised. No network access or model files are
+    needed, and a query embeds in well under a millisecond.
+    """
+    name = "hashing"
+    cacheable = False
+    _WORD_RE = re.compile(r"\w+")
+
+    def __init__(self, dimension: int = 512, ngram: int = 3):
+        self.dimension = dimension
+        self.ngram = ngram
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}:{self.dimension}:{self.ngram}"
+
+    def _features(self, text: str) -> List[str]:
+        words = self._WORD_RE.findall(text.lower())
+        features = list(words)
+        features.extend(f"{first} {second}" for first, second in zip(words, words[1:]))
+        for word in words:
+            padded = f"<{word}>"
+            features.extend(padded[i:i + self.ngram] for i in range(len(padded) - self.ngram + 1))
+        return features
+
+    def embed_one(self, text: str) -> np.ndarray:
+        hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in self._features(text)), dtype=np.uint32)
+        if hashes.size == 0:
+            return np.zeros(self.dimension, dtype=np.float32)
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+        vector = np.bincount(hashes % self.dimension, weights=signs, minlength=self.dimension)
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).astype(np.float32)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_one(text).tolist() for text in texts]
+
+
+def get_embedding_backend(spec: str = None) -> EmbeddingBackend:
+    """
+    Builds an embedding backend from a spec such as "gemini", "gemini:models/embedding-001",
+    "hashing" or "hashing:768". Defaults to the EMBEDDING_BACKEND environment variable.
+    """
+    spec = spec or os.getenv("EMBEDDING_BACKEND", "gemini")
+    name, _, options = spec.partition(":")
+    if name == GeminiEmbeddingBackend.name:
+        return GeminiEmbeddingBackend(model=options) if options else GeminiEmbeddingBackend()
+    if name == HashingEmbeddingBackend.name:
+        parts = [int(part) for part in options.split(":") if part]
+        return HashingEmbeddingBackend(*parts)
+    raise ValueError(f"Unknown embedding backend '{spec}'. Use 'gemini' or 'hashing'")
+
+
+def check_collection_backend(collection, backend: EmbeddingBackend):
+    """
+    Raises a ValueError when a collection was embedded with another backend than `backend`.
+    """
+    recorded = (collection.metadata or {}).get(BACKEND_METADATA_KEY, LEGACY_BACKEND_ID)
+    if recorded != backend.id:
+        raise ValueError(
+            f"Collection '{collection.name}' was embedded with '{recorded}', but the configured "
+            f"embedding backend is '{backend.id}'. Re-ingest the documents or set EMBEDDING_BACKEND accordingly"
+        )
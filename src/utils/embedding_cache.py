@@ -0,0 +1,247 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./src/data/embedding_cache.sqlite")
+DEFAULT_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+DEFAULT_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024")) * 1024 * 1024
+DEFAULT_QUERY_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+DEFAULT_QUERY_CACHE_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600"))
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding cache backed by SQLite.
+
+    Entries are keyed by hash(model, task_type, text) and stored as float32 blobs. Lookups
+    and inserts work on whole batches, so callers only send cache misses upstream. When the
+    cache grows past `max_entries` or `max_bytes`, the least recently used entries are evicted.
+    The database runs in WAL mode and can be shared by several processes.
+
+    The entry and byte totals are counted once when the cache opens and kept up to date as
+    entries are stored and evicted, so a batch costs no full-table scan. They only include
+    the writes of this process, so they are recounted before evicting.
+    """
+    def __init__(self, path: str = None, max_entries: int = None, max_bytes: int = None):
+        self.path = path or DEFAULT_CACHE_PATH
+        self.max_entries = max_entries or DEFAULT_MAX_ENTRIES
+        self.max_bytes = max_bytes or DEFAULT_MAX_BYTES
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, nbytes INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._entries, self._bytes = self._count()
+
+    def _count(self) -> tuple:
+        return self._conn.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()
+
+    @staticmethod
+    def key(model: str, task_type: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{task_type}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """
+        Looks up a batch of keys and marks the hits as recently used.
+
+        Returns:
+        - Dict[str, List[float]]: The cached embedding of every key that was found.
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(rows))})",
+                        [time.time()] + [key for key, _ in rows],
+                    )
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, embeddings: Dict[str, List[float]]):
+        """
+        Stores a batch of embeddings, then evicts least recently used entries if the cache is over budget.
+        """
+        if not embeddings:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in embeddings.items():
+            blob = array("f", vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock:
+            # Replaced entries are already counted, with their previous size
+            replaced = {}
+            keys = [row[0] for row in rows]
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                replaced.update(self._conn.execute(
+                    f"SELECT key, nbytes FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall())
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, nbytes, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._entries += len(rows) - len(replaced)
+            self._bytes += sum(row[2] for row in rows) - sum(replaced.values())
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self._entries <= self.max_entries and self._bytes <= self.max_bytes:
+            return
+        # Other processes may have stored or evicted entries meanwhile
+        self._entries, self._bytes = self._count()
+        if self._entries <= self.max_entries and self._bytes <= self.max_bytes:
+            return
+        # Evict down to 90% of the budget so eviction does not run on every insert
+        average = self._bytes / max(1, self._entries)
+        target = int(min(self.max_entries, self.max_bytes / max(1.0, average)) * 0.9)
+        evicted = self._conn.execute(
+            "SELECT key, nbytes FROM embeddings ORDER BY last_used LIMIT ?", (self._entries - target,)
+        ).fetchall()
+        for start in range(0, len(evicted), _SQL_BATCH):
+            batch = [key for key, _ in evicted[start:start + _SQL_BATCH]]
+            self._conn.execute(f"DELETE FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch)
+        self._entries -= len(evicted)
+        self._bytes -= sum(nbytes for _, nbytes in evicted)
+        self.evictions += len(evicted)
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters and the current size of the cache.
+        """
+        with self._lock:
+            entries, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM embeddings"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total_bytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._entries, self._bytes = 0, 0
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalises a query so that Unicode, whitespace and case variants share a cache entry.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split()).casefold()
+
+
+class QueryEmbeddingCache:
+    """
+    In-memory LRU cache of query embeddings with a time-to-live.
+
+    Queries repeat constantly (agent retries, follow-up turns), so their embeddings are kept
+    in process, keyed by embedding model and normalised query text. Unlike `EmbeddingCache`
+    it never touches disk, so a hit costs a dict lookup.
+    """
+    def __init__(self, max_entries: int = None, ttl: float = None):
+        self.max_entries = DEFAULT_QUERY_CACHE_SIZE if max_entries is None else max_entries
+        self.ttl = DEFAULT_QUERY_CACHE_TTL if ttl is None else ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        key = (model, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl <= 0 or time.monotonic() - entry[1] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, model: str, query: str, embedding: List[float]):
+        key = (model, normalize_query(query))
+        with self._lock:
+            self._entries[key] = (embedding, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+_query_cache = None
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Returns the process-wide embedding cache, or None when EMBEDDING_CACHE is set to 0.
+    """
+    global _default_cache
+    if os.getenv("EMBEDDING_CACHE", "1").lower() in ("0", "false", "off"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
+
+
+def get_query_embedding_cache() -> Optional[QueryEmbeddingCache]:
+    """
+    Returns the process-wide query embedding cache, or None when QUERY_EMBEDDING_CACHE_SIZE is 0.
+    """
+    global _query_cache
+    if DEFAULT_QUERY_CACHE_SIZE <= 0:
+        return None
+    with _default_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache()
+        return _query_cache
@@ -1,15 +1,15 @@
-import os
-import google.generativeai as genai
 from chromadb import Documents, EmbeddingFunction, Embeddings
-from dotenv import load_dotenv
-load_dotenv()
+from typing import List
+from src.utils.embedding_cache import EmbeddingCache, QueryEmbeddingCache, get_embedding_cache, get_query_embedding_cache
+from src.utils.embedding_backends import EmbeddingBackend, GeminiEmbeddingBackend, get_embedding_backend
 
-class GeminiEmbeddingFunction(EmbeddingFunction):
+
+class BackendEmbeddingFunction(EmbeddingFunction):
     """
-    Custom embedding function using the Gemini AI API for document retrieval.
+    Chroma embedding function backed by an `EmbeddingBackend`.
 
-    This class extends the EmbeddingFunction class and implements the __call__ method
-    to generate embeddings for a given set of documents using the Gemini AI API.
+    Embeddings are looked up in a persistent cache first, and only the texts that were
+    never embedded before are sent to the backend, in a single call.
 
     Parameters:
     - input (Documents): A collection of documents to be embedded.
@@ -17,39 +17,67 @@ class GeminiEmbeddingFunction(EmbeddingFunction):
     Returns:
     - Embeddings: Embeddings generated for the input documents.
     """
+    def __init__(self, backend: EmbeddingBackend = None, cache: EmbeddingCache = None,
+                 query_cache: QueryEmbeddingCache = None):
+        self.backend = backend or get_embedding_backend()
+        self.cache = cache if cache is not None else get_embedding_cache()
+        self.query_cache = query_cache if query_cache is not None else get_query_embedding_cache()
+
     def __call__(self, input: Documents) -> Embeddings:
-        api_keys_str = os.getenv("GOOGLE_GENAI_API_KEYS", "")
-        gemini_api_keys = [k.strip() for k in api_keys_str.split(",") if k.strip()]
-
-        if not gemini_api_keys:
-            error_msg = "Gemini API Key not provided. Please provide GOOGLE_GENAI_API_KEYS as an environment variable"
-            raise ValueError(error_msg)
-        
-        for i, key in enumerate(gemini_api_keys):
-            try:
-                genai.configure(api_key=key)
-                model = "models/embedding-001"
-                title = "Custom query"
-                
-                embeddings = genai.embed_content(
-                    model=model,
-                    content=input,
-                    task_type="retrieval_document",
-                    title=title
-                )["embedding"]
-                
-                return embeddings
-                
-            except Exception as e:
-                error_msg = str(e).lower()
-                if any(keyword in error_msg for keyword in ['permission_denied', 'invalid api key', 'authentication']):
-                    if i == len(gemini_api_keys) - 1:  # Last key
-                        error_msg = "All API keys failed authentication"
-                        raise ValueError(error_msg)
-                    continue
-                else:
-                    raise e
-        
-        # This should never be reached, but just in case
-        error_msg = "All API keys failed"
-        raise ValueError(error_msg)
+        texts = [input] if isinstance(input, str) else list(input)
+        if self.cache is None or not self.backend.cacheable:
+            return self.backend.embed(texts)
+
+        task_type = getattr(self.backend, "task_type", "")
+        keys = [EmbeddingCache.key(self.backend.id, task_type, text) for text in texts]
+        embeddings = self.cache.get_many(keys)
+
+        # Send each missing text upstream once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in embeddings:
+                missing.setdefault(key, text)
+        if missing:
+            fresh = dict(zip(missing, self.backend.embed(list(missing.values()))))
+            self.cache.put_many(fresh)
+            embeddings.update(fresh)
+
+        return [embeddings[key] for key in keys]
+
+    def embed_query(self, input: Documents) -> Embeddings:
+        """
+        Chroma's embedding function protocol for query texts (`query_texts`), served from the
+        query cache like `embed_queries`.
+        """
+        return self.embed_queries([input] if isinstance(input, str) else list(input))
+
+    def embed_search_query(self, query: str) -> List[float]:
+        """
+        Embeds a search query, served from the in-memory query cache when the same query
+        (ignoring case and whitespace) was embedded recently.
+        """
+        return self.embed_queries([query])[0]
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embeds several search queries, with a single embedding call for those not found in
+        the query cache.
+        """
+        if self.query_cache is None:
+            return self(list(queries))
+        embeddings = [self.query_cache.get(self.backend.id, query) for query in queries]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            for i, embedding in zip(missing, self([queries[i] for i in missing])):
+                embeddings[i] = embedding
+                self.query_cache.put(self.backend.id, queries[i], embedding)
+        return embeddings
+
+
+class GeminiEmbeddingFunction(BackendEmbeddingFunction):
+    """
+    Custom embedding function using the Gemini AI API for document retrieval.
+    """
+    def __init__(self, model: str = "models/embedding-001", task_type: str = "retrieval_document",
+                 cache: EmbeddingCache = None):
+        super().__init__(GeminiEmbeddingBackend(model=model, task_type=task_type), cache)
@@ -0,0 +1,405 @@
+import os
+import json
+import time
+import threading
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+from src.utils.rate_limiter import (DEFAULT_QUEUE_TIMEOUT, DEFAULT_RETRIES, RateLimitTimeout, backoff_delay,
+                                    is_throttling_error, rate_limiters)
+
+T = TypeVar("T")
+
+# Seconds a key rests after a 429/quota error; doubled for every consecutive one
+DEFAULT_COOLDOWN_SECONDS = float(os.getenv("GEMINI_KEY_COOLDOWN_SECONDS", "60"))
+DEFAULT_MAX_COOLDOWN_SECONDS = float(os.getenv("GEMINI_KEY_MAX_COOLDOWN_SECONDS", "600"))
+# Seconds a key rejected as invalid is left out before it is tried again
+DEFAULT_AUTH_COOLDOWN_SECONDS = float(os.getenv("GEMINI_KEY_AUTH_COOLDOWN_SECONDS", "3600"))
+
+_AUTH_ERRORS = ('permission_denied', 'invalid api key', 'authentication', 'api key not valid', 'api_key_invalid')
+# Weight of the latest call in the per-key latency average
+_LATENCY_SMOOTHING = 0.2
+
+
+class APIKeysExhausted(ValueError):
+    """Raised when no Gemini API key could serve a call."""
+    def __init__(self, message: str, rate_limited: bool = False):
+        super().__init__(message)
+        self.rate_limited = rate_limited
+
+
+def parse_api_keys(value: str = None) -> List[str]:
+    """
+    Parses GOOGLE_GENAI_API_KEYS, given either comma-separated or as a JSON list.
+    """
+    value = os.getenv("GOOGLE_GENAI_API_KEYS", "") if value is None else value
+    if value.strip().startswith("["):
+        try:
+            keys = json.loads(value)
+        except Exception as e:
+            raise ValueError(f"Failed to parse GOOGLE_GENAI_API_KEYS as JSON: {e}")
+    else:
+        keys = value.split(",")
+    return [key.strip() for key in keys if key and key.strip()]
+
+
+def is_auth_error(e: Exception) -> bool:
+    message = str(e).lower()
+    return any(keyword in message for keyword in _AUTH_ERRORS)
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    return is_throttling_error(e)
+
+
+class _KeyState:
+    def __init__(self, key: str):
+        self.key = key
+        self.in_flight = 0
+        self.last_used = 0.0
+        self.unavailable_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.consecutive_rate_limits = 0
+        self.auth_failed = False
+        self.latency = None
+        self.last_error = None
+
+
+class GeminiKeyPool:
+    """
+    Process-wide pool of Gemini API keys shared by every LLM and embedding caller.
+
+    Each call runs on the least-loaded healthy key (fewest calls in flight, then least
+    recently used, which spreads sequential calls round-robin). A key that hits a 429/quota
+    error cools down for `cooldown` seconds, doubling while the errors continue; a key
+    rejected as invalid is left out for `auth_cooldown` seconds. The call is retried on the
+    next key in both cases; other errors are raised to the caller. When every key was throttled,
+    the call backs off with jitter and tries again, up to `retries` times.
+
+    Every call also goes through the `RateLimiter` of its key (requests/min, tokens/min and
+    concurrent calls, see src.utils.rate_limiter), so bursts queue up instead of hitting 429s.
+
+    Clients are created once per key and reused, so concurrent requests never go through
+    the process-global `genai.configure`. Per-key load, health and latency are reported by
+    `stats()`.
+    """
+    def __init__(self, keys: List[str] = None, cooldown: float = None, max_cooldown: float = None,
+                 auth_cooldown: float = None, retries: int = None):
+        self.cooldown = DEFAULT_COOLDOWN_SECONDS if cooldown is None else cooldown
+        self.max_cooldown = DEFAULT_MAX_COOLDOWN_SECONDS if max_cooldown is None else max_cooldown
+        self.auth_cooldown = DEFAULT_AUTH_COOLDOWN_SECONDS if auth_cooldown is None else auth_cooldown
+        self.retries = DEFAULT_RETRIES if retries is None else retries
+        self._keys = keys
+        self._states: Optional[Dict[str, _KeyState]] = None
+        self._clients: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key_states(self) -> Dict[str, _KeyState]:
+        # Keys are read on first use, after the environment has been loaded
+        if self._states is None:
+            keys = self._keys if self._keys is not None else parse_api_keys()
+            self._states = {key: _KeyState(key) for key in keys}
+        return self._states
+
+    @property
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._key_states())
+
+    # --- Clients ---
+
+    def _cached(self, cache_key: tuple, factory: Callable[[], object]):
+        with self._lock:
+            client = self._clients.get(cache_key)
+            if client is None:
+                client = self._clients[cache_key] = factory()
+            return client
+
+    def client(self, key: str):
+        """
+        Returns the long-lived `google.genai` client of a key.
+        """
+        from google import genai
+        return self._cached(("genai", key), lambda: genai.Client(api_key=key))
+
+    def chat_model(self, model: str):
+        """
+        Returns the long-lived LangChain chat model whose every request runs through the pool,
+        see `src.utils.pooled_chat_model.PooledChatModel`. Agents use it, so no rate-limiter
+        slot is held across an agent run.
+        """
+        from src.utils.pooled_chat_model import PooledChatModel
+        return self._cached(("pooled", model), lambda: PooledChatModel(model=model, pool=self))
+
+    def key_chat_model(self, key: str, model: str):
+        """
+        Returns the long-lived LangChain chat model of a key.
+        """
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return self._cached(("langchain", key, model), lambda: ChatGoogleGenerativeAI(google_api_key=key, model=model))
+
+    # --- Key selection ---
+
+    def _acquire(self, tried: set) -> Optional[_KeyState]:
+        with self._lock:
+            states = self._key_states()
+            if not states:
+                raise ValueError("Gemini API Key not provided. Please provide GOOGLE_GENAI_API_KEYS as an environment variable")
+            now = time.monotonic()
+            candidates = [state for state in states.values() if state.key not in tried]
+            if not candidates:
+                return None
+            healthy = [state for state in candidates if state.unavailable_until <= now]
+            if healthy:
+                state = min(healthy, key=lambda s: (s.in_flight, s.last_used))
+            elif len(tried) == 0:
+                # Every key is resting: use the one that recovers first rather than failing outright
+                state = min(candidates, key=lambda s: s.unavailable_until)
+            else:
+                return None
+            state.in_flight += 1
+            state.requests += 1
+            state.last_used = now
+            return state
+
+    def _release(self, state: _KeyState, started: float, error: Exception = None):
+        with self._lock:
+            state.in_flight -= 1
+            now = time.monotonic()
+            if error is None:
+                elapsed = now - started
+                state.latency = elapsed if state.latency is None else \
+                    (1 - _LATENCY_SMOOTHING) * state.latency + _LATENCY_SMOOTHING * elapsed
+                state.consecutive_rate_limits = 0
+                state.auth_failed = False
+                return
+            state.failures += 1
+            state.last_error = str(error)[:200]
+            if is_auth_error(error):
+                state.auth_failed = True
+                state.unavailable_until = now + self.auth_cooldown
+            elif is_rate_limit_error(error):
+                state.rate_limited += 1
+                state.consecutive_rate_limits += 1
+                rest = min(self.max_cooldown, self.cooldown * 2 ** (state.consecutive_rate_limits - 1))
+                state.unavailable_until = now + rest
+
+    def call(self, action: Callable[[str], T], description: str = "Gemini call", tokens: int = 1) -> T:
+        """
+        Runs `action(key)` on the best available key, moving to the next key on
+        authentication and rate-limit errors. `tokens` is the estimated prompt size,
+        counted against the tokens/min limit of the key.
+
+        Raises:
+            APIKeysExhausted: When every key failed with such an error or could not start
+            the call in time, or RATE_LIMIT_QUEUE_TIMEOUT passed.
+        """
+        result, release = self._run(action, description, tokens)
+        release()
+        return result
+
+    async def acall(self, action: Callable[[str], Awaitable[T]], description: str = "Gemini call", tokens: int = 1) -> T:
+        """
+        Async version of `call`, for actions that return a coroutine.
+        """
+        result, release = await self._arun(action, description, tokens)
+        release()
+        return result
+
+    def stream(self, open_stream: Callable[[str], Iterator[T]], description: str = "Gemini stream",
+               tokens: int = 1) -> Iterator[T]:
+        """
+        Yields the chunks of the stream returned by `open_stream(key)`, holding the key and its
+        rate-limiter slot until the stream is exhausted or closed. Errors up to the first chunk
+        move on to the next key like `call`; later ones are raised to the caller.
+        """
+        def start(key: str):
+            stream = open_stream(key)
+            # The request is only sent for the first chunk, so key errors surface inside the pool
+            return next(stream, None), stream
+
+        (first, stream), release = self._run(start, description, tokens)
+        error = None
+        try:
+            if first is not None:
+                yield first
+                for chunk in stream:
+                    yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            release(error)
+
+    async def astream(self, open_stream: Callable[[str], Awaitable[AsyncIterator[T]]], description: str = "Gemini stream",
+                      tokens: int = 1) -> AsyncIterator[T]:
+        """
+        Async version of `stream`, for `open_stream` coroutines returning an async iterator.
+        """
+        async def start(key: str):
+            stream = await open_stream(key)
+            return await anext(stream, None), stream
+
+        (first, stream), release = await self._arun(start, description, tokens)
+        error = None
+        try:
+            if first is not None:
+                yield first
+                async for chunk in stream:
+                    yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            release(error)
+
+    def _run(self, action: Callable[[str], T], description: str, tokens: int) -> Tuple[T, Callable]:
+        # Runs `action` like `call`, but leaves the key and its limiter slot held until the
+        # returned release function is called
+        deadline = time.monotonic() + DEFAULT_QUEUE_TIMEOUT
+        tried, seen, errors, attempt = set(), set(), [], 0
+        while True:
+            state = self._acquire(tried)
+            if state is None:
+                time.sleep(self._retry_delay(seen, errors, attempt, deadline, description))
+                tried, attempt = set(), attempt + 1
+                continue
+            tried.add(state.key)
+            seen.add(state.key)
+            limiter = rate_limiters.get("gemini", state.key)
+            try:
+                limiter.acquire(tokens, self._key_deadline(tried, deadline))
+            except RateLimitTimeout as e:
+                self._queue_timeout(state, e, description, errors)
+                continue
+            except BaseException:
+                # Cancelled while queued
+                with self._lock:
+                    state.in_flight -= 1
+                raise
+            started = time.monotonic()
+            try:
+                result = action(state.key)
+            except BaseException as e:
+                limiter.release()
+                self._failed(state, started, e, description, errors)
+                continue
+            return result, self._releaser(state, limiter, started)
+
+    async def _arun(self, action: Callable[[str], Awaitable[T]], description: str, tokens: int) -> Tuple[T, Callable]:
+        deadline = time.monotonic() + DEFAULT_QUEUE_TIMEOUT
+        tried, seen, errors, attempt = set(), set(), [], 0
+        while True:
+            state = self._acquire(tried)
+            if state is None:
+                await asyncio.sleep(self._retry_delay(seen, errors, attempt, deadline, description))
+                tried, attempt = set(), attempt + 1
+                continue
+            tried.add(state.key)
+            seen.add(state.key)
+            limiter = rate_limiters.get("gemini", state.key)
+            try:
+                await limiter.aacquire(tokens, self._key_deadline(tried, deadline))
+            except RateLimitTimeout as e:
+                self._queue_timeout(state, e, description, errors)
+                continue
+            except BaseException:
+                # Cancelled while queued
+                with self._lock:
+                    state.in_flight -= 1
+                raise
+            started = time.monotonic()
+            try:
+                result = await action(state.key)
+            except BaseException as e:
+                limiter.release()
+                self._failed(state, started, e, description, errors)
+                continue
+            return result, self._releaser(state, limiter, started)
+
+    def _releaser(self, state: _KeyState, limiter, started: float) -> Callable:
+        def release(error: Exception = None):
+            limiter.release()
+            self._release(state, started, error)
+        return release
+
+    def _retry_delay(self, seen: set, errors: list, attempt: int, deadline: float, description: str) -> float:
+        # Every key was tried this round: raises, or returns how long to back off before the next round
+        exhausted = self._exhausted(seen, errors)
+        delay = backoff_delay(attempt)
+        if not exhausted.rate_limited or attempt >= self.retries or time.monotonic() + delay > deadline:
+            raise exhausted
+        print(f"[GEMINI] ⏳ {description} throttled on every key, retrying in {delay:.1f}s")
+        return delay
+
+    def _key_deadline(self, tried: set, deadline: float) -> float:
+        # Keys left to try this round share the remaining queue time, so a saturated key
+        # cannot use it all up; the last one gets whatever is left
+        untried = len(self.keys) - len(tried) + 1
+        now = time.monotonic()
+        return now + max(0.0, deadline - now) / max(1, untried)
+
+    def _queue_timeout(self, state: _KeyState, error: RateLimitTimeout, description: str, errors: list):
+        # The call never started: the key is not penalised, and the next key is tried
+        with self._lock:
+            state.in_flight -= 1
+        print(f"[GEMINI] ⏳ {description} queued too long on key {self._mask(state.key)}, trying the next key")
+        errors.append(error)
+
+    def _failed(self, state: _KeyState, started: float, error: BaseException, description: str, errors: list):
+        # Records the error and re-raises it unless another key may succeed
+        if not isinstance(error, Exception):
+            # Cancelled or interrupted: not a failure of the key
+            with self._lock:
+                state.in_flight -= 1
+            raise error
+        self._release(state, started, error)
+        if not (is_auth_error(error) or is_rate_limit_error(error)):
+            raise error
+        if is_rate_limit_error(error):
+            # The key itself cools down in the pool; the limiter only records the throttling
+            rate_limiters.get("gemini", state.key).penalize()
+        print(f"[GEMINI] ⚠️ {description} failed on key {self._mask(state.key)}, trying the next key: {str(error)[:120]}")
+        errors.append(error)
+
+    def _exhausted(self, tried: set, errors: list) -> APIKeysExhausted:
+        last_error = errors[-1] if errors else None
+        # Keys left untried were resting after rate-limit or auth errors of earlier calls
+        if len(tried) == len(self.keys) and not any(is_rate_limit_error(e) for e in errors):
+            exhausted = APIKeysExhausted("All API keys failed authentication")
+        else:
+            exhausted = APIKeysExhausted(f"All API keys are rate limited or failed: {last_error}", rate_limited=True)
+        exhausted.__cause__ = last_error
+        return exhausted
+
+    # --- Reporting ---
+
+    @staticmethod
+    def _mask(key: str) -> str:
+        return f"...{key[-4:]}" if len(key) > 4 else "..."
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "keys": [
+                    {
+                        "key": self._mask(state.key),
+                        "healthy": state.unavailable_until <= now,
+                        "cooldown_seconds": max(0.0, state.unavailable_until - now),
+                        "auth_failed": state.auth_failed,
+                        "in_flight": state.in_flight,
+                        "requests": state.requests,
+                        "failures": state.failures,
+                        "rate_limited": state.rate_limited,
+                        "avg_latency_ms": 1000 * state.latency if state.latency is not None else None,
+                        "last_error": state.last_error,
+                    }
+                    for state in self._key_states().values()
+                ],
+            }
+
+
+# Shared by every Gemini caller in the process
+gemini_pool = GeminiKeyPool()
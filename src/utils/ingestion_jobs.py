@@ -0,0 +1,203 @@
+import os
+import time
+import threading
+from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from src.utils.data_ingest import IngestData, IngestionCancelled, IngestionProgress
+from src.utils.collection_registry import DEFAULT_COLLECTION, collection_registry
+
+DEFAULT_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "2"))
+# Finished jobs are kept this long so their progress can still be polled
+DEFAULT_JOB_RETENTION = float(os.getenv("INGEST_JOB_RETENTION_SECONDS", "3600"))
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+class IngestionJob(IngestionProgress):
+    """
+    A background ingestion of a list of files into one collection.
+
+    The job is the progress sink of `IngestData.run_ingestion_pipeline`: the pipeline updates
+    its counters from its worker threads, and checks `is_cancelled()` between pages and batches.
+    """
+    def __init__(self, file_paths: List[str], collection: str):
+        self.id = str(uuid4())
+        self.collection = collection
+        self.file_paths = list(file_paths)
+        self.status = "queued"
+        self.counters = {
+            "files_total": len(self.file_paths),
+            "files_skipped": 0,
+            "files_parsed": 0,
+            "pages_parsed": 0,
+            "chunks_embedded": 0,
+            "chunks_reused": 0,
+            "chunks_failed": 0,
+            "chunks_deleted": 0,
+        }
+        self.chunks_total = None
+        self.errors: List[str] = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    def update(self, **counters: int):
+        with self._lock:
+            for name, value in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_error(self, message: str):
+        with self._lock:
+            self.errors.append(message)
+
+    def is_cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self) -> bool:
+        """
+        Requests cancellation. A queued job never starts; a running job stops at its next
+        page or batch. Returns False when the job has already finished.
+        """
+        if self.finished:
+            return False
+        self._cancel.set()
+        return True
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Blocks until the job finishes. Returns False if `timeout` expired first.
+        """
+        return self._done.wait(timeout)
+
+    def _set_status(self, status: str):
+        with self._lock:
+            self.status = status
+            if status == "running":
+                self.started_at = time.time()
+            elif status in FINISHED_STATUSES:
+                self.finished_at = time.time()
+        if status in FINISHED_STATUSES:
+            self._done.set()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "collection": self.collection,
+                "status": self.status,
+                "files": list(self.file_paths),
+                "progress": dict(self.counters),
+                "chunks_total": self.chunks_total,
+                "errors": list(self.errors),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class IngestionJobManager:
+    """
+    Runs ingestion jobs on a small thread pool and keeps track of them by ID.
+
+    Jobs for the same collection are serialized, so two uploads never sync the same
+    manifest at once; jobs for different collections run in parallel.
+    """
+    def __init__(self, max_workers: int = None, retention: float = None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or DEFAULT_JOB_WORKERS,
+                                            thread_name_prefix="ingest-job")
+        self.retention = DEFAULT_JOB_RETENTION if retention is None else retention
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._collection_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, file_paths: List[str], collection: str = DEFAULT_COLLECTION) -> IngestionJob:
+        """
+        Queues the ingestion of `file_paths` into `collection` and returns the job immediately.
+        """
+        job = IngestionJob(file_paths, collection)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            collection_lock = self._collection_locks.setdefault(collection, threading.Lock())
+        self._executor.submit(self._run, job, collection_lock)
+        print(f"[INGEST JOB] 📥 Queued job {job.id} ({len(job.file_paths)} file(s) -> '{collection}')")
+        return job
+
+    def _run(self, job: IngestionJob, collection_lock: threading.Lock):
+        with collection_lock:
+            if job.is_cancelled():
+                job._set_status("cancelled")
+                print(f"[INGEST JOB] 🛑 Job {job.id} cancelled before it started")
+                return
+            job._set_status("running")
+            try:
+                job.chunks_total = IngestData().run_ingestion_pipeline(job.file_paths, name=job.collection, progress=job)
+                job._set_status("completed")
+                print(f"[INGEST JOB] ✅ Job {job.id} completed")
+            except IngestionCancelled:
+                job._set_status("cancelled")
+                print(f"[INGEST JOB] 🛑 Job {job.id} cancelled")
+            except Exception as e:
+                job.add_error(str(e))
+                job._set_status("failed")
+                print(f"[INGEST JOB] ❌ Job {job.id} failed: {str(e)}")
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        """
+        Cancels a job. Returns the job, or None if no job has this ID.
+        """
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def pending(self, collection: str) -> List[IngestionJob]:
+        with self._lock:
+            return [job for job in self._jobs.values() if job.collection == collection and not job.finished]
+
+    def wait_for_collection(self, collection: str, timeout: float = None) -> Optional[str]:
+        """
+        Waits for the unfinished jobs of a collection, so a query sees every uploaded document.
+
+        Returns:
+            Optional[str]: None once the collection is up to date, otherwise a message saying
+            which job is still running or has failed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited = []
+        for job in self.pending(collection):
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not job.wait(remaining):
+                return f"Ingestion job {job.id} is still running ({job.counters['pages_parsed']} page(s) parsed so far)"
+            waited.append(job)
+        for job in waited:
+            if job.status == "failed":
+                return f"Ingestion job {job.id} failed: {'; '.join(job.errors[-3:])}"
+        return None
+
+    def _prune(self):
+        if self.retention <= 0:
+            return
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at is not None and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+# Process-wide manager shared by the API routes and the graph nodes
+job_manager = IngestionJobManager()
+
+# Never reap a collection while documents are being ingested into it
+collection_registry.is_busy = lambda name: bool(job_manager.pending(name))
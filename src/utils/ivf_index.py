@@ -0,0 +1,286 @@
+import os
+import threading
+import time
+from typing import List, Optional
+import numpy as np
+from src.utils.local_vector_store import LocalCollection
+
+DEFAULT_NLIST = int(os.getenv("IVF_NLIST", "0"))
+DEFAULT_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+DEFAULT_RERANK = int(os.getenv("IVF_RERANK", "4"))
+DEFAULT_TRAIN_MIN = int(os.getenv("IVF_TRAIN_MIN", "10000"))
+
+# Vectors scored per matrix product while training and assigning, to bound temporary memory
+_BLOCK_ROWS = 65536
+# Training vectors sampled per list
+_SAMPLES_PER_LIST = 64
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _BLOCK_ROWS):
+        assignment[start:start + _BLOCK_ROWS] = np.argmax(vectors[start:start + _BLOCK_ROWS] @ centroids.T, axis=1)
+    return assignment
+
+
+def spherical_kmeans(vectors: np.ndarray, n_lists: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Clusters unit-length vectors into `n_lists` unit-length centroids by cosine similarity.
+    Empty clusters are re-seeded with random vectors.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest(vectors, centroids)
+        # Sum the members of every cluster with one sort and reduceat instead of a scatter-add
+        order = np.argsort(assignment, kind="stable")
+        lists, starts = np.unique(assignment[order], return_index=True)
+        sums = np.zeros_like(centroids)
+        sums[lists] = np.add.reduceat(vectors[order], starts, axis=0)
+        counts = np.bincount(assignment, minlength=n_lists)
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.where(norms == 0, 1, norms)).astype(np.float32)
+    return centroids
+
+
+class IVFCollection(LocalCollection):
+    """
+    A `LocalCollection` searched through an inverted-file (IVF) index with residual coding.
+
+    The vectors are clustered into `n_lists` lists by spherical k-means. Each list stores the
+    rows assigned to it and their residuals (vector minus centroid) quantized to int8. A query
+    scores the centroids, probes the `nprobe` closest lists, approximates every candidate's
+    similarity as centroid score + residual score, and rescores the best `rerank * k`
+    candidates exactly against the float32 rows of the memory-mapped matrix. Raising
+    `nprobe` trades latency for recall.
+
+    Once the collection holds `train_min` vectors, the index is trained in a background thread
+    when the collection is persisted at the end of ingestion (or on the first search of a
+    collection that was filled elsewhere). Until training finishes, and for smaller
+    collections, searches are exact. Later inserts are assigned to their nearest list
+    without retraining; call `build()` to retrain after the corpus has shifted. The index is
+    saved to `ivf.npz` whenever the collection is persisted, and reconciled with the stored
+    rows when it is loaded, so workers start without rebuilding.
+    """
+    def __init__(self, path: str, name: str, embedding_function=None, metadata: dict = None,
+                 n_lists: int = None, nprobe: int = None, rerank: int = None, train_min: int = None):
+        self.n_lists = n_lists or DEFAULT_NLIST
+        self.nprobe = nprobe or DEFAULT_NPROBE
+        self.rerank = rerank or DEFAULT_RERANK
+        self.train_min = DEFAULT_TRAIN_MIN if train_min is None else train_min
+        self._centroids: Optional[np.ndarray] = None
+        self._scale: Optional[np.ndarray] = None
+        self._list_rows: List[np.ndarray] = []
+        self._list_codes: List[np.ndarray] = []
+        self._assignment = np.zeros(0, dtype=np.int32)
+        self._dirty = False
+        self._training: Optional[threading.Thread] = None
+        super().__init__(path, name, embedding_function, metadata)
+        self._load_index()
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.path, "ivf.npz")
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    # --- Building ---
+
+    def build(self, n_lists: int = None, seed: int = 0):
+        """
+        Trains the centroids and residual quantizer on a sample of the stored vectors and
+        assigns every vector to its list. K-means runs on a copy of the sample without holding
+        the collection lock, so searches and writes continue meanwhile.
+        """
+        with self._lock:
+            rows = np.flatnonzero(self._alive)
+            if len(rows) == 0:
+                return
+            started = time.perf_counter()
+            n_lists = n_lists or self.n_lists or max(1, int(4 * np.sqrt(len(rows))))
+            n_lists = min(n_lists, len(rows))
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(rows, size=min(len(rows), n_lists * _SAMPLES_PER_LIST), replace=False))
+            sample = np.array(self._vectors[sample_rows])
+
+        centroids = spherical_kmeans(sample, n_lists, seed=seed)
+        residuals = sample - centroids[_nearest(sample, centroids)]
+        scale = np.maximum(np.abs(residuals).max(axis=0), 1e-6).astype(np.float32) / 127.0
+
+        with self._lock:
+            # Rows written while training are assigned here with all the others
+            rows = np.flatnonzero(self._alive)
+            self._centroids, self._scale = centroids, scale
+            self.n_lists = n_lists
+
+            self._list_rows = [np.zeros(0, dtype=np.int64) for _ in range(n_lists)]
+            self._list_codes = [np.zeros((0, self.dimension), dtype=np.int8) for _ in range(n_lists)]
+            self._assignment = np.full(len(self._alive), -1, dtype=np.int32)
+            for start in range(0, len(rows), _BLOCK_ROWS):
+                self._add_to_lists(rows[start:start + _BLOCK_ROWS])
+            self._dirty = True
+            self.persist()
+            print(f"[IVF] 🧭 Built {n_lists} list(s) over {len(rows)} vector(s) of '{self.name}' "
+                  f"in {time.perf_counter() - started:.1f}s")
+
+    def train_in_background(self):
+        """
+        Starts `build()` in a background thread if the collection has reached `train_min`
+        vectors, is not trained yet and no training is running.
+        """
+        with self._lock:
+            if self.trained or (self._training is not None and self._training.is_alive()):
+                return
+            if int(self._alive.sum()) < max(1, self.train_min):
+                return
+            self._training = threading.Thread(target=self._train, name=f"ivf-train-{self.name}", daemon=True)
+            self._training.start()
+
+    def _train(self):
+        try:
+            self.build()
+        except Exception as e:
+            print(f"[IVF] ❌ Training the index of '{self.name}' failed: {e}")
+
+    def _encode(self, rows: np.ndarray, assignment: np.ndarray) -> np.ndarray:
+        residuals = np.asarray(self._vectors[rows]) - self._centroids[assignment]
+        return np.clip(np.rint(residuals / self._scale), -127, 127).astype(np.int8)
+
+    def _add_to_lists(self, rows: np.ndarray):
+        if len(rows) == 0:
+            return
+        if len(self._assignment) < len(self._alive):
+            self._assignment = np.concatenate(
+                [self._assignment, np.full(len(self._alive) - len(self._assignment), -1, dtype=np.int32)]
+            )
+        assignment = _nearest(np.asarray(self._vectors[rows]), self._centroids)
+        codes = self._encode(rows, assignment)
+        order = np.argsort(assignment, kind="stable")
+        lists, starts = np.unique(assignment[order], return_index=True)
+        for list_id, begin, end in zip(lists, starts, list(starts[1:]) + [len(order)]):
+            members = order[begin:end]
+            self._list_rows[list_id] = np.concatenate([self._list_rows[list_id], rows[members]])
+            self._list_codes[list_id] = np.concatenate([self._list_codes[list_id], codes[members]])
+        self._assignment[rows] = assignment
+        self._dirty = True
+
+    def _remove_from_lists(self, rows: np.ndarray):
+        rows = rows[(rows < len(self._assignment))]
+        rows = rows[self._assignment[rows] >= 0]
+        for list_id in np.unique(self._assignment[rows]):
+            keep = ~np.isin(self._list_rows[list_id], rows)
+            self._list_rows[list_id] = self._list_rows[list_id][keep]
+            self._list_codes[list_id] = self._list_codes[list_id][keep]
+        self._assignment[rows] = -1
+        self._dirty = True
+
+    # --- Storage hooks ---
+
+    def _write_vectors(self, rows: List[int], vectors: np.ndarray):
+        super()._write_vectors(rows, vectors)
+        if self.trained:
+            rows = np.asarray(rows, dtype=np.int64)
+            # Overwritten rows may move to another list
+            self._remove_from_lists(rows)
+            self._add_to_lists(rows)
+
+    def _remove_vectors(self, rows: List[int]):
+        super()._remove_vectors(rows)
+        if self.trained:
+            self._remove_from_lists(np.asarray(rows, dtype=np.int64))
+
+    def persist(self):
+        super().persist()
+        self.train_in_background()
+        with self._lock:
+            if not self.trained or not self._dirty:
+                return
+            sizes = np.array([len(rows) for rows in self._list_rows], dtype=np.int64)
+            temporary = self._index_path + ".tmp.npz"
+            np.savez(
+                temporary,
+                centroids=self._centroids,
+                scale=self._scale,
+                sizes=sizes,
+                rows=np.concatenate(self._list_rows),
+                codes=np.concatenate(self._list_codes),
+            )
+            os.replace(temporary, self._index_path)
+            self._dirty = False
+
+    def _load_index(self):
+        if not os.path.exists(self._index_path):
+            return
+        with np.load(self._index_path) as index:
+            self._centroids = index["centroids"]
+            self._scale = index["scale"]
+            offsets = np.concatenate([[0], np.cumsum(index["sizes"])])
+            rows, codes = index["rows"], index["codes"]
+        self.n_lists = len(self._centroids)
+        self._list_rows = [rows[offsets[i]:offsets[i + 1]] for i in range(self.n_lists)]
+        self._list_codes = [codes[offsets[i]:offsets[i + 1]] for i in range(self.n_lists)]
+        self._assignment = np.full(len(self._alive), -1, dtype=np.int32)
+        for list_id, list_rows in enumerate(self._list_rows):
+            self._assignment[list_rows[list_rows < len(self._assignment)]] = list_id
+
+        # Writes made after the index was last saved: index new rows, drop deleted ones
+        indexed = self._assignment >= 0
+        stale = np.flatnonzero(indexed & ~self._alive)
+        missing = np.flatnonzero(self._alive & ~indexed)
+        if len(stale):
+            self._remove_from_lists(stale)
+        if len(missing):
+            self._add_to_lists(missing)
+        if len(stale) or len(missing):
+            print(f"[IVF] 🔧 Reconciled index of '{self.name}': {len(missing)} added, {len(stale)} removed")
+        self._dirty = bool(len(stale) or len(missing))
+
+    # --- Search ---
+
+    def _search(self, query: np.ndarray, candidates: Optional[np.ndarray], k: int):
+        if not self.trained:
+            # Exact search until the background training has finished
+            self.train_in_background()
+            return super()._search(query, candidates, k)
+
+        centroid_scores = self._centroids @ query
+        nprobe = min(self.nprobe, self.n_lists)
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        scaled_query = query * self._scale
+
+        rows = np.concatenate([self._list_rows[list_id] for list_id in probes])
+        approximate = np.concatenate([
+            centroid_scores[list_id] + self._list_codes[list_id].astype(np.float32) @ scaled_query
+            for list_id in probes
+        ])
+        if candidates is not None:
+            allowed = candidates[rows]
+            rows, approximate = rows[allowed], approximate[allowed]
+
+        if len(rows) < k:
+            # Too few matches in the probed lists, e.g. behind a selective filter
+            return super()._search(query, candidates, k)
+
+        shortlist = min(len(rows), k * max(1, self.rerank))
+        best = np.argpartition(-approximate, shortlist - 1)[:shortlist]
+        rows = np.sort(rows[best])
+        exact = np.asarray(self._vectors[rows]) @ query
+        top = np.argpartition(-exact, k - 1)[:k]
+        top = top[np.argsort(-exact[top])]
+        return rows[top], exact[top]
+
+    def index_stats(self) -> dict:
+        with self._lock:
+            sizes = [len(rows) for rows in self._list_rows]
+            return {
+                "trained": self.trained,
+                "n_lists": self.n_lists if self.trained else 0,
+                "nprobe": self.nprobe,
+                "indexed": int(sum(sizes)),
+                "largest_list": max(sizes) if sizes else 0,
+                "code_bytes": int(sum(codes.nbytes for codes in self._list_codes)),
+            }
@@ -0,0 +1,308 @@
+import os
+import re
+import json
+import math
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# BM25 parameters: term-frequency saturation and document-length normalisation
+DEFAULT_K1 = float(os.getenv("BM25_K1", "1.2"))
+DEFAULT_B = float(os.getenv("BM25_B", "0.75"))
+
+# Words, numbers and identifiers such as "PN-4471-B", "v2.3.1" or "error_code"
+_TOKEN_RE = re.compile(r"[^\W_]+(?:[-_./][^\W_]+)*")
+_SEPARATOR_RE = re.compile(r"[-_./]")
+# Maximum number of host parameters per SQLite statement
+_SQL_BATCH = 500
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lowercase terms. Compound identifiers are kept whole, so an exact part
+    number matches strongly, and are also split into their parts.
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(text.casefold()):
+        terms.append(token)
+        if _SEPARATOR_RE.search(token):
+            terms.extend(part for part in _SEPARATOR_RE.split(token) if part)
+    return terms
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index of the chunks of one collection, stored in a SQLite file.
+
+    Chunks are numbered with ordinals. Every term maps to its postings: two parallel arrays
+    of chunk ordinals and term frequencies (`array('I')`), appended to as chunks are added and
+    stored as blobs. All postings are held in memory, so a query scores its terms with a few
+    NumPy operations and no network calls. Chunk texts and metadata are kept on disk next to
+    the postings, so hits can be returned and expanded without the vector store.
+
+    Deleted chunks are dropped from the chunk table and skipped when scoring; their postings
+    are compacted away on `save()` once they outnumber the live chunks. Changes are written
+    by `save()` in one transaction.
+
+    The file is local to the host, and `save()` writes the postings held by this process, so
+    a collection must be ingested by one process at a time. Other processes on the same host
+    reload the file when the collection version changes, see `open_lexical_index`.
+    """
+    def __init__(self, path: str, k1: float = None, b: float = None):
+        self.path = path
+        self.k1 = DEFAULT_K1 if k1 is None else k1
+        self.b = DEFAULT_B if b is None else b
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id TEXT PRIMARY KEY, ordinal INTEGER NOT NULL, length INTEGER NOT NULL, document TEXT, metadata TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS postings (term TEXT PRIMARY KEY, ordinals BLOB, tfs BLOB)")
+        self._conn.commit()
+
+        self._ordinals: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._lengths = array("I")
+        self._alive = bytearray()
+        for chunk_id, ordinal, length in self._conn.execute("SELECT id, ordinal, length FROM chunks ORDER BY ordinal"):
+            self._place(chunk_id, ordinal, length)
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        for term, ordinals_blob, tfs_blob in self._conn.execute("SELECT term, ordinals, tfs FROM postings"):
+            ordinals, tfs = array("I"), array("I")
+            ordinals.frombytes(ordinals_blob)
+            tfs.frombytes(tfs_blob)
+            self._postings[term] = (ordinals, tfs)
+        # Postings may reference chunks written after the chunk table was last saved
+        self._next_ordinal = max([len(self._ids)] + [ordinals[-1] + 1 for ordinals, _ in self._postings.values() if ordinals])
+        self._dirty_terms = set()
+
+    def _place(self, chunk_id: str, ordinal: int, length: int):
+        if ordinal >= len(self._ids):
+            self._ids.extend([None] * (ordinal + 1 - len(self._ids)))
+            self._lengths.extend([0] * (ordinal + 1 - len(self._lengths)))
+            self._alive.extend(bytes(ordinal + 1 - len(self._alive)))
+        self._ids[ordinal] = chunk_id
+        self._lengths[ordinal] = length
+        self._alive[ordinal] = 1
+        self._ordinals[chunk_id] = ordinal
+
+    def count(self) -> int:
+        return len(self._ordinals)
+
+    # --- Writes ---
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[dict] = None):
+        """
+        Indexes chunks. Chunk ids are derived from their content, so a chunk already in the
+        index only has its metadata refreshed.
+        """
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            for chunk_id, document, metadata in zip(ids, documents, metadatas):
+                metadata_json = json.dumps(metadata) if metadata is not None else None
+                if chunk_id in self._ordinals:
+                    self._conn.execute("UPDATE chunks SET metadata = ? WHERE id = ?", (metadata_json, chunk_id))
+                    continue
+                terms = Counter(tokenize(document or ""))
+                ordinal = self._next_ordinal
+                self._next_ordinal += 1
+                for term, tf in terms.items():
+                    ordinals, tfs = self._postings.setdefault(term, (array("I"), array("I")))
+                    ordinals.append(ordinal)
+                    tfs.append(tf)
+                    self._dirty_terms.add(term)
+                length = sum(terms.values())
+                self._place(chunk_id, ordinal, length)
+                self._conn.execute(
+                    "INSERT INTO chunks (id, ordinal, length, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (chunk_id, ordinal, length, document, metadata_json)
+                )
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            removed = [chunk_id for chunk_id in ids if chunk_id in self._ordinals]
+            for chunk_id in removed:
+                ordinal = self._ordinals.pop(chunk_id)
+                self._ids[ordinal] = None
+                self._alive[ordinal] = 0
+            for start in range(0, len(removed), _SQL_BATCH):
+                batch = removed[start:start + _SQL_BATCH]
+                self._conn.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM postings")
+            self._conn.commit()
+            self._ordinals, self._ids, self._lengths, self._alive = {}, [], array("I"), bytearray()
+            self._postings, self._dirty_terms = {}, set()
+            self._next_ordinal = 0
+
+    def _compact(self):
+        """
+        Renumbers the live chunks from 0 and drops the postings of deleted chunks.
+        """
+        live = [ordinal for ordinal, chunk_id in enumerate(self._ids) if chunk_id is not None]
+        remap = np.full(max(self._next_ordinal, 1), -1, dtype=np.int64)
+        remap[live] = np.arange(len(live))
+        for term, (ordinals, tfs) in list(self._postings.items()):
+            new_ordinals = remap[np.frombuffer(ordinals, dtype=np.uint32)]
+            keep = new_ordinals >= 0
+            if not keep.any():
+                del self._postings[term]
+                self._conn.execute("DELETE FROM postings WHERE term = ?", (term,))
+                continue
+            self._postings[term] = (array("I", new_ordinals[keep].astype(np.uint32).tobytes()),
+                                    array("I", np.frombuffer(tfs, dtype=np.uint32)[keep].tobytes()))
+            self._dirty_terms.add(term)
+        # Ordinals only decrease, so renumbering in ascending order never reuses a taken ordinal
+        self._conn.executemany("UPDATE chunks SET ordinal = ? WHERE id = ?",
+                               [(new, self._ids[old]) for new, old in enumerate(live)])
+        ids, lengths = [self._ids[ordinal] for ordinal in live], [self._lengths[ordinal] for ordinal in live]
+        self._ordinals, self._ids, self._lengths, self._alive = {}, [], array("I"), bytearray()
+        for ordinal, (chunk_id, length) in enumerate(zip(ids, lengths)):
+            self._place(chunk_id, ordinal, length)
+        self._next_ordinal = len(live)
+
+    def save(self):
+        """
+        Writes the changed postings and chunks in one transaction.
+        """
+        with self._lock:
+            dead = self._next_ordinal - len(self._ordinals)
+            if dead and dead > len(self._ordinals):
+                self._compact()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO postings (term, ordinals, tfs) VALUES (?, ?, ?)",
+                [(term, self._postings[term][0].tobytes(), self._postings[term][1].tobytes())
+                 for term in self._dirty_terms if term in self._postings]
+            )
+            self._conn.commit()
+            self._dirty_terms = set()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Reads ---
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Returns the ids and BM25 scores of the `k` best matching chunks, best first.
+        """
+        with self._lock:
+            n_chunks = len(self._ordinals)
+            terms = [term for term in set(tokenize(query)) if term in self._postings]
+            if not n_chunks or not terms or k <= 0:
+                return []
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.float32)
+            alive = np.frombuffer(self._alive, dtype=bool)
+            average_length = max(float(lengths[alive].mean()), 1.0)
+            norms = self.k1 * (1 - self.b + self.b * lengths / average_length)
+
+            scores = np.zeros(len(self._ids), dtype=np.float32)
+            for term in terms:
+                ordinals, tfs = self._postings[term]
+                ordinals = np.frombuffer(ordinals, dtype=np.uint32)
+                tfs = np.frombuffer(tfs, dtype=np.uint32).astype(np.float32)
+                known = ordinals < len(alive)
+                ordinals, tfs = ordinals[known], tfs[known]
+                document_frequency = int(alive[ordinals].sum())
+                if not document_frequency:
+                    continue
+                idf = math.log(1 + (n_chunks - document_frequency + 0.5) / (document_frequency + 0.5))
+                scores[ordinals] += idf * tfs * (self.k1 + 1) / (tfs + norms[ordinals])
+
+            scores[~alive] = 0
+            matched = np.flatnonzero(scores > 0)
+            if not len(matched):
+                return []
+            k = min(k, len(matched))
+            top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[ordinal], float(scores[ordinal])) for ordinal in top]
+
+    def get(self, ids: List[str], include: List[str] = None) -> dict:
+        """
+        Returns stored chunks by id in the shape of a Chroma `get`, so the index can stand in
+        for the collection when expanding hits.
+        """
+        include = include if include is not None else ["documents", "metadatas"]
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = list(ids[start:start + _SQL_BATCH])
+                placeholders = ",".join("?" * len(batch))
+                for chunk_id, document, metadata_json in self._conn.execute(
+                        f"SELECT id, document, metadata FROM chunks WHERE id IN ({placeholders})", batch):
+                    found[chunk_id] = (document, json.loads(metadata_json) if metadata_json else None)
+        ordered = [chunk_id for chunk_id in ids if chunk_id in found]
+        result = {"ids": ordered}
+        if "documents" in include:
+            result["documents"] = [found[chunk_id][0] for chunk_id in ordered]
+        if "metadatas" in include:
+            result["metadatas"] = [found[chunk_id][1] for chunk_id in ordered]
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "chunks": len(self._ordinals),
+                "terms": len(self._postings),
+                "postings": sum(len(ordinals) for ordinals, _ in self._postings.values()),
+                "deleted": self._next_ordinal - len(self._ordinals),
+            }
+
+
+_open_indexes: Dict[str, LexicalIndex] = {}
+# Collection version each open index was loaded for
+_open_versions: Dict[str, int] = {}
+_open_indexes_lock = threading.Lock()
+
+
+def lexical_index_path(directory: str, name: str) -> str:
+    if not name or ".." in name or os.sep in name or "/" in name or (os.altsep and os.altsep in name):
+        raise ValueError(f"Invalid collection name '{name}'")
+    return os.path.join(os.path.abspath(directory), f"{name}.sqlite")
+
+
+def open_lexical_index(directory: str, name: str, version: int = None) -> LexicalIndex:
+    """
+    Returns the lexical index of a collection, opened once per process and shared. When
+    `version` differs from the collection version the index was loaded for, e.g. after an
+    ingestion by another worker, the index is loaded again from its file. Writers holding the
+    previous instance keep using it; it saves to the same file.
+    """
+    path = lexical_index_path(directory, name)
+    with _open_indexes_lock:
+        index = _open_indexes.get(path)
+        loaded = _open_versions.get(path)
+        if index is None or (version is not None and loaded is not None and version != loaded):
+            index = LexicalIndex(path)
+            _open_indexes[path] = index
+        if version is not None:
+            _open_versions[path] = version
+        return index
+
+
+def drop_lexical_index(directory: str, name: str):
+    """
+    Closes and deletes the lexical index of a collection, if any.
+    """
+    path = lexical_index_path(directory, name)
+    with _open_indexes_lock:
+        _open_versions.pop(path, None)
+        index = _open_indexes.pop(path, None)
+        if index is not None:
+            index.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
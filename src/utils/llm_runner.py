@@ -1,22 +1,20 @@
+from typing import AsyncIterator, Iterator
 from fastapi import HTTPException
-from google import genai
 from google.genai import types
 from src.helpers.prompts import main_response_prompt
+from src.utils.chunker import count_tokens
+from src.utils.gemini_pool import APIKeysExhausted, gemini_pool, is_auth_error
 from dotenv import load_dotenv
-import os
 load_dotenv()
 
 class LLM():
     def __init__(self):
-        api_keys_str = os.getenv("GOOGLE_GENAI_API_KEYS", "")
-        self.api_keys = [k.strip() for k in api_keys_str.split(",") if k.strip()]
         self.model = "gemini-2.0-flash-lite"
 
     def is_authentication_error(self, e: Exception) -> bool:
-        error_msg = str(e).lower()
-        return any(keyword in error_msg for keyword in ['permission_denied', 'invalid api key', 'authentication'])
+        return is_auth_error(e)
 
-    def generate_response(self, user_query: str) -> str:
+    def _request(self, user_query: str) -> dict:
         generate_content_config = types.GenerateContentConfig(
             temperature=0,
             response_mime_type="text/plain",
@@ -31,21 +29,89 @@ class LLM():
                 ],
             ),
         ]
+        return {"model": self.model, "contents": contents, "config": generate_content_config}
+
+    @staticmethod
+    def _prompt_tokens(user_query: str) -> int:
+        # Counted against the tokens/min limit of the key
+        return count_tokens(main_response_prompt) + count_tokens(user_query)
+
+    @staticmethod
+    def _response_text(response) -> str:
+        content = response.text.strip()
+        return content.replace("```json", "").replace("```", "").strip()
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        return (chunk.text or "").replace("```json", "").replace("```", "")
+
+    def generate_response(self, user_query: str) -> str:
+        request = self._request(user_query)
+
+        def generate_with(key: str) -> str:
+            return self._response_text(gemini_pool.client(key).models.generate_content(**request))
+
+        try:
+            return gemini_pool.call(generate_with, "LLM response", self._prompt_tokens(user_query))
+        except APIKeysExhausted as e:
+            raise HTTPException(status_code=429 if e.rate_limited else 401, detail=f"{e}.")
+
+    async def agenerate_response(self, user_query: str) -> str:
+        """
+        Async version of `generate_response`, which waits on the API without blocking the event loop.
+        """
+        request = self._request(user_query)
+
+        async def generate_with(key: str) -> str:
+            return self._response_text(await gemini_pool.client(key).aio.models.generate_content(**request))
+
+        try:
+            return await gemini_pool.acall(generate_with, "LLM response", self._prompt_tokens(user_query))
+        except APIKeysExhausted as e:
+            raise HTTPException(status_code=429 if e.rate_limited else 401, detail=f"{e}.")
+
+    def stream_response(self, user_query: str) -> Iterator[str]:
+        """
+        Streams the response as text chunks as soon as the model produces them. The key and its
+        rate-limiter slot are held until the stream is exhausted or closed.
+        """
+        request = self._request(user_query)
+
+        def open_stream(key: str):
+            return gemini_pool.client(key).models.generate_content_stream(**request)
+
+        stream = gemini_pool.stream(open_stream, "LLM stream", self._prompt_tokens(user_query))
+        try:
+            try:
+                # The pool picks the key when the first chunk is requested
+                first = next(stream, None)
+            except APIKeysExhausted as e:
+                raise HTTPException(status_code=429 if e.rate_limited else 401, detail=f"{e}.")
+            if first is not None:
+                yield self._chunk_text(first)
+                for chunk in stream:
+                    yield self._chunk_text(chunk)
+        finally:
+            stream.close()
+
+    async def astream_response(self, user_query: str) -> AsyncIterator[str]:
+        """
+        Async version of `stream_response`.
+        """
+        request = self._request(user_query)
+
+        async def open_stream(key: str):
+            return await gemini_pool.client(key).aio.models.generate_content_stream(**request)
 
-        for key in self.api_keys:
-            client = genai.Client(api_key=key)
+        stream = gemini_pool.astream(open_stream, "LLM stream", self._prompt_tokens(user_query))
+        try:
             try:
-                response = client.models.generate_content(
-                    model=self.model,
-                    contents=contents,
-                    config=generate_content_config,
-                )
-                content = response.text.strip()
-                return content.replace("```json", "").replace("```", "").strip()
-            except Exception as e:
-                if self.is_authentication_error(e):
-                    continue
-                else:
-                    raise e
-
-        raise HTTPException(status_code=401, detail="All API keys failed authentication.")
\ No newline at end of file
+                first = await anext(stream, None)
+            except APIKeysExhausted as e:
+                raise HTTPException(status_code=429 if e.rate_limited else 401, detail=f"{e}.")
+            if first is not None:
+                yield self._chunk_text(first)
+                async for chunk in stream:
+                    yield self._chunk_text(chunk)
+        finally:
+            await stream.aclose()
@@ -0,0 +1,443 @@
+import os
+import json
+import shutil
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+
+# Rows allocated when a collection's vector file is created; it doubles when full
+_INITIAL_CAPACITY = 1024
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def match_where(metadata: Optional[dict], where: Optional[dict]) -> bool:
+    """
+    Evaluates a Chroma-style `where` filter against one metadata dict. Supports `$and`, `$or`
+    and the `$eq`, `$ne`, `$in`, `$nin`, `$gt`, `$gte`, `$lt` and `$lte` operators.
+    """
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(match_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(match_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq":
+                    matched = value == operand
+                elif operator == "$ne":
+                    matched = value != operand
+                elif operator == "$in":
+                    matched = value in operand
+                elif operator == "$nin":
+                    matched = value not in operand
+                elif value is None:
+                    matched = False
+                elif operator == "$gt":
+                    matched = value > operand
+                elif operator == "$gte":
+                    matched = value >= operand
+                elif operator == "$lt":
+                    matched = value < operand
+                elif operator == "$lte":
+                    matched = value <= operand
+                else:
+                    raise ValueError(f"Unsupported where operator '{operator}'")
+                if not matched:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class LocalCollection:
+    """
+    A collection stored on local disk, with the subset of the Chroma collection API used by
+    ingestion and retrieval: add/upsert/update/get/delete/query/count/modify.
+
+    Embeddings are L2-normalised on insert and kept as float32 rows of a memory-mapped NumPy
+    matrix (`vectors.f32`), so cosine similarity is a dot product and a query is a single
+    matrix-vector product followed by `argpartition` for the top k. Ids, documents and
+    metadata live in a SQLite side table (`chunks.sqlite`); ids and metadata are also kept in
+    memory to map rows back to chunks and to evaluate `where` filters without a round trip.
+    Rows freed by deletes are reused by later inserts.
+
+    A collection is opened once per process (see `LocalVectorClient`); all access goes
+    through a lock, so it is safe to share between threads but not between processes.
+    """
+    def __init__(self, path: str, name: str, embedding_function=None, metadata: dict = None):
+        self.path = path
+        self.name = name
+        self._embedding_function = embedding_function
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+        self._conn = sqlite3.connect(os.path.join(path, "chunks.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, document TEXT, metadata TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+        settings = dict(self._conn.execute("SELECT key, value FROM settings").fetchall())
+        self.metadata = json.loads(settings["metadata"]) if "metadata" in settings else (metadata or None)
+        if "metadata" not in settings and metadata:
+            self._save_setting("metadata", json.dumps(metadata))
+        self.dimension = int(settings["dimension"]) if "dimension" in settings else None
+
+        self._rows: Dict[str, int] = {}
+        self._ids: Dict[int, str] = {}
+        self._metadatas: Dict[int, dict] = {}
+        for row, chunk_id, metadata_json in self._conn.execute("SELECT row, id, metadata FROM chunks"):
+            self._rows[chunk_id] = row
+            self._ids[row] = chunk_id
+            self._metadatas[row] = json.loads(metadata_json) if metadata_json else None
+
+        self._vectors = None
+        self._alive = np.zeros(0, dtype=bool)
+        if self.dimension is not None:
+            self._open_vectors()
+
+    # --- Storage ---
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    def _save_setting(self, key: str, value: str):
+        self._conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+        self._conn.commit()
+
+    def _open_vectors(self, capacity: int = None):
+        row_bytes = self.dimension * 4
+        if capacity is not None:
+            with open(self._vectors_path, "ab") as handle:
+                handle.truncate(capacity * row_bytes)
+        capacity = os.path.getsize(self._vectors_path) // row_bytes
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[list(self._ids)] = True
+        self._alive = alive
+
+    def _allocate_rows(self, count: int) -> List[int]:
+        free = np.flatnonzero(~self._alive)
+        rows = free[:count].tolist()
+        if len(rows) < count:
+            capacity = len(self._alive)
+            needed = capacity + count - len(rows)
+            new_capacity = max(_INITIAL_CAPACITY, capacity)
+            while new_capacity < needed:
+                new_capacity *= 2
+            self._vectors.flush()
+            self._vectors = None
+            self._open_vectors(new_capacity)
+            rows.extend(range(capacity, capacity + count - len(rows)))
+        return rows
+
+    def _normalize(self, embeddings) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2:
+            raise ValueError("Embeddings must be a list of vectors")
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+            self._save_setting("dimension", str(self.dimension))
+            self._open_vectors(_INITIAL_CAPACITY)
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimension {self.dimension}")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _embed(self, documents: List[str]):
+        if self._embedding_function is None:
+            raise ValueError(f"Collection '{self.name}' has no embedding function to embed documents")
+        return self._embedding_function(documents)
+
+    def _write_vectors(self, rows: List[int], vectors: np.ndarray):
+        """Hook for subclasses that index vectors on top of the flat matrix."""
+        self._vectors[rows] = vectors
+
+    def _remove_vectors(self, rows: List[int]):
+        """Hook for subclasses that index vectors on top of the flat matrix."""
+        self._vectors[rows] = 0
+
+    # --- Collection API ---
+
+    def count(self) -> int:
+        return len(self._rows)
+
+    def persist(self):
+        """
+        Flushes the vector file. Subclasses also save their index here.
+        """
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+
+    def modify(self, name: str = None, metadata: dict = None):
+        """
+        Updates the collection metadata. Ingestion saves its manifest here once per run, so
+        the collection is persisted as well.
+        """
+        with self._lock:
+            if name is not None and name != self.name:
+                raise ValueError("Local collections cannot be renamed")
+            if metadata is not None:
+                self.metadata = dict(metadata)
+                self._save_setting("metadata", json.dumps(self.metadata))
+            self.persist()
+
+    def upsert(self, ids: List[str], documents: List[str] = None, embeddings=None, metadatas: List[dict] = None):
+        """
+        Inserts new chunks and overwrites existing ones. Documents are embedded with the
+        collection's embedding function when no embeddings are given.
+        """
+        if not ids:
+            return
+        if embeddings is None:
+            embeddings = self._embed(documents)
+        with self._lock:
+            vectors = self._normalize(embeddings)
+            new_ids = [chunk_id for chunk_id in dict.fromkeys(ids) if chunk_id not in self._rows]
+            for chunk_id, row in zip(new_ids, self._allocate_rows(len(new_ids))):
+                self._rows[chunk_id] = row
+                self._ids[row] = chunk_id
+            rows = [self._rows[chunk_id] for chunk_id in ids]
+
+            self._write_vectors(rows, vectors)
+            self._alive[rows] = True
+            self._vectors.flush()
+            records = []
+            for index, (chunk_id, row) in enumerate(zip(ids, rows)):
+                metadata = metadatas[index] if metadatas else None
+                self._metadatas[row] = metadata
+                records.append((row, chunk_id, documents[index] if documents else None,
+                                json.dumps(metadata) if metadata is not None else None))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (row, id, document, metadata) VALUES (?, ?, ?, ?)", records
+            )
+            self._conn.commit()
+
+    # Chroma ignores ids that already exist on add; overwriting them is equivalent for content-derived ids
+    add = upsert
+
+    def update(self, ids: List[str], embeddings=None, metadatas: List[dict] = None, documents: List[str] = None):
+        """
+        Updates the metadata, documents and/or embeddings of existing chunks; unknown ids are ignored.
+        """
+        with self._lock:
+            known = [index for index, chunk_id in enumerate(ids) if chunk_id in self._rows]
+            if not known:
+                return
+            rows = [self._rows[ids[index]] for index in known]
+            if embeddings is None and documents is not None:
+                # Like Chroma, changed documents are embedded again
+                embeddings = self._embed(documents)
+            if embeddings is not None:
+                self._write_vectors(rows, self._normalize([embeddings[index] for index in known]))
+                self._vectors.flush()
+            if metadatas is not None:
+                for index, row in zip(known, rows):
+                    self._metadatas[row] = metadatas[index]
+                self._conn.executemany(
+                    "UPDATE chunks SET metadata = ? WHERE row = ?",
+                    [(json.dumps(metadatas[index]), row) for index, row in zip(known, rows)],
+                )
+            if documents is not None:
+                self._conn.executemany(
+                    "UPDATE chunks SET document = ? WHERE row = ?",
+                    [(documents[index], row) for index, row in zip(known, rows)],
+                )
+            self._conn.commit()
+
+    def _select_rows(self, ids: List[str] = None, where: dict = None) -> List[int]:
+        if ids is not None:
+            rows = [self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows]
+        else:
+            rows = sorted(self._ids)
+        if where:
+            rows = [row for row in rows if match_where(self._metadatas.get(row), where)]
+        return rows
+
+    def _documents(self, rows: List[int]) -> List[Optional[str]]:
+        found = {}
+        for start in range(0, len(rows), _SQL_BATCH):
+            batch = rows[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            found.update(self._conn.execute(f"SELECT row, document FROM chunks WHERE row IN ({placeholders})", batch))
+        return [found.get(row) for row in rows]
+
+    def _result(self, rows: List[int], include) -> dict:
+        result = {"ids": [self._ids[row] for row in rows]}
+        if "documents" in include:
+            result["documents"] = self._documents(rows)
+        if "metadatas" in include:
+            result["metadatas"] = [self._metadatas.get(row) for row in rows]
+        if "embeddings" in include:
+            result["embeddings"] = [self._vectors[row].tolist() for row in rows]
+        return result
+
+    def get(self, ids: List[str] = None, where: dict = None, limit: int = None, offset: int = None,
+            include: List[str] = None) -> dict:
+        """
+        Returns chunks by id and/or `where` filter. Stored embeddings are unit-length.
+        """
+        include = include if include is not None else ["documents", "metadatas"]
+        with self._lock:
+            rows = self._select_rows(ids, where)
+            rows = rows[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+            return self._result(rows, include)
+
+    def delete(self, ids: List[str] = None, where: dict = None):
+        with self._lock:
+            if ids is None and not where:
+                return
+            rows = self._select_rows(ids, where)
+            if not rows:
+                return
+            self._remove_vectors(rows)
+            self._alive[rows] = False
+            self._vectors.flush()
+            for row in rows:
+                del self._rows[self._ids.pop(row)]
+                self._metadatas.pop(row, None)
+            for start in range(0, len(rows), _SQL_BATCH):
+                batch = rows[start:start + _SQL_BATCH]
+                self._conn.execute(f"DELETE FROM chunks WHERE row IN ({','.join('?' * len(batch))})", batch)
+            self._conn.commit()
+
+    def _search(self, query: np.ndarray, candidates: Optional[np.ndarray], k: int):
+        """
+        Exact top-k search of one unit-length query vector.
+
+        Returns:
+        - Tuple[np.ndarray, np.ndarray]: The rows of the best matches and their cosine similarities, best first.
+        """
+        scores = self._vectors @ query
+        mask = self._alive if candidates is None else candidates
+        scores = np.where(mask, scores, -np.inf)
+        k = min(k, int(mask.sum()))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def query(self, query_texts: List[str] = None, query_embeddings=None, n_results: int = 10,
+              where: dict = None, include: List[str] = None) -> dict:
+        """
+        Returns the `n_results` nearest chunks of every query, with cosine distances.
+        """
+        include = include if include is not None else ["documents", "metadatas", "distances"]
+        if query_embeddings is None:
+            query_embeddings = self._embed(query_texts)
+        result = {"ids": []}
+        for key in ("documents", "metadatas", "embeddings", "distances"):
+            if key in include:
+                result[key] = []
+
+        with self._lock:
+            if self.dimension is None:
+                for key in result:
+                    result[key] = [[] for _ in query_embeddings]
+                return result
+            queries = self._normalize(query_embeddings)
+            candidates = None
+            if where:
+                candidates = np.zeros(len(self._alive), dtype=bool)
+                candidates[self._select_rows(where=where)] = True
+            for query in queries:
+                rows, scores = self._search(query, candidates, n_results)
+                hits = self._result(rows.tolist(), include)
+                for key, values in hits.items():
+                    result[key].append(values)
+                if "distances" in include:
+                    result["distances"].append((1.0 - scores).tolist())
+        return result
+
+
+class LocalVectorClient:
+    """
+    Client for collections stored under a local directory, with the subset of the Chroma
+    client API used by `IngestData`. Collections are opened once per process and shared by
+    every client on the same path, so ingestion jobs and queries see the same data.
+    """
+    _open: Dict[str, LocalCollection] = {}
+    _open_lock = threading.Lock()
+
+    def __init__(self, path: str, index: str = "flat"):
+        self.path = os.path.abspath(path)
+        if index == "flat":
+            self.collection_class = LocalCollection
+        elif index == "ivf":
+            # Imported here to keep the flat store free of the index code
+            from src.utils.ivf_index import IVFCollection
+            self.collection_class = IVFCollection
+        elif index in ("int8", "binary"):
+            from src.utils.quantized_store import Int8Collection, BinaryCollection
+            self.collection_class = Int8Collection if index == "int8" else BinaryCollection
+        else:
+            raise ValueError(f"Unknown local vector index '{index}'. Use 'flat', 'ivf', 'int8' or 'binary'")
+
+    def _collection_path(self, name: str) -> str:
+        # Names become directories that `delete_collection` removes, so they must stay under the path
+        if not name or name in (".", "..") or os.sep in name or "/" in name or (os.altsep and os.altsep in name):
+            raise ValueError(f"Invalid collection name '{name}'")
+        return os.path.join(self.path, name)
+
+    def get_collection(self, name: str, embedding_function=None) -> LocalCollection:
+        path = self._collection_path(name)
+        with self._open_lock:
+            collection = self._open.get(path)
+            if collection is None:
+                if not os.path.exists(os.path.join(path, "chunks.sqlite")):
+                    raise ValueError(f"Collection {name} does not exist.")
+                collection = self.collection_class(path, name, embedding_function)
+                self._open[path] = collection
+            if embedding_function is not None:
+                collection._embedding_function = embedding_function
+            return collection
+
+    def create_collection(self, name: str, embedding_function=None, metadata: dict = None) -> LocalCollection:
+        path = self._collection_path(name)
+        with self._open_lock:
+            if path in self._open or os.path.exists(os.path.join(path, "chunks.sqlite")):
+                raise ValueError(f"Collection {name} already exists.")
+            collection = self.collection_class(path, name, embedding_function, metadata)
+            self._open[path] = collection
+            return collection
+
+    def get_or_create_collection(self, name: str, embedding_function=None, metadata: dict = None) -> LocalCollection:
+        try:
+            return self.get_collection(name, embedding_function)
+        except ValueError:
+            return self.create_collection(name, embedding_function, metadata)
+
+    def delete_collection(self, name: str):
+        path = self._collection_path(name)
+        with self._open_lock:
+            collection = self._open.pop(path, None)
+            if collection is not None:
+                with collection._lock:
+                    collection._conn.close()
+                    collection._vectors = None
+            if not os.path.exists(path):
+                raise ValueError(f"Collection {name} does not exist.")
+            shutil.rmtree(path)
+
+    def list_collections(self) -> List[str]:
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path)
+                      if os.path.exists(os.path.join(self.path, name, "chunks.sqlite")))
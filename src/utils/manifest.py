@@ -0,0 +1,120 @@
+import time
+import hashlib
+from typing import Dict, Iterable, Set
+
+# Collection metadata keys holding the hash of every fully ingested document
+MANIFEST_PREFIX = "doc:"
+# Collection metadata key counting the writes to the collection
+VERSION_KEY = "version"
+# Collection metadata key holding the wall-clock time the collection was last used
+LAST_USED_KEY = "last_used"
+
+
+def hash_file(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    Returns the SHA-256 hex digest of a file, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_text(text: str) -> str:
+    """
+    Returns the SHA-256 hex digest of a chunk text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(doc_id: str, chunk_hash: str, occurrence: int = 0) -> str:
+    """
+    Returns a stable, content-derived chunk id. `occurrence` tells apart identical chunks
+    repeated within the same document.
+    """
+    return hashlib.sha256(f"{doc_id}\0{chunk_hash}\0{occurrence}".encode("utf-8")).hexdigest()[:32]
+
+
+def collection_version(db) -> int:
+    """
+    Returns the version of a collection, bumped by every ingestion or delete.
+    """
+    return int((db.metadata or {}).get(VERSION_KEY, 0))
+
+
+def collection_last_used(db) -> float:
+    """
+    Returns when a collection was last used (seconds since the epoch), or 0 if never recorded.
+    """
+    return float((db.metadata or {}).get(LAST_USED_KEY, 0))
+
+
+class IngestManifest:
+    """
+    Manifest of the documents stored in a collection, kept in the collection metadata.
+
+    Every fully ingested document is recorded as `doc:<doc_id> -> file hash`. Chunks carry
+    `doc_id`, `file_hash` and `chunk_hash` metadata, so the chunk ids of a document can be
+    listed with a metadata filter and diffed against a new version of the file. The manifest
+    also carries the collection version, which keys the retrieval cache.
+    """
+    def __init__(self, db):
+        self.db = db
+        metadata = db.metadata or {}
+        self.file_hashes: Dict[str, str] = {
+            key[len(MANIFEST_PREFIX):]: value for key, value in metadata.items() if key.startswith(MANIFEST_PREFIX)
+        }
+        self.version = collection_version(db)
+        self._dirty = False
+
+    def is_unchanged(self, doc_id: str, file_hash: str) -> bool:
+        return self.file_hashes.get(doc_id) == file_hash
+
+    def chunk_ids(self, doc_ids: Iterable[str]) -> Dict[str, Set[str]]:
+        """
+        Returns the ids of the chunks currently stored for each document, with a single `get`.
+        """
+        doc_ids = list(doc_ids)
+        existing = {doc_id: set() for doc_id in doc_ids}
+        if not doc_ids:
+            return existing
+        where = {"doc_id": doc_ids[0]} if len(doc_ids) == 1 else {"doc_id": {"$in": doc_ids}}
+        result = self.db.get(where=where, include=["metadatas"])
+        for id_, metadata in zip(result.get("ids", []), result.get("metadatas", [])):
+            existing.setdefault((metadata or {}).get("doc_id"), set()).add(id_)
+        return existing
+
+    def mark(self, doc_id: str, file_hash: str):
+        self.file_hashes[doc_id] = file_hash
+        self._dirty = True
+
+    def remove(self, doc_id: str):
+        if self.file_hashes.pop(doc_id, None) is not None:
+            self._dirty = True
+
+    def bump_version(self):
+        """
+        Records that the chunks of the collection changed, so cached results become stale.
+        """
+        self.version += 1
+        self._dirty = True
+
+    def save(self):
+        """
+        Writes the manifest back to the collection metadata, keeping unrelated keys.
+        """
+        if not self._dirty:
+            return
+        metadata = {
+            key: value for key, value in (self.db.metadata or {}).items()
+            if not key.startswith(MANIFEST_PREFIX) and not key.startswith("hnsw:")
+        }
+        metadata.update({f"{MANIFEST_PREFIX}{doc_id}": file_hash for doc_id, file_hash in self.file_hashes.items()})
+        # Chroma rejects empty metadata, so the manifest always keeps a marker key
+        metadata["manifest"] = "v1"
+        metadata[VERSION_KEY] = self.version
+        # An ingestion is a use of the collection, see `CollectionRegistry.reap`
+        metadata[LAST_USED_KEY] = time.time()
+        self.db.modify(metadata=metadata)
+        self._dirty = False
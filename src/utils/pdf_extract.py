@@ -0,0 +1,149 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Iterator, List, Optional, Tuple
+from pypdf import PdfReader
+
+# Worker cap, page-range size and per-file budget for the extraction pool
+DEFAULT_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+DEFAULT_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "25"))
+DEFAULT_FILE_TIMEOUT = float(os.getenv("PDF_FILE_TIMEOUT", "300"))
+
+
+def count_pages(file_path: str) -> int:
+    """
+    Returns the number of pages in a PDF file.
+    """
+    return len(PdfReader(file_path).pages)
+
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """
+    Extracts the text of pages [start, end) of a PDF file. Runs inside a pool worker,
+    so it only takes picklable arguments.
+
+    Parameters:
+    - file_path (str): The file path to the PDF file.
+    - start (int): Index of the first page to extract.
+    - end (int): Index one past the last page to extract.
+
+    Returns:
+    - List[str]: The text of each page in the range, in page order.
+    """
+    reader = PdfReader(file_path)
+    end = min(end, len(reader.pages))
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _plan_tasks(file_paths: List[str], pages_per_task: int, on_error: Callable) -> List[Tuple[int, str, int, int]]:
+    """
+    Splits every file into page ranges of at most `pages_per_task` pages, in file and page order.
+    """
+    tasks = []
+    for file_index, file_path in enumerate(file_paths):
+        try:
+            total_pages = count_pages(file_path)
+        except Exception as e:
+            on_error(file_path, f"Could not open PDF: {e}")
+            continue
+        for start in range(0, total_pages, pages_per_task):
+            tasks.append((file_index, file_path, start, min(start + pages_per_task, total_pages)))
+    return tasks
+
+
+def _log_error(file_path: str, message: str):
+    print(f"[PDF EXTRACT] ❌ {os.path.basename(file_path)}: {message}")
+
+
+def iter_pdf_pages(file_paths: List[str], max_workers: int = None, pages_per_task: int = None,
+                   file_timeout: float = None, on_error: Optional[Callable[[str, str], None]] = None
+                   ) -> Iterator[Tuple[int, str, int, str]]:
+    """
+    Extracts the pages of several PDF files across a process pool. Files, and page ranges
+    of large files, are parsed in parallel while results are yielded in a deterministic
+    (file, page) order. Only a bounded number of ranges is in flight at any time.
+
+    Parameters:
+    - file_paths (List[str]): The file paths to the PDF files.
+    - max_workers (int): Maximum number of worker processes. Ranges always run in a worker, so
+      `file_timeout` applies with a single worker too.
+    - pages_per_task (int): Maximum number of pages parsed by a single worker task.
+    - file_timeout (float): Seconds a file may take before its remaining pages are skipped.
+    - on_error (Callable[[str, str], None]): Called with (file_path, message) for every file that fails.
+
+    Returns:
+    - Iterator[Tuple[int, str, int, str]]: (file_index, file_path, page_number, page_text) tuples.
+      Page numbers start at 1.
+    """
+    max_workers = max(1, max_workers or DEFAULT_MAX_WORKERS)
+    pages_per_task = max(1, pages_per_task or DEFAULT_PAGES_PER_TASK)
+    file_timeout = file_timeout or DEFAULT_FILE_TIMEOUT
+    on_error = on_error or _log_error
+
+    tasks = _plan_tasks(file_paths, pages_per_task, on_error)
+
+    if not tasks:
+        return
+
+    # Even a single range goes through the pool: only a worker process can be abandoned at
+    # the file deadline, an in-process parse of a malformed PDF could hang the ingestion
+    window = max_workers * 2
+    executor = ProcessPoolExecutor(max_workers=min(max_workers, len(tasks)))
+    pending = []  # (task, future) in submission order
+    deadlines = {}  # file_index -> deadline, set once the file reaches the head of the queue
+    failed_files = set()
+    next_task = 0
+    try:
+        while pending or next_task < len(tasks):
+            while next_task < len(tasks) and len(pending) < window:
+                task = tasks[next_task]
+                next_task += 1
+                if task[0] in failed_files:
+                    continue
+                pending.append((task, executor.submit(extract_page_range, task[1], task[2], task[3])))
+            if not pending:
+                continue
+
+            (file_index, file_path, start, end), future = pending.pop(0)
+            if file_index in failed_files:
+                future.cancel()
+                continue
+            deadlines.setdefault(file_index, time.monotonic() + file_timeout)
+            try:
+                pages = future.result(timeout=max(0.0, deadlines[file_index] - time.monotonic()))
+            except FutureTimeoutError:
+                failed_files.add(file_index)
+                # Free the slots of the file's queued ranges; running workers cannot be interrupted
+                future.cancel()
+                for pending_task, pending_future in pending:
+                    if pending_task[0] == file_index:
+                        pending_future.cancel()
+                on_error(file_path, f"Timed out after {file_timeout:.0f}s, skipping pages {start + 1} onwards")
+                continue
+            except Exception as e:
+                failed_files.add(file_index)
+                on_error(file_path, f"Text extraction failed for pages {start + 1}-{end}: {e}")
+                continue
+
+            for offset, page_text in enumerate(pages):
+                yield file_index, file_path, start + offset + 1, page_text
+    finally:
+        # Do not block on workers stuck in a timed out file
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_pdfs(file_paths: List[str], max_workers: int = None, pages_per_task: int = None,
+                 file_timeout: float = None, on_error: Optional[Callable[[str, str], None]] = None
+                 ) -> List[Tuple[str, List[str]]]:
+    """
+    Extracts the pages of several PDF files in parallel and groups them per file.
+
+    Returns:
+    - List[Tuple[str, List[str]]]: (file_path, page_texts) for every file that yielded pages,
+      in the order of `file_paths`.
+    """
+    results = {}
+    for file_index, file_path, _, page_text in iter_pdf_pages(
+            file_paths, max_workers, pages_per_task, file_timeout, on_error):
+        results.setdefault(file_index, (file_path, []))[1].append(page_text)
+    return [results[file_index] for file_index in sorted(results)]
@@ -0,0 +1,82 @@
+import queue
+import threading
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def bounded_stage(iterable: Iterable[T], maxsize: int, name: str = "stage") -> Iterator[T]:
+    """
+    Runs `iterable` in a background thread and hands its items over through a bounded queue.
+    The producer blocks once `maxsize` items are waiting, so chaining stages keeps memory
+    constant while every stage works concurrently. Errors raised by the producer are
+    re-raised in the consumer, and closing the consumer stops the producer.
+
+    Parameters:
+    - iterable (Iterable): The upstream stage.
+    - maxsize (int): Maximum number of items buffered between the two stages.
+    - name (str): Name of the producer thread, for debugging.
+
+    Returns:
+    - Iterator: The items of `iterable`, in order.
+    """
+    buffer = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_StageError(e))
+        finally:
+            # Let generators run their own cleanup (e.g. shutting down a process pool)
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, name=f"pipeline-{name}", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+
+def batched(iterable: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    """
+    Groups the items of `iterable` into lists of at most `batch_size` items.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
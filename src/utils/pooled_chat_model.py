@@ -0,0 +1,47 @@
+from typing import Any, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from src.utils.chunker import count_tokens
+
+
+class PooledChatModel(BaseChatModel):
+    """
+    LangChain chat model whose every request runs through a `GeminiKeyPool` like `call`.
+
+    Each request picks the best key, holds the rate-limiter slot of that key only while the
+    request is in flight, and moves to the next key on auth and rate-limit errors. Agents
+    built on it therefore never hold a slot while their tools run, and the tools' own Gemini
+    calls (e.g. embeddings) do not queue behind the agent.
+    """
+    model: str
+    pool: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "gemini-pool"
+
+    @staticmethod
+    def _prompt_tokens(messages: List[BaseMessage]) -> int:
+        # Counted against the tokens/min limit of the key
+        return sum(count_tokens(str(message.content)) for message in messages)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        def generate_with(key: str) -> ChatResult:
+            return self.pool.key_chat_model(key, self.model)._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        return self.pool.call(generate_with, "LLM request", self._prompt_tokens(messages))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        async def generate_with(key: str) -> ChatResult:
+            return await self.pool.key_chat_model(key, self.model)._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        return await self.pool.acall(generate_with, "LLM request", self._prompt_tokens(messages))
+
+    def bind_tools(self, tools, **kwargs):
+        # The Gemini model formats the tools; they are then passed to every request like `stop`
+        formatted = self.pool.key_chat_model(self.pool.keys[0], self.model).bind_tools(tools, **kwargs)
+        return self.bind(**formatted.kwargs)
@@ -0,0 +1,207 @@
+import os
+import time
+from typing import Optional
+import numpy as np
+from src.utils.local_vector_store import LocalCollection
+
+# Candidates rescored with full vectors per requested result
+DEFAULT_INT8_RESCORE = int(os.getenv("QUANT_INT8_RESCORE", "4"))
+DEFAULT_BINARY_RESCORE = int(os.getenv("QUANT_BINARY_RESCORE", "16"))
+
+# Codes scored per block; small blocks keep the temporary float32 copy of the codes in cache
+_BLOCK_ROWS = 2048
+# Number of set bits of every byte value
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint16)
+
+
+class QuantizedCollection(LocalCollection):
+    """
+    A `LocalCollection` searched through compressed codes held in memory.
+
+    The full float32 vectors stay in the memory-mapped file and are only read to rescore a
+    shortlist: a query scores every code, keeps the best `rescore * k` rows and ranks them
+    exactly. Only the codes need to be resident, so many more collections fit in memory.
+    Codes are rebuilt from the vector file when a collection is opened.
+
+    Subclasses define the code format with `_encode_rows` and `_approximate_scores`.
+    """
+    quantization = ""
+    default_rescore = 1
+
+    def __init__(self, path: str, name: str, embedding_function=None, metadata: dict = None, rescore: int = None):
+        self.rescore = rescore or self.default_rescore
+        self._codes: Optional[np.ndarray] = None
+        super().__init__(path, name, embedding_function, metadata)
+        if self.dimension is not None:
+            started = time.perf_counter()
+            self._ensure_codes()
+            rows = np.flatnonzero(self._alive)
+            for start in range(0, len(rows), _BLOCK_ROWS):
+                block = rows[start:start + _BLOCK_ROWS]
+                self._encode_rows(block, np.asarray(self._vectors[block]))
+            if len(rows):
+                print(f"[QUANT] 🗜️ Encoded {len(rows)} vector(s) of '{name}' as {self.quantization} "
+                      f"in {time.perf_counter() - started:.1f}s")
+
+    # --- Code format ---
+
+    def _new_codes(self, capacity: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def _encode_rows(self, rows: np.ndarray, vectors: np.ndarray):
+        raise NotImplementedError
+
+    def _approximate_scores(self, query: np.ndarray, start: int, end: int) -> np.ndarray:
+        """Approximate similarity of the query to rows [start, end); higher is closer."""
+        raise NotImplementedError
+
+    def _code_bytes(self, count: int) -> int:
+        return count * self._codes.shape[1] * self._codes.itemsize
+
+    # --- Storage hooks ---
+
+    def _ensure_codes(self):
+        capacity = len(self._alive)
+        if self._codes is None or len(self._codes) < capacity:
+            codes = self._new_codes(capacity)
+            if self._codes is not None:
+                codes[:len(self._codes)] = self._codes
+            self._codes = codes
+
+    def _write_vectors(self, rows, vectors: np.ndarray):
+        super()._write_vectors(rows, vectors)
+        self._ensure_codes()
+        self._encode_rows(np.asarray(rows, dtype=np.int64), vectors)
+
+    def _remove_vectors(self, rows):
+        super()._remove_vectors(rows)
+        self._codes[rows] = 0
+
+    # --- Search ---
+
+    def _shortlist(self, query: np.ndarray, mask: np.ndarray, size: int) -> np.ndarray:
+        scores = np.empty(len(mask), dtype=np.float32)
+        for start in range(0, len(mask), _BLOCK_ROWS):
+            end = min(len(mask), start + _BLOCK_ROWS)
+            scores[start:end] = self._approximate_scores(query, start, end)
+        scores[~mask] = -np.inf
+        size = min(size, int(mask.sum()))
+        return np.sort(np.argpartition(-scores, size - 1)[:size])
+
+    def _search(self, query: np.ndarray, candidates: Optional[np.ndarray], k: int):
+        mask = self._alive if candidates is None else candidates
+        k = min(k, int(mask.sum()))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        rows = self._shortlist(query, mask, k * max(1, self.rescore))
+        exact = np.asarray(self._vectors[rows]) @ query
+        top = np.argpartition(-exact, k - 1)[:k]
+        top = top[np.argsort(-exact[top])]
+        return rows[top], exact[top]
+
+    # --- Reporting ---
+
+    def quantization_report(self, queries: int = 100, k: int = 10, seed: int = 0) -> dict:
+        """
+        Measures memory use and recall loss of the collection, using stored vectors as queries.
+
+        Returns:
+        - dict: Resident code bytes versus float32 bytes, the compression ratio, and the
+          recall@k against exact search of the code scores alone and after rescoring.
+        """
+        with self._lock:
+            rows = np.flatnonzero(self._alive)
+            count = len(rows)
+            report = {
+                "collection": self.name,
+                "quantization": self.quantization,
+                "vectors": count,
+                "dimension": self.dimension,
+                "code_bytes": self._code_bytes(count) if count else 0,
+                "float32_bytes": count * (self.dimension or 0) * 4,
+            }
+            report["compression"] = report["float32_bytes"] / report["code_bytes"] if report["code_bytes"] else 0.0
+            if count == 0:
+                return report
+
+            k = min(k, count)
+            rng = np.random.default_rng(seed)
+            first_pass_hits, rescored_hits = 0, 0
+            sample = rng.choice(rows, size=min(queries, count), replace=False)
+            for row in sample:
+                query = np.asarray(self._vectors[row])
+                expected = set(LocalCollection._search(self, query, None, k)[0].tolist())
+                first_pass_hits += len(expected & set(self._shortlist(query, self._alive, k).tolist()))
+                rescored_hits += len(expected & set(self._search(query, None, k)[0].tolist()))
+            report["recall_first_pass"] = first_pass_hits / (k * len(sample))
+            report["recall_rescored"] = rescored_hits / (k * len(sample))
+            report["rescore"] = self.rescore
+            return report
+
+
+class Int8Collection(QuantizedCollection):
+    """
+    Stores every vector as int8 codes with its own scale (max |x| / 127): 4x smaller than
+    float32, and approximate scores are close enough that a short rescore restores ranking.
+    """
+    quantization = "int8"
+    default_rescore = DEFAULT_INT8_RESCORE
+
+    def __init__(self, *args, **kwargs):
+        self._scales = np.zeros(0, dtype=np.float32)
+        super().__init__(*args, **kwargs)
+
+    def _new_codes(self, capacity: int) -> np.ndarray:
+        return np.zeros((capacity, self.dimension), dtype=np.int8)
+
+    def _ensure_codes(self):
+        super()._ensure_codes()
+        if len(self._scales) < len(self._codes):
+            self._scales = np.concatenate([self._scales, np.zeros(len(self._codes) - len(self._scales), dtype=np.float32)])
+
+    def _encode_rows(self, rows: np.ndarray, vectors: np.ndarray):
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        self._codes[rows] = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        self._scales[rows] = scales
+
+    def _remove_vectors(self, rows):
+        super()._remove_vectors(rows)
+        self._scales[rows] = 0
+
+    def _code_bytes(self, count: int) -> int:
+        return super()._code_bytes(count) + count * self._scales.itemsize
+
+    def _approximate_scores(self, query: np.ndarray, start: int, end: int) -> np.ndarray:
+        return (self._codes[start:end].astype(np.float32) @ query) * self._scales[start:end]
+
+
+class BinaryCollection(QuantizedCollection):
+    """
+    Stores the sign of every dimension as one bit: 32x smaller than float32. Candidates are
+    ranked by Hamming distance to the signs of the query, so a longer shortlist is rescored.
+    """
+    quantization = "binary"
+    default_rescore = DEFAULT_BINARY_RESCORE
+
+    def _new_codes(self, capacity: int) -> np.ndarray:
+        # Bits are packed into 64-bit words so Hamming distances take one popcount per word
+        return np.zeros((capacity, (self.dimension + 63) // 64), dtype=np.uint64)
+
+    def _pack(self, vectors: np.ndarray) -> np.ndarray:
+        bits = np.packbits(vectors > 0, axis=-1)
+        padding = self._codes.shape[1] * 8 - bits.shape[-1]
+        if padding:
+            bits = np.pad(bits, [(0, 0)] * (bits.ndim - 1) + [(0, padding)])
+        return np.ascontiguousarray(bits).view(np.uint64)
+
+    def _encode_rows(self, rows: np.ndarray, vectors: np.ndarray):
+        self._codes[rows] = self._pack(vectors)
+
+    def _approximate_scores(self, query: np.ndarray, start: int, end: int) -> np.ndarray:
+        differences = np.bitwise_xor(self._codes[start:end], self._pack(query))
+        if hasattr(np, "bitwise_count"):
+            distances = np.bitwise_count(differences).sum(axis=1)
+        else:
+            # NumPy < 2.0 has no popcount ufunc
+            distances = _POPCOUNT[differences.view(np.uint8)].sum(axis=1)
+        return -distances.astype(np.float32)
@@ -0,0 +1,293 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Seconds a call may wait in the queue for its limiter before it fails
+DEFAULT_QUEUE_TIMEOUT = float(os.getenv("RATE_LIMIT_QUEUE_TIMEOUT", "30"))
+# Retries of a throttled call, with exponential backoff and full jitter
+DEFAULT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "3"))
+DEFAULT_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_BACKOFF_SECONDS", "1"))
+DEFAULT_MAX_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_MAX_BACKOFF_SECONDS", "20"))
+
+
+def _provider_limits(provider: str, requests: str, tokens: str, concurrency: str) -> dict:
+    prefix = provider.upper()
+    return {
+        "requests_per_minute": float(os.getenv(f"{prefix}_REQUESTS_PER_MINUTE", requests)),
+        "tokens_per_minute": float(os.getenv(f"{prefix}_TOKENS_PER_MINUTE", tokens)),
+        "max_concurrency": int(os.getenv(f"{prefix}_MAX_CONCURRENCY", concurrency)),
+    }
+
+
+# Limits of every key of a provider; 0 disables a limit
+PROVIDER_LIMITS = {
+    "gemini": _provider_limits("gemini", "60", "1000000", "8"),
+    "tavily": _provider_limits("tavily", "100", "0", "4"),
+}
+
+# How often a call waiting only for a free concurrency slot re-checks from the event loop
+_ASYNC_POLL_SECONDS = 0.05
+
+
+class RateLimitTimeout(TimeoutError):
+    """Raised when a call could not start before its queue deadline."""
+
+
+def backoff_delay(attempt: int, base: float = None, cap: float = None) -> float:
+    """
+    Returns the delay before retry `attempt` (from 0): exponential, capped, with full jitter so
+    callers throttled together do not retry together.
+    """
+    base = DEFAULT_BACKOFF_SECONDS if base is None else base
+    cap = DEFAULT_MAX_BACKOFF_SECONDS if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_throttling_error(e: Exception) -> bool:
+    message = str(e).lower()
+    return any(keyword in message for keyword in ('429', 'resource_exhausted', 'quota', 'rate limit', 'ratelimit', 'too many requests'))
+
+
+class _Bucket:
+    """Token bucket refilled continuously at `per_minute`, holding at most one minute's worth."""
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def wait(self, amount: float, now: float) -> float:
+        # Seconds until `amount` is available; requests larger than the bucket wait for a full one
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Outbound limiter of one provider key: a requests/min and a tokens/min token bucket plus a
+    bound on concurrent calls.
+
+    `acquire` (or `aacquire` from the event loop) queues a call until both buckets hold enough
+    and a concurrency slot is free, failing with `RateLimitTimeout` at its deadline; `release`
+    frees the slot. `penalize` holds every new call back after the provider throttled us.
+    Queue depth, waits, timeouts and throttling are reported by `stats()`.
+    """
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_concurrency: int = 0):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self._requests = _Bucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._tokens = _Bucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._blocked_until = 0.0
+        self._condition = threading.Condition()
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.throttled = 0
+        self.retries = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _try_take(self, tokens: int) -> Optional[float]:
+        # Takes a slot and returns None, or returns how long to wait (0 when waiting on concurrency)
+        now = time.monotonic()
+        wait = max(0.0, self._blocked_until - now)
+        if self._requests is not None:
+            wait = max(wait, self._requests.wait(1, now))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.wait(tokens, now))
+        if wait > 0:
+            return wait
+        if self.max_concurrency > 0 and self.in_flight >= self.max_concurrency:
+            return 0.0
+        if self._requests is not None:
+            self._requests.take(1)
+        if self._tokens is not None:
+            self._tokens.take(tokens)
+        self.in_flight += 1
+        return None
+
+    def _enqueue(self):
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+
+    def _dequeue(self, started: float, acquired: bool):
+        self.queued -= 1
+        waited = time.monotonic() - started
+        if acquired:
+            self.acquired += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        else:
+            self.timeouts += 1
+
+    def acquire(self, tokens: int = 1, deadline: float = None):
+        """
+        Blocks until the call may start. `deadline` is a `time.monotonic()` value.
+        """
+        deadline = time.monotonic() + DEFAULT_QUEUE_TIMEOUT if deadline is None else deadline
+        started = time.monotonic()
+        with self._condition:
+            self._enqueue()
+            while True:
+                wait = self._try_take(tokens)
+                if wait is None:
+                    self._dequeue(started, True)
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or wait > remaining:
+                    self._dequeue(started, False)
+                    raise RateLimitTimeout(f"Rate limit of '{self.name}' not available before the deadline")
+                # A released slot wakes the waiters; bucket refills are waited out
+                self._condition.wait(wait or remaining)
+
+    async def aacquire(self, tokens: int = 1, deadline: float = None):
+        """
+        Async version of `acquire`, which waits without blocking the event loop.
+        """
+        deadline = time.monotonic() + DEFAULT_QUEUE_TIMEOUT if deadline is None else deadline
+        started = time.monotonic()
+        with self._condition:
+            self._enqueue()
+        while True:
+            with self._condition:
+                wait = self._try_take(tokens)
+                if wait is None:
+                    self._dequeue(started, True)
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or wait > remaining:
+                    self._dequeue(started, False)
+                    raise RateLimitTimeout(f"Rate limit of '{self.name}' not available before the deadline")
+            try:
+                await asyncio.sleep(wait or _ASYNC_POLL_SECONDS)
+            except asyncio.CancelledError:
+                # Leaves the queue without counting a timeout
+                with self._condition:
+                    self.queued -= 1
+                raise
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            # Waiters may be held by different limits, so each re-checks
+            self._condition.notify_all()
+
+    def penalize(self, seconds: float = 0.0):
+        """
+        Records a throttling error and holds new calls back for `seconds`.
+        """
+        with self._condition:
+            self.throttled += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def record_retry(self):
+        with self._condition:
+            self.retries += 1
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "acquired": self.acquired,
+                "timeouts": self.timeouts,
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "avg_wait_ms": 1000 * self.wait_seconds / self.acquired if self.acquired else 0.0,
+                "max_wait_ms": 1000 * self.max_wait_seconds,
+            }
+
+
+class RateLimiterRegistry:
+    """
+    Process-wide limiters, one per provider key, created on first use with the limits of
+    their provider (`PROVIDER_LIMITS`).
+    """
+    def __init__(self):
+        self._limiters: Dict[tuple, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, key: str = "") -> RateLimiter:
+        with self._lock:
+            limiter = self._limiters.get((provider, key))
+            if limiter is None:
+                # Keys are never reported in full
+                name = f"{provider}:...{key[-4:]}" if key else provider
+                limiter = self._limiters[(provider, key)] = RateLimiter(name, **PROVIDER_LIMITS.get(provider, {}))
+            return limiter
+
+    def stats(self) -> dict:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        stats = {}
+        for limiter in limiters:
+            # Masked names of different keys may collide
+            name, n = limiter.name, 1
+            while name in stats:
+                n += 1
+                name = f"{limiter.name}#{n}"
+            stats[name] = limiter.stats()
+        return stats
+
+
+def call_with_limits(limiter: RateLimiter, action: Callable[[], T], tokens: int = 1,
+                     retries: int = None, description: str = "Call") -> T:
+    """
+    Runs `action` through a limiter, retrying throttling errors with backoff and jitter until
+    the retries or the queue deadline run out.
+    """
+    retries = DEFAULT_RETRIES if retries is None else retries
+    deadline = time.monotonic() + DEFAULT_QUEUE_TIMEOUT
+    for attempt in range(retries + 1):
+        limiter.acquire(tokens, deadline)
+        try:
+            return action()
+        except Exception as e:
+            delay = backoff_delay(attempt)
+            if not is_throttling_error(e) or attempt == retries or time.monotonic() + delay > deadline:
+                raise
+            limiter.penalize(delay)
+            limiter.record_retry()
+            print(f"[RATE LIMIT] ⏳ {description} throttled, retrying in {delay:.1f}s")
+        finally:
+            limiter.release()
+
+
+async def acall_with_limits(limiter: RateLimiter, action: Callable[[], Awaitable[T]], tokens: int = 1,
+                            retries: int = None, description: str = "Call") -> T:
+    """
+    Async version of `call_with_limits`, for actions that return a coroutine.
+    """
+    retries = DEFAULT_RETRIES if retries is None else retries
+    deadline = time.monotonic() + DEFAULT_QUEUE_TIMEOUT
+    for attempt in range(retries + 1):
+        await limiter.aacquire(tokens, deadline)
+        try:
+            return await action()
+        except Exception as e:
+            delay = backoff_delay(attempt)
+            if not is_throttling_error(e) or attempt == retries or time.monotonic() + delay > deadline:
+                raise
+            limiter.penalize(delay)
+            limiter.record_retry()
+            print(f"[RATE LIMIT] ⏳ {description} throttled, retrying in {delay:.1f}s")
+        finally:
+            limiter.release()
+
+
+# Shared by every outbound caller in the process
+rate_limiters = RateLimiterRegistry()
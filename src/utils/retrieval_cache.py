@@ -0,0 +1,81 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional
+from src.utils.embedding_cache import normalize_query
+from src.utils.collection_registry import collection_registry
+
+DEFAULT_RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+DEFAULT_RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))
+
+
+class RetrievalCache:
+    """
+    In-memory LRU cache of retrieval results with a time-to-live.
+
+    Entries are keyed by collection, collection version, kind ("passage" or "answer"),
+    normalised query, k and the retriever settings that shape the result. Every ingestion
+    or delete bumps the collection version (see `IngestManifest.bump_version`) and drops the
+    entries of the collection through `collection_registry.on_invalidate`. Callers look the
+    version up with `current_collection_version`, which re-reads it from the store every few
+    seconds, so an ingestion by another worker is seen even though the cache and the
+    collection handles are per process. Hits and misses are counted per kind in `stats()`.
+    """
+    def __init__(self, max_entries: int = None, ttl: float = None):
+        self.max_entries = DEFAULT_RETRIEVAL_CACHE_SIZE if max_entries is None else max_entries
+        self.ttl = DEFAULT_RETRIEVAL_CACHE_TTL if ttl is None else ttl
+        self.hits = {}
+        self.misses = {}
+        self.invalidations = 0
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(kind: str, collection: str, version: int, query: str, k: int, settings: tuple) -> tuple:
+        return (collection, version, kind, normalize_query(query), k, settings)
+
+    def get(self, kind: str, collection: str, version: int, query: str, k: int, settings: tuple = ()) -> Optional[str]:
+        key = self._key(kind, collection, version, query, k, settings)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl <= 0 or time.monotonic() - entry[1] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits[kind] = self.hits.get(kind, 0) + 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses[kind] = self.misses.get(kind, 0) + 1
+            return None
+
+    def put(self, kind: str, collection: str, version: int, query: str, k: int, value: str, settings: tuple = ()):
+        key = self._key(kind, collection, version, query, k, settings)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, collection: str):
+        """
+        Drops every entry of a collection.
+        """
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == collection]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            kinds = {}
+            for kind in sorted(set(self.hits) | set(self.misses)):
+                hits, misses = self.hits.get(kind, 0), self.misses.get(kind, 0)
+                kinds[kind] = {"hits": hits, "misses": misses, "hit_ratio": hits / (hits + misses) if hits + misses else 0.0}
+            return {"entries": len(self._entries), "invalidations": self.invalidations, **kinds}
+
+
+# Process-wide cache; None when RETRIEVAL_CACHE_SIZE is 0
+retrieval_cache = RetrievalCache() if DEFAULT_RETRIEVAL_CACHE_SIZE > 0 else None
+if retrieval_cache is not None:
+    collection_registry.on_invalidate = retrieval_cache.invalidate
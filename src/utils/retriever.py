@@ -1,51 +1,446 @@
-import google.generativeai as genai
 import os
+import asyncio
+from collections import defaultdict
+from typing import List, Union
+import numpy as np
+from src.utils.gemini_embedding import BackendEmbeddingFunction
+from src.utils.data_ingest import current_collection_version, load_lexical_index
+from src.utils.lexical_index import LexicalIndex
+from src.utils.chunker import count_tokens
+from src.utils.retrieval_cache import retrieval_cache
+from src.utils.embedding_cache import normalize_query
+from src.utils.gemini_pool import APIKeysExhausted, gemini_pool
+
+def split_queries(query: Union[str, List[str]]) -> List[str]:
+    """
+    Returns the distinct, non-empty sub-queries of a query or list of queries.
+    """
+    queries = [query] if isinstance(query, str) else list(query)
+    distinct = {}
+    for q in queries:
+        if q and q.strip():
+            distinct.setdefault(normalize_query(q), q.strip())
+    return list(distinct.values()) or [""]
+
 
 class Retriever:
     def __init__(self) -> None:
-        api_keys_str = os.getenv("GOOGLE_GENAI_API_KEYS", "")
-        self.api_keys = [k.strip() for k in api_keys_str.split(",") if k.strip()]
         self.model = "gemini-2.0-flash-lite"
+        # Chunks on each side of a hit added as context (0 returns the hits only)
+        self.neighbors = int(os.getenv("RETRIEVER_NEIGHBORS", "1"))
+        # Embeds queries with the configured backend, which every loaded collection was built with
+        self.embedding_function = BackendEmbeddingFunction()
+        # "dense" (vector search), "lexical" (BM25 only, no embedding or vector search calls)
+        # or "hybrid" (both, fused with reciprocal rank fusion). The BM25 index is a file local
+        # to the host and written by one process at a time, so keyword modes are opt-in
+        self.mode = os.getenv("RETRIEVER_MODE", "dense").lower()
+        if self.mode not in ("dense", "lexical", "hybrid"):
+            raise ValueError(f"Unknown RETRIEVER_MODE '{self.mode}'. Use 'dense', 'lexical' or 'hybrid'")
+        self.rrf_k = int(os.getenv("RETRIEVER_RRF_K", "60"))
+        # Candidates fetched per requested result, for rank fusion and the MMR selection
+        self.candidate_factor = int(os.getenv("RETRIEVER_CANDIDATE_FACTOR", "4"))
+        # Relevance versus diversity of the MMR selection (1 keeps the ranking as is)
+        self.mmr_lambda = float(os.getenv("RETRIEVER_MMR_LAMBDA", "0.7"))
+        # Tokens of the selected chunks, before neighbour expansion (0 for no limit)
+        self.token_budget = int(os.getenv("RETRIEVER_TOKEN_BUDGET", "1000"))
+        # Tokens of the passages returned to the agent, after neighbour expansion (0 for no limit)
+        self.passage_budget = int(os.getenv("RETRIEVER_PASSAGE_BUDGET", "2000"))
+        # Whether run_retriever_node answers with an extra LLM call or returns the passages
+        self.generate = os.getenv("RETRIEVER_GENERATE", "0").lower() in ("1", "true", "on")
+
+    def expand_neighbors(self, db, hits: List[dict], neighbors: int) -> List[str]:
+        """
+        Expands every hit with up to `neighbors` chunks on each side, following the
+        'prev_id'/'next_id' links stored at ingestion. Each hop fetches the neighbours of all
+        hits with one batched `get` by id. Adjacent or overlapping windows of a document are
+        merged into one passage, dropping the text repeated between consecutive chunks.
+
+        Parameters:
+        - db (chromadb.Collection): The collection the hits come from.
+        - hits (List[dict]): The hits in rank order, with 'id', 'document' and 'metadata' keys.
+        - neighbors (int): The number of chunks to add on each side of a hit.
+
+        Returns:
+        - List[str]: The merged passages, ordered by their best-ranked hit.
+        """
+        return [self._merge_window(run) for run in self.neighbor_windows(db, hits, neighbors)]
+
+    def neighbor_windows(self, db, hits: List[dict], neighbors: int) -> List[List[dict]]:
+        """
+        Returns the runs of consecutive chunks that `expand_neighbors` merges into passages.
+        """
+        chunks = {hit['id']: {**hit, 'metadata': hit['metadata'] or {}} for hit in hits}
+        frontier = list(chunks)
+        for _ in range(neighbors):
+            wanted = []
+            for chunk_id in frontier:
+                metadata = chunks[chunk_id]['metadata']
+                for key in ('prev_id', 'next_id'):
+                    linked = metadata.get(key)
+                    if linked and linked not in chunks and linked not in wanted:
+                        wanted.append(linked)
+            if not wanted:
+                break
+            result = db.get(ids=wanted, include=["documents", "metadatas"])
+            frontier = []
+            for chunk_id, document, metadata in zip(result['ids'], result['documents'], result['metadatas']):
+                chunks[chunk_id] = {'id': chunk_id, 'document': document, 'metadata': metadata or {}}
+                frontier.append(chunk_id)
+
+        # Group the chunks of each document into runs of consecutive chunk indexes
+        by_doc = defaultdict(list)
+        for chunk in chunks.values():
+            by_doc[chunk['metadata'].get('doc_id', chunk['metadata'].get('filename'))].append(chunk)
+        rank = {hit['id']: position for position, hit in enumerate(hits)}
+        windows = []
+        for doc_chunks in by_doc.values():
+            doc_chunks.sort(key=lambda chunk: chunk['metadata'].get('chunk_index', 0))
+            run = [doc_chunks[0]]
+            for chunk in doc_chunks[1:]:
+                if chunk['metadata'].get('chunk_index') == run[-1]['metadata'].get('chunk_index', -2) + 1:
+                    run.append(chunk)
+                else:
+                    windows.append(run)
+                    run = [chunk]
+            windows.append(run)
+
+        windows.sort(key=lambda run: min(rank.get(chunk['id'], len(rank)) for chunk in run))
+        return windows
+
+    @staticmethod
+    def _merge_window(run: List[dict]) -> str:
+        text = run[0]['document']
+        for chunk in run[1:]:
+            # The first 'overlap_chars' characters of a chunk repeat the end of the previous one
+            overlap = chunk['metadata'].get('overlap_chars', 0)
+            remainder = chunk['document'][overlap:]
+            if remainder:
+                text = f"{text} {remainder}"
+        return text
+
+    def _passage(self, run: List[dict]) -> dict:
+        metadata = [chunk['metadata'] or {} for chunk in run]
+        text = self._merge_window(run)
+        passage = {
+            'text': text,
+            'source': metadata[0].get('filename') or metadata[0].get('doc_id') or "unknown",
+            'tokens': count_tokens(text),
+        }
+        pages = [page for meta in metadata for page in (meta.get('page_start'), meta.get('page_end')) if page is not None]
+        if pages:
+            passage['pages'] = (min(pages), max(pages))
+        return passage
+
+    def dense_rankings(self, query_embeddings: List[List[float]], db, n_results: int) -> List[List[dict]]:
+        """
+        Ranks chunks by vector similarity to each query embedding, with a single `query` for
+        all of them. Hits carry their stored embedding for the MMR selection.
+        """
+        result = db.query(query_embeddings=query_embeddings, n_results=n_results,
+                          include=["documents", "metadatas", "embeddings"])
+        rankings = []
+        for i in range(len(query_embeddings)):
+            documents = result['documents'][i] if i < len(result.get('documents') or []) else []
+            rankings.append([
+                {'id': chunk_id, 'document': document, 'metadata': metadata, 'embedding': embedding}
+                for chunk_id, document, metadata, embedding
+                in zip(result['ids'][i], documents, result['metadatas'][i], result['embeddings'][i])
+            ])
+        return rankings
+
+    @staticmethod
+    def lexical_hits(query: str, index: LexicalIndex, n_results: int) -> List[dict]:
+        """
+        Ranks chunks by BM25 score, reading them from the lexical index only.
+        """
+        ranked = index.search(query, n_results)
+        result = index.get([chunk_id for chunk_id, _ in ranked])
+        return [{'id': chunk_id, 'document': document, 'metadata': metadata}
+                for chunk_id, document, metadata in zip(result['ids'], result['documents'], result['metadatas'])]
+
+    def fuse(self, rankings: List[List[dict]], n_results: int) -> List[dict]:
+        """
+        Merges rankings with reciprocal rank fusion: every hit scores 1 / (rrf_k + rank) in
+        each ranking it appears in, so agreement between rankings outweighs raw scores that
+        are not comparable across them.
+        """
+        scores, hits = defaultdict(float), {}
+        for ranking in rankings:
+            for rank, hit in enumerate(ranking, start=1):
+                scores[hit['id']] += 1.0 / (self.rrf_k + rank)
+                hits.setdefault(hit['id'], hit)
+        best = sorted(scores, key=scores.get, reverse=True)[:n_results]
+        return [hits[chunk_id] for chunk_id in best]
+
+    @staticmethod
+    def _hit_tokens(hit: dict) -> int:
+        return (hit['metadata'] or {}).get('n_tokens') or count_tokens(hit['document'] or "")
+
+    def _attach_embeddings(self, db, hits: List[dict]) -> bool:
+        """
+        Fetches the stored embeddings of hits that came from keyword search, with one `get`.
+        Returns False when they could not be fetched.
+        """
+        missing = [hit['id'] for hit in hits if hit.get('embedding') is None]
+        if not missing:
+            return True
+        try:
+            result = db.get(ids=missing, include=["embeddings"])
+        except Exception as e:
+            print(f"[Retriever] ⚠️ Could not fetch embeddings for MMR: {str(e)}")
+            return False
+        embeddings = dict(zip(result['ids'], result['embeddings']))
+        for hit in hits:
+            if hit.get('embedding') is None:
+                hit['embedding'] = embeddings.get(hit['id'])
+        return all(hit['embedding'] is not None for hit in hits)
+
+    def select_hits(self, hits: List[dict], query_embeddings, db, n_results: int) -> List[dict]:
+        """
+        Picks up to `n_results` of the candidate hits whose chunks fit in `token_budget` tokens.
+
+        With query embeddings, hits are chosen by maximal marginal relevance: each pick
+        maximises `mmr_lambda * sim(query, hit) - (1 - mmr_lambda) * max sim(hit, picked)`, so
+        near-duplicate and overlapping chunks give way to chunks adding new information. With
+        several queries, a hit's relevance is its similarity to the closest one. Similarities
+        are computed with one matrix product over the candidates. Without embeddings (keyword
+        search), hits are taken in rank order. The best hit is always kept.
+
+        Parameters:
+        - hits (List[dict]): The candidates in rank order.
+        - query_embeddings (List[List[float]]): The embeddings of the queries, or None.
+        - db (chromadb.Collection): The collection to fetch missing candidate embeddings from.
+        - n_results (int): The maximum number of hits to keep.
+
+        Returns:
+        - List[dict]: The selected hits, in selection order.
+        """
+        costs = np.array([self._hit_tokens(hit) for hit in hits], dtype=np.int64)
+        budget = self.token_budget if self.token_budget > 0 else int(costs.sum())
+
+        if query_embeddings is None or self.mmr_lambda >= 1 or not self._attach_embeddings(db, hits):
+            selected, used = [], 0
+            for hit, cost in zip(hits, costs):
+                if len(selected) == n_results:
+                    break
+                if selected and used + cost > budget:
+                    continue
+                selected.append(hit)
+                used += cost
+            return selected
+
+        vectors = np.asarray([hit['embedding'] for hit in hits], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        relevance = (vectors @ queries.T).max(axis=1)
+        similarity = vectors @ vectors.T
+
+        available = np.ones(len(hits), dtype=bool)
+        redundancy = np.zeros(len(hits), dtype=np.float32)
+        selected, used = [], 0
+        while len(selected) < n_results:
+            if selected:
+                available &= costs <= budget - used
+            scores = np.where(available, self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy, -np.inf)
+            best = int(np.argmax(scores))
+            if not np.isfinite(scores[best]):
+                break
+            selected.append(best)
+            used += costs[best]
+            available[best] = False
+            redundancy = np.maximum(redundancy, similarity[best]) if len(selected) > 1 else similarity[best]
+        return [hits[i] for i in selected]
+
+    def _cache_settings(self, neighbors: int) -> tuple:
+        # Settings that change the retrieved passage for the same query
+        return (self.mode, neighbors, self.candidate_factor, self.mmr_lambda, self.token_budget, self.rrf_k)
+
+    def retrieve_passages(self, query: Union[str, List[str]], db, n_results: int, neighbors: int = None) -> List[dict]:
+        """
+        Retrieves the passages relevant to a query: candidates are ranked, selected with MMR
+        and expanded with their neighbouring chunks.
+
+        A list of sub-queries, e.g. the parts of a compound question, is served in one round
+        trip: the queries are embedded in one batch and searched with one `query`, and their
+        rankings are merged by chunk id with reciprocal rank fusion.
 
-    def get_relevant_passage(self, query, db, n_results):
+        Returns:
+        - List[dict]: Passages in rank order, with 'text', 'source', 'tokens' and, when known, 'pages' keys.
+        """
+        neighbors = self.neighbors if neighbors is None else neighbors
+        # The version reloads an index written by another worker since it was opened
+        lexical = load_lexical_index(db.name, current_collection_version(db)) if self.mode in ("hybrid", "lexical") else None
+        if lexical is not None and not lexical.count():
+            # Not indexed yet, see IngestData.rebuild_lexical_index
+            lexical = None
+
+        # Over-fetch candidates for fusion and the MMR selection
+        depth = n_results * self.candidate_factor
+        # Collection neighbours are fetched from; the lexical index serves them without network calls
+        queries = split_queries(query)
+        source, query_embeddings = db, None
+        if lexical is not None and self.mode == "lexical":
+            rankings, source = [self.lexical_hits(q, lexical, depth) for q in queries], lexical
+        else:
+            try:
+                query_embeddings = self.embedding_function.embed_queries(queries)
+                rankings = self.dense_rankings(query_embeddings, db, depth)
+            except Exception as e:
+                if lexical is None:
+                    raise
+                print(f"[Retriever] ⚠️ Vector search failed, falling back to keyword search: {str(e)}")
+                rankings, source, query_embeddings = [self.lexical_hits(q, lexical, depth) for q in queries], lexical, None
+            else:
+                if lexical is not None:
+                    rankings += [self.lexical_hits(q, lexical, depth) for q in queries]
+        hits = rankings[0] if len(rankings) == 1 else self.fuse(rankings, depth * len(queries))
+        hits = self.select_hits(hits, query_embeddings, db, n_results)
+        if not hits:
+            return []
+
+        if neighbors > 0:
+            runs = self.neighbor_windows(source, hits, neighbors)
+        else:
+            runs = [[{**hit, 'metadata': hit['metadata'] or {}}] for hit in hits]
+        return [self._passage(run) for run in runs]
+
+    def get_relevant_passage(self, query, db, n_results, neighbors: int = None):
         # Retrieve relevant passages from the DB
         try:
-            result = db.query(query_texts=[query], n_results=n_results)
-            
-            documents = result.get('documents', [])
-            
-            if not documents or not documents[0]:
+            neighbors = self.neighbors if neighbors is None else neighbors
+            settings = self._cache_settings(neighbors)
+            version = current_collection_version(db) if retrieval_cache is not None else 0
+            if retrieval_cache is not None:
+                cached = retrieval_cache.get("passage", db.name, version, query, n_results, settings)
+                if cached is not None:
+                    return cached
+
+            passages = self.retrieve_passages(query, db, n_results, neighbors)
+            if not passages:
                 return ""
-                
-            passage = documents[0]
-            
-            # Ensure passage is a string
-            if isinstance(passage, list):
-                passage = '\n'.join(str(p) for p in passage)
-            
+            passage = '\n'.join(passage['text'] for passage in passages)
+
+            if retrieval_cache is not None and passage:
+                retrieval_cache.put("passage", db.name, version, query, n_results, passage, settings)
             return passage
             
         except Exception as e:
             raise
 
-    def generate_answer(self, context):
-        if not self.api_keys:
-            raise ValueError("Gemini API Key not provided. Please provide GEMINI_API_KEY as an environment variable")
-
-        for key in self.api_keys:
-            try:
-                genai.configure(api_key=key)
-                model = genai.GenerativeModel(self.model)
-                response = model.generate_content(context)
-                return response.text.strip()
-            except Exception as e:
-                if any(keyword in str(e).lower() for keyword in ['permission_denied', 'invalid api key', 'authentication']):
+    def format_passages(self, passages: List[dict]) -> str:
+        """
+        Formats passages for the agent: numbered and tagged with their source and pages,
+        without duplicates, and packed in rank order into `passage_budget` tokens. Passages
+        that do not fit are skipped; the best one is truncated if it alone exceeds the budget.
+        """
+        kept, seen, used = [], [], 0
+        for passage in passages:
+            normalized = normalize_query(passage['text'])
+            # Identical text, or text already contained in a kept passage, e.g. a copied document
+            if not normalized or any(normalized in other for other in seen):
+                continue
+            text, tokens = passage['text'], passage['tokens']
+            if self.passage_budget > 0 and used + tokens > self.passage_budget:
+                if kept:
                     continue
-                else:
-                    raise e
-        return "[Retriever] ERROR: All API keys failed."
+                text, tokens = " ".join(text.split()[:self.passage_budget]), self.passage_budget
+            seen.append(normalized)
+            used += tokens
+            tag = passage['source']
+            if passage.get('pages'):
+                first, last = passage['pages']
+                tag += f", p. {first}" if first == last else f", p. {first}-{last}"
+            kept.append(f"[{len(kept) + 1}] ({tag})\n{text}")
+        return "\n\n".join(kept)
+
+    @staticmethod
+    def _answer_prompt(context, query: str = None) -> str:
+        if not query:
+            return context
+        return (
+            "Answer the question using only the numbered passages below, citing them as [n]. "
+            "If they do not contain the answer, say so.\n\n"
+            f"Question: {query}\n\nPassages:\n{context}"
+        )
+
+    def generate_answer(self, context, query: str = None):
+        prompt = self._answer_prompt(context, query)
+        def generate_with(key: str) -> str:
+            response = gemini_pool.client(key).models.generate_content(model=self.model, contents=prompt)
+            return response.text.strip()
+
+        try:
+            return gemini_pool.call(generate_with, "Answer generation", count_tokens(prompt))
+        except APIKeysExhausted:
+            return "[Retriever] ERROR: All API keys failed."
+
+    async def agenerate_answer(self, context, query: str = None):
+        prompt = self._answer_prompt(context, query)
+        async def generate_with(key: str) -> str:
+            response = await gemini_pool.client(key).aio.models.generate_content(model=self.model, contents=prompt)
+            return response.text.strip()
+
+        try:
+            return await gemini_pool.acall(generate_with, "Answer generation", count_tokens(prompt))
+        except APIKeysExhausted:
+            return "[Retriever] ERROR: All API keys failed."
+
+    def _node_request(self, query, db, n_results: int, generate: bool) -> tuple:
+        queries = split_queries(query)
+        # Cache key and question covering every sub-query
+        question = " | ".join(queries)
+        kind = "answer" if generate else "passages"
+        settings = self._cache_settings(self.neighbors) + (self.passage_budget,) + ((self.model,) if generate else ())
+        cached, version = None, 0
+        if retrieval_cache is not None:
+            version = current_collection_version(db)
+            cached = retrieval_cache.get(kind, db.name, version, question, n_results, settings)
+        return queries, question, kind, settings, version, cached
+
+    @staticmethod
+    def _cache_response(db, kind: str, version: int, question: str, n_results: int, response: str, settings: tuple):
+        if retrieval_cache is not None and not response.startswith("[Retriever] ERROR"):
+            retrieval_cache.put(kind, db.name, version, question, n_results, response, settings)
+
+    def run_retriever_node(self, query, db, n_results=5, generate: bool = None):
+        """
+        Retrieves the passages relevant to a query, or to a list of sub-queries, and returns
+        them source-tagged, or, with `generate` (RETRIEVER_GENERATE by default), an answer
+        generated from them. Returning passages saves an LLM round trip when the caller is an
+        agent that reasons over them.
+        """
+        generate = self.generate if generate is None else generate
+        queries, question, kind, settings, version, cached = self._node_request(query, db, n_results, generate)
+        if cached is not None:
+            return cached
+        context = self.format_passages(self.retrieve_passages(queries, db, n_results))
+        if not context:
+            return "No relevant passages found in the uploaded documents."
+        response = self.generate_answer(context, question) if generate else context
+        self._cache_response(db, kind, version, question, n_results, response, settings)
+        return response
+
+    async def arun_retriever_node(self, query, db, n_results=5, generate: bool = None):
+        """
+        Async version of `run_retriever_node`. The search runs in a worker thread, since the
+        vector store and index clients are synchronous, and the answer is generated with the
+        async Gemini client.
+        """
+        generate = self.generate if generate is None else generate
+
+        def lookup_and_search() -> tuple:
+            # Refreshing the collection version may read the store, so it runs here too
+            request = self._node_request(query, db, n_results, generate)
+            if request[-1] is not None:
+                return request, None
+            return request, self.format_passages(self.retrieve_passages(request[0], db, n_results))
 
-    def run_retriever_node(self, query, db, n_results=5):
-        context = self.get_relevant_passage(query, db, n_results)
-        response = self.generate_answer(context)
+        (queries, question, kind, settings, version, cached), context = await asyncio.to_thread(lookup_and_search)
+        if cached is not None:
+            return cached
+        if not context:
+            return "No relevant passages found in the uploaded documents."
+        response = await self.agenerate_answer(context, question) if generate else context
+        self._cache_response(db, kind, version, question, n_results, response, settings)
         return response
@@ -1,7 +1,7 @@
 import streamlit as st
 import os
 from src.helpers.summarizer import serialize_messages
-from src.helpers.graph_operations import start_new_chat, continue_chat, finish_chat
+from src.helpers.graph_operations import stream_new_chat, stream_continue_chat, finish_chat
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -155,13 +155,41 @@ if 'is_processing' not in st.session_state:
 if 'query_counter' not in st.session_state:
     st.session_state['query_counter'] = 0
 
+# --- Streamed answers ---
+def render_stream(events, container):
+    """
+    Renders a streamed graph run in `container`: the last finished step, then the answer as
+    its tokens arrive. Returns the data of the final "done" event (thread_id and state).
+    """
+    with container.container():
+        step_placeholder = st.empty()
+        answer_placeholder = st.empty()
+    step_placeholder.caption("🧠 Thinking...")
+    answer, done = "", None
+    for event, data in events:
+        if event == "node":
+            step_placeholder.caption(f"⏳ Finished step: {data['node']}")
+        elif event == "token":
+            answer += data["text"]
+            answer_placeholder.markdown(
+                f"""
+                <div class="chat-message bot-message">
+                    <strong>🤖 Assistant:</strong><br><br>
+                    {answer}▌
+                </div>
+                """, unsafe_allow_html=True)
+        elif event == "done":
+            done = data
+    step_placeholder.empty()
+    return done
+
 # --- Reset chat button ---
-def start_new_chat_wrapper(initial_query, messages, file_paths):
+def start_new_chat_wrapper(initial_query, messages, file_paths, container):
     # Serialize messages to ensure they are JSON serializable
     serialized_messages = serialize_messages(messages)
     
     try:
-        data = start_new_chat(initial_query, serialized_messages, file_paths)
+        data = render_stream(stream_new_chat(initial_query, serialized_messages, file_paths), container)
         st.session_state['thread_id'] = data['thread_id']
         state = data['state']
         # Messages from API are already in the correct format, no need to serialize again
@@ -317,32 +345,31 @@ elif submit_clicked:
     query_to_use = query.strip()
     if query_to_use:
         if st.session_state.get('thread_id') is None:
-            with st.spinner("🧠 Thinking..."):
-                start_new_chat_wrapper(query_to_use, st.session_state['messages'], file_paths)
+            start_new_chat_wrapper(query_to_use, st.session_state['messages'], file_paths, spinner_placeholder)
         else:
             st.session_state['is_processing'] = True
-            with st.spinner("🧠 Thinking..."):
-                try:
-                    serialized_messages = serialize_messages(st.session_state['messages'])
-                    data = continue_chat(
-                        st.session_state['thread_id'],
-                        query_to_use,
-                        serialized_messages,
-                        file_paths,
-                        st.session_state['data_ingested'],
-                        st.session_state['status']
-                    )
-                    state = data['state']
-                    st.session_state['messages'] = state.get('messages', [])
-                    st.session_state['latest_result'] = state.get('answer', None)
-                    st.session_state['data_ingested'] = state.get("data_ingested", False)
-                    st.session_state['file_paths'] = file_paths
-                    st.session_state['status'] = state.get('status', st.session_state['status'])
-                    st.session_state['is_processing'] = False
-                    st.session_state['query_counter'] += 1
-                    st.rerun()
-                except Exception as e:
-                    st.session_state['data_ingested'] = False
-                    st.session_state['status'] = 'Error'
-                    st.session_state['is_processing'] = False
-                    st.error(f"Error: {str(e)}")
\ No newline at end of file
+            try:
+                serialized_messages = serialize_messages(st.session_state['messages'])
+                # Tokens of the answer are rendered above the query box as they arrive
+                data = render_stream(stream_continue_chat(
+                    st.session_state['thread_id'],
+                    query_to_use,
+                    serialized_messages,
+                    file_paths,
+                    st.session_state['data_ingested'],
+                    st.session_state['status']
+                ), spinner_placeholder)
+                state = data['state']
+                st.session_state['messages'] = state.get('messages', [])
+                st.session_state['latest_result'] = state.get('answer', None)
+                st.session_state['data_ingested'] = state.get("data_ingested", False)
+                st.session_state['file_paths'] = file_paths
+                st.session_state['status'] = state.get('status', st.session_state['status'])
+                st.session_state['is_processing'] = False
+                st.session_state['query_counter'] += 1
+                st.rerun()
+            except Exception as e:
+                st.session_state['data_ingested'] = False
+                st.session_state['status'] = 'Error'
+                st.session_state['is_processing'] = False
+                st.error(f"Error: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,67 @@
+from src.utils.chunker import Chunker, count_tokens
+
+TEXT = "One two three. Four five six seven. Eight nine. Ten eleven twelve thirteen."
+
+
+def test_count_tokens_counts_words():
+    assert count_tokens("  one two\nthree\t") == 3
+    assert count_tokens("") == 0
+
+
+def test_short_text_is_one_chunk_with_normalised_whitespace():
+    chunks = Chunker(max_tokens=50, overlap_tokens=0).chunk_text("First  sentence.\nSecond one.")
+
+    assert len(chunks) == 1
+    assert chunks[0]['text'] == "First sentence. Second one."
+    assert chunks[0]['n_tokens'] == 4
+    assert chunks[0]['overlap_chars'] == 0
+
+
+def test_empty_text_has_no_chunks():
+    assert Chunker(max_tokens=5).chunk_text("   ") == []
+
+
+def test_chunks_respect_the_budget_and_offsets_point_into_the_text():
+    chunks = Chunker(max_tokens=6, overlap_tokens=3).chunk_text(TEXT)
+
+    assert [chunk['text'] for chunk in chunks] == [
+        "One two three.",
+        "Four five six seven. Eight nine.",
+        "Eight nine. Ten eleven twelve thirteen.",
+    ]
+    for chunk in chunks:
+        assert chunk['n_tokens'] <= 6
+        assert TEXT[chunk['start']:chunk['end']] == chunk['text']
+
+
+def test_overlap_repeats_the_tail_of_the_previous_chunk():
+    chunks = Chunker(max_tokens=6, overlap_tokens=3).chunk_text(TEXT)
+
+    previous, chunk = chunks[1], chunks[2]
+    repeated = chunk['text'][:chunk['overlap_chars']]
+    assert repeated == "Eight nine. "
+    assert previous['text'].endswith(repeated.strip())
+
+
+def test_no_words_are_dropped():
+    chunks = Chunker(max_tokens=4, overlap_tokens=0).chunk_text(TEXT)
+
+    assert " ".join(chunk['text'] for chunk in chunks).split() == TEXT.split()
+
+
+def test_long_sentences_are_cut_at_token_boundaries():
+    chunks = Chunker(max_tokens=3, overlap_tokens=0).chunk_text("a b c d e f g h.")
+
+    assert [chunk['text'] for chunk in chunks] == ["a b c", "d e f", "g h."]
+
+
+def test_unterminated_sentences_continue_on_the_next_page():
+    chunks = list(Chunker(max_tokens=50).chunk_pages([(1, "Alpha beta"), (2, " gamma delta. Next one.")]))
+
+    assert len(chunks) == 1
+    assert chunks[0]['text'] == "Alpha beta gamma delta. Next one."
+    assert (chunks[0]['page_start'], chunks[0]['page_end']) == (1, 2)
+
+
+def test_overlap_is_capped_at_half_the_budget():
+    assert Chunker(max_tokens=10, overlap_tokens=8).overlap_tokens == 5
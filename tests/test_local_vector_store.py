@@ -0,0 +1,55 @@
+import pytest
+from src.utils.local_vector_store import LocalVectorClient, match_where
+
+METADATA = {"doc_id": "a", "page": 3, "lang": "en"}
+
+
+def test_empty_filter_matches_everything():
+    assert match_where(METADATA, None)
+    assert match_where(None, {})
+
+
+def test_plain_values_are_equality_checks():
+    assert match_where(METADATA, {"doc_id": "a", "page": 3})
+    assert not match_where(METADATA, {"doc_id": "b"})
+    assert not match_where(None, {"doc_id": "a"})
+
+
+@pytest.mark.parametrize("condition, expected", [
+    ({"$eq": 3}, True),
+    ({"$ne": 3}, False),
+    ({"$in": [1, 3]}, True),
+    ({"$nin": [1, 3]}, False),
+    ({"$gt": 2}, True),
+    ({"$gte": 3}, True),
+    ({"$lt": 3}, False),
+    ({"$lte": 2}, False),
+    ({"$gt": 1, "$lt": 5}, True),
+    ({"$gt": 1, "$lt": 3}, False),
+])
+def test_operators(condition, expected):
+    assert match_where(METADATA, {"page": condition}) is expected
+
+
+def test_comparisons_on_missing_keys_do_not_match():
+    assert not match_where(METADATA, {"year": {"$gt": 2000}})
+    assert match_where(METADATA, {"year": {"$ne": 2000}})
+    assert match_where(METADATA, {"year": {"$nin": [2000]}})
+
+
+def test_and_or():
+    assert match_where(METADATA, {"$and": [{"doc_id": "a"}, {"page": {"$gte": 3}}]})
+    assert not match_where(METADATA, {"$and": [{"doc_id": "a"}, {"page": {"$gt": 3}}]})
+    assert match_where(METADATA, {"$or": [{"doc_id": "b"}, {"lang": "en"}]})
+    assert not match_where(METADATA, {"$or": [{"doc_id": "b"}, {"lang": "fr"}]})
+
+
+def test_unknown_operator_is_rejected():
+    with pytest.raises(ValueError):
+        match_where(METADATA, {"page": {"$regex": "3"}})
+
+
+@pytest.mark.parametrize("name", ["", ".", "..", "../other", "a/b"])
+def test_collection_names_stay_under_the_store(tmp_path, name):
+    with pytest.raises(ValueError):
+        LocalVectorClient(str(tmp_path)).get_or_create_collection(name)
@@ -0,0 +1,77 @@
+import pytest
+from src.utils.local_vector_store import LocalVectorClient
+from src.utils.manifest import IngestManifest, chunk_id, collection_version, hash_text
+
+
+@pytest.fixture
+def collection(tmp_path):
+    db = LocalVectorClient(str(tmp_path)).create_collection("kb", metadata={"manifest": "v1", "owner": "tests"})
+    chunks = {"a1": "a", "a2": "a", "b1": "b"}
+    db.upsert(
+        ids=list(chunks),
+        documents=list(chunks),
+        embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]],
+        metadatas=[{"doc_id": doc_id} for doc_id in chunks.values()],
+    )
+    return db
+
+
+def test_chunk_ids_are_stable_and_distinguish_repeats():
+    chunk_hash = hash_text("same text")
+
+    assert chunk_id("doc", chunk_hash) == chunk_id("doc", chunk_hash)
+    assert chunk_id("doc", chunk_hash, 1) != chunk_id("doc", chunk_hash)
+    assert chunk_id("other", chunk_hash) != chunk_id("doc", chunk_hash)
+
+
+def test_chunk_ids_are_listed_per_document(collection):
+    manifest = IngestManifest(collection)
+
+    assert manifest.chunk_ids(["a", "b", "c"]) == {"a": {"a1", "a2"}, "b": {"b1"}, "c": set()}
+    assert manifest.chunk_ids(["b"]) == {"b": {"b1"}}
+    assert manifest.chunk_ids([]) == {}
+
+
+def test_unchanged_documents_are_recognised_after_saving(collection):
+    manifest = IngestManifest(collection)
+    assert not manifest.is_unchanged("a", "hash-1")
+
+    manifest.mark("a", "hash-1")
+    manifest.mark("b", "hash-2")
+    manifest.save()
+
+    reloaded = IngestManifest(collection)
+    assert reloaded.is_unchanged("a", "hash-1")
+    assert not reloaded.is_unchanged("a", "hash-changed")
+    assert reloaded.file_hashes == {"a": "hash-1", "b": "hash-2"}
+
+
+def test_removed_documents_leave_the_manifest(collection):
+    manifest = IngestManifest(collection)
+    manifest.mark("a", "hash-1")
+    manifest.mark("b", "hash-2")
+    manifest.save()
+
+    manifest = IngestManifest(collection)
+    manifest.remove("a")
+    manifest.save()
+
+    assert IngestManifest(collection).file_hashes == {"b": "hash-2"}
+
+
+def test_save_bumps_the_version_and_keeps_unrelated_keys(collection):
+    manifest = IngestManifest(collection)
+    manifest.mark("a", "hash-1")
+    manifest.bump_version()
+    manifest.save()
+
+    assert collection_version(collection) == 1
+    assert collection.metadata["owner"] == "tests"
+    assert collection.metadata["last_used"] > 0
+
+
+def test_save_without_changes_does_not_write(collection):
+    IngestManifest(collection).save()
+
+    assert collection_version(collection) == 0
+    assert "last_used" not in collection.metadata
@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+import pytest
+from src.utils.rate_limiter import RateLimiter, RateLimitTimeout, _Bucket, backoff_delay, is_throttling_error
+
+
+def test_bucket_starts_full_and_refills_over_time():
+    bucket = _Bucket(60)
+    start = bucket.updated
+
+    assert bucket.wait(60, start) == 0.0
+    bucket.take(60)
+    assert bucket.wait(1, start) == pytest.approx(1.0)
+    assert bucket.wait(1, start + 1.0) == 0.0
+
+
+def test_bucket_never_holds_more_than_a_minute():
+    bucket = _Bucket(60)
+    start = bucket.updated
+    bucket.take(30)
+
+    bucket.wait(1, start + 3600)
+    assert bucket.level == 60
+
+
+def test_bucket_requests_larger_than_capacity_wait_for_a_full_bucket():
+    bucket = _Bucket(60)
+    start = bucket.updated
+
+    assert bucket.wait(500, start) == 0.0
+    bucket.take(500)
+    assert bucket.level == 0
+    assert bucket.wait(500, start) == pytest.approx(60.0)
+
+
+def test_concurrency_limit_times_out_and_frees_the_queue():
+    limiter = RateLimiter("test", max_concurrency=1)
+    limiter.acquire()
+
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(deadline=time.monotonic() + 0.05)
+    stats = limiter.stats()
+    assert (stats["in_flight"], stats["queued"], stats["timeouts"]) == (1, 0, 1)
+
+    limiter.release()
+    limiter.acquire(deadline=time.monotonic() + 0.05)
+    assert limiter.stats()["acquired"] == 2
+
+
+def test_release_wakes_a_waiting_thread():
+    limiter = RateLimiter("test", max_concurrency=1)
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def wait_for_slot():
+        limiter.acquire(deadline=time.monotonic() + 5)
+        acquired.set()
+
+    waiter = threading.Thread(target=wait_for_slot)
+    waiter.start()
+    assert not acquired.wait(0.1)
+    limiter.release()
+    assert acquired.wait(2)
+    waiter.join()
+    assert limiter.stats()["in_flight"] == 1
+
+
+def test_concurrent_callers_never_exceed_the_limit():
+    limiter = RateLimiter("test", max_concurrency=2)
+    peak, lock = [0], threading.Lock()
+
+    def call():
+        limiter.acquire(deadline=time.monotonic() + 5)
+        try:
+            with lock:
+                peak[0] = max(peak[0], limiter.in_flight)
+            time.sleep(0.01)
+        finally:
+            limiter.release()
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = limiter.stats()
+    assert peak[0] <= 2
+    assert (stats["acquired"], stats["in_flight"], stats["queued"]) == (8, 0, 0)
+
+
+def test_calls_that_cannot_refill_before_the_deadline_fail_without_waiting():
+    limiter = RateLimiter("test", requests_per_minute=1)
+    limiter.acquire()
+    limiter.release()
+
+    started = time.monotonic()
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(deadline=started + 1)
+    assert time.monotonic() - started < 0.5
+
+
+def test_tokens_are_limited_per_call():
+    limiter = RateLimiter("test", tokens_per_minute=100)
+    limiter.acquire(tokens=80)
+    limiter.release()
+
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(tokens=50, deadline=time.monotonic() + 0.1)
+    limiter.acquire(tokens=20, deadline=time.monotonic() + 0.1)
+
+
+def test_penalize_holds_new_calls_back():
+    limiter = RateLimiter("test")
+    limiter.penalize(60)
+
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(deadline=time.monotonic() + 0.1)
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_async_acquire_waits_for_a_slot():
+    limiter = RateLimiter("test", max_concurrency=1)
+
+    async def scenario():
+        await limiter.aacquire()
+        waiter = asyncio.create_task(limiter.aacquire(deadline=time.monotonic() + 5))
+        await asyncio.sleep(0.1)
+        assert not waiter.done()
+        limiter.release()
+        await asyncio.wait_for(waiter, 2)
+
+    asyncio.run(scenario())
+    assert limiter.stats()["in_flight"] == 1
+
+
+def test_cancelled_async_acquire_leaves_the_queue():
+    limiter = RateLimiter("test", max_concurrency=1)
+    limiter.acquire()
+
+    async def scenario():
+        waiter = asyncio.create_task(limiter.aacquire(deadline=time.monotonic() + 5))
+        await asyncio.sleep(0.1)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(scenario())
+    stats = limiter.stats()
+    assert (stats["queued"], stats["timeouts"], stats["in_flight"]) == (0, 0, 1)
+
+
+def test_backoff_is_capped_and_jittered():
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt, base=1, cap=5) <= 5
+
+
+def test_throttling_errors_are_recognised():
+    assert is_throttling_error(Exception("429 RESOURCE_EXHAUSTED"))
+    assert not is_throttling_error(Exception("400 invalid argument"))
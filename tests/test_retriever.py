@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+from src.utils.retriever import Retriever
+
+
+def make_hit(chunk_id, tokens=10, embedding=None):
+    return {'id': chunk_id, 'document': "word " * tokens, 'metadata': {'n_tokens': tokens}, 'embedding': embedding}
+
+
+@pytest.fixture
+def retriever():
+    retriever = Retriever()
+    retriever.rrf_k = 60
+    retriever.mmr_lambda = 0.5
+    retriever.token_budget = 0
+    return retriever
+
+
+class FakeCollection:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.requested = []
+
+    def get(self, ids, include):
+        self.requested.append(list(ids))
+        return {'ids': ids, 'embeddings': [self.embeddings[chunk_id] for chunk_id in ids]}
+
+
+def test_fuse_rewards_agreement_between_rankings(retriever):
+    dense = [make_hit("a"), make_hit("b"), make_hit("c")]
+    lexical = [make_hit("b"), make_hit("c"), make_hit("d")]
+
+    fused = retriever.fuse([dense, lexical], n_results=4)
+
+    assert [hit['id'] for hit in fused] == ["b", "c", "a", "d"]
+
+
+def test_fuse_keeps_the_first_copy_of_a_hit_and_truncates(retriever):
+    first = make_hit("a", embedding=[1.0, 0.0])
+    fused = retriever.fuse([[first, make_hit("b")], [make_hit("a")]], n_results=1)
+
+    assert fused == [first]
+
+
+def test_fuse_of_no_rankings_is_empty(retriever):
+    assert retriever.fuse([], n_results=3) == []
+
+
+def test_select_hits_without_embeddings_follows_rank_within_budget(retriever):
+    retriever.token_budget = 10
+    hits = [make_hit("a", 8), make_hit("b", 5), make_hit("c", 2)]
+
+    selected = retriever.select_hits(hits, None, db=None, n_results=3)
+
+    assert [hit['id'] for hit in selected] == ["a", "c"]
+
+
+def test_select_hits_always_keeps_the_best_hit(retriever):
+    retriever.token_budget = 10
+    hits = [make_hit("a", 50), make_hit("b", 1)]
+
+    selected = retriever.select_hits(hits, None, db=None, n_results=3)
+
+    assert [hit['id'] for hit in selected] == ["a"]
+
+
+def test_select_hits_mmr_skips_near_duplicates(retriever):
+    hits = [
+        make_hit("a", embedding=[1.0, 0.12]),
+        make_hit("b", embedding=[1.0, 0.1]),
+        make_hit("c", embedding=[0.1, 1.0]),
+    ]
+
+    selected = retriever.select_hits(hits, [[1.0, 0.6]], db=None, n_results=2)
+
+    assert [hit['id'] for hit in selected] == ["a", "c"]
+
+
+def test_select_hits_with_lambda_one_keeps_the_ranking(retriever):
+    retriever.mmr_lambda = 1.0
+    hits = [
+        make_hit("a", embedding=[1.0, 0.12]),
+        make_hit("b", embedding=[1.0, 0.1]),
+        make_hit("c", embedding=[0.1, 1.0]),
+    ]
+
+    selected = retriever.select_hits(hits, [[1.0, 0.6]], db=None, n_results=2)
+
+    assert [hit['id'] for hit in selected] == ["a", "b"]
+
+
+def test_select_hits_fetches_missing_embeddings_once(retriever):
+    db = FakeCollection({"b": [1.0, 0.1], "c": [0.1, 1.0]})
+    hits = [make_hit("a", embedding=[1.0, 0.12]), make_hit("b"), make_hit("c")]
+
+    selected = retriever.select_hits(hits, [[1.0, 0.6]], db=db, n_results=2)
+
+    assert db.requested == [["b", "c"]]
+    assert [hit['id'] for hit in selected] == ["a", "c"]
+    assert np.allclose(hits[1]['embedding'], [1.0, 0.1])
+
+
+def test_select_hits_mmr_respects_the_token_budget(retriever):
+    retriever.mmr_lambda = 0.9
+    hits = [
+        make_hit("a", 10, embedding=[1.0, 0.12]),
+        make_hit("b", 10, embedding=[0.5, 1.0]),
+        make_hit("c", 4, embedding=[0.0, 1.0]),
+    ]
+
+    assert [hit['id'] for hit in retriever.select_hits(hits, [[1.0, 0.6]], db=None, n_results=2)] == ["a", "b"]
+    retriever.token_budget = 15
+    assert [hit['id'] for hit in retriever.select_hits(hits, [[1.0, 0.6]], db=None, n_results=2)] == ["a", "c"]